@@ -1,6 +1,5 @@
 # app.py - 优化版本
 import streamlit as st
-import pandas as pd
 from datetime import datetime, date, timedelta
 import time
 import hashlib
@@ -13,6 +12,20 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 记录列表每页条数（表格在浏览器端虚拟滚动，每页可以多放一些）
+RECORDS_PAGE_SIZE = 200
+
+# 已加载的记录页在会话中复用的秒数，超过后重新查询以看到其他会话的修改
+RECORDS_VIEW_TTL_SECONDS = 60
+
+# 记录列表实际显示的列
+RECORD_LIST_COLUMNS = ['id', 'register_datetime', 'test_date', 'test_time', 'name', 'contact',
+                       'advisor', 'equipment', 'machine_hours', 'cost', 'remark']
+
+# 记录表格中的列顺序
+RECORD_GRID_COLUMNS = ['test_date', 'test_time', 'name', 'equipment', 'contact', 'advisor',
+                       'machine_hours', 'cost', 'remark', 'register_datetime']
+
 # ==================== 路径设置 ====================
 current_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.join(current_dir, 'src')
@@ -21,6 +34,10 @@ src_dir = os.path.join(current_dir, 'src')
 if src_dir not in sys.path:
     sys.path.insert(0, src_dir)
 
+from record import Record, DEFAULT_START_TIME, DEFAULT_END_TIME
+from record_frame import records_to_frame
+from errors import RecordConflictError
+
 # ==================== 初始化模块 ====================
 def load_record_for_editing(record_id: int):
     """加载记录到编辑表单"""
@@ -28,39 +45,9 @@ def load_record_for_editing(record_id: int):
         # 获取完整记录数据并填充表单
         record = st.session_state.db_manager.get_record_by_id(record_id)
         if record:
-            # 解析测试时间
-            test_time = record.get('test_time', '')
-            start_time = '08:00'
-            end_time = '09:00'
-            if test_time and '-' in test_time:
-                try:
-                    times = test_time.split('-')
-                    start_time = times[0].strip()
-                    end_time = times[1].strip() if len(times) > 1 else '09:00'
-                except:
-                    pass
-            
-            # 处理日期
-            test_date_value = record.get('test_date', date.today())
-            if isinstance(test_date_value, str):
-                try:
-                    test_date_value = datetime.strptime(test_date_value, '%Y-%m-%d').date()
-                except:
-                    test_date_value = date.today()
-            
-            # 填充表单数据
-            st.session_state.form_data = {
-                'equipment': record.get('equipment', ''),
-                'test_date': test_date_value,
-                'name': record.get('name', ''),
-                'contact': record.get('contact', ''),
-                'advisor': record.get('advisor', ''),
-                'machine_hours': record.get('machine_hours', 0.0),
-                'cost': record.get('cost', 0),
-                'remark': record.get('remark', ''),
-                'start_time': start_time,
-                'end_time': end_time
-            }
+            # 填充表单数据，保留原记录用于保存时只提交修改的字段
+            st.session_state.form_data = record.to_form_data()
+            st.session_state.edit_original = record
             
             # 设置编辑模式并跳转
             st.session_state.current_edit_id = record_id
@@ -72,16 +59,28 @@ def load_record_for_editing(record_id: int):
         logger.error(f"加载编辑记录失败: {e}")
         st.error(f"加载记录失败：{str(e)}")
 
+@st.cache_resource(show_spinner="正在连接数据库...")
+def get_shared_managers():
+    """创建进程内共享的配置管理器和数据库管理器
+    
+    所有会话共用同一个 Supabase 客户端（及其 HTTP 连接池），
+    表初始化只在进程启动后第一次调用时执行一次。
+    """
+    from supabase_manager import SupabaseManager
+    
+    db_manager = SupabaseManager()
+    logger.info("共享数据库管理器已创建")
+    return db_manager.config_manager, db_manager
+
 def init_managers():
     """初始化管理模块"""
     try:
-        # 尝试导入模块
-        from supabase_manager import SupabaseManager
-        from config_manager import ConfigManager
+        # 所有会话共享同一组实例
+        config_manager, db_manager = get_shared_managers()
         
-        # 创建实例
-        config_manager = ConfigManager()
-        db_manager = SupabaseManager()
+        # 连接失败的实例不保留，下一个会话重新尝试连接
+        if db_manager.client is None or db_manager.client.client is None:
+            get_shared_managers.clear()
         
         logger.info("模块导入成功")
         return config_manager, db_manager
@@ -90,56 +89,8 @@ def init_managers():
         logger.error(f"导入模块失败: {e}")
         st.error(f"模块导入失败: {e}")
         
-        # 定义模拟类
-        class MockConfigManager:
-            def get_default_password_hash(self):
-                return hash_password("9999")
-        
-        class MockSupabaseManager:
-            def __init__(self):
-                self.records = []
-                self.next_id = 1
-                logger.warning("使用模拟数据模式")
-            
-            def save_record(self, data, record_id=None):
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                if record_id:
-                    for i, r in enumerate(self.records):
-                        if r['id'] == record_id:
-                            self.records[i] = {**data, 'id': record_id, 
-                                              'register_datetime': r.get('register_datetime', now), 
-                                              'last_modified': now}
-                            return True
-                    return False
-                else:
-                    self.records.append({**data, 'id': self.next_id, 
-                                        'register_datetime': now, 
-                                        'last_modified': now})
-                    self.next_id += 1
-                    return True
-            
-            def delete_record(self, record_id):
-                self.records = [r for r in self.records if r['id'] != record_id]
-                return True
-            
-            def get_record_by_id(self, record_id):
-                for r in self.records:
-                    if r['id'] == record_id:
-                        return r
-                return None
-            
-            def get_records(self, limit=200):
-                return self.records[:limit]
-            
-            def get_setting(self, key, default=None):
-                if key == "admin_password_hash":
-                    return hash_password("9999")
-                return default
-            
-            def set_setting(self, key, value):
-                return True
-        
-        return MockConfigManager(), MockSupabaseManager()
+        # 离线写入由数据库管理器的本地日志负责，依赖缺失时无法继续运行
+        st.stop()
 
 # 密码哈希函数
 def hash_password(pwd: str) -> str:
@@ -152,19 +103,12 @@ def init_session_state():
     default_state = {
         'is_authenticated': False,
         'current_edit_id': None,
+        'edit_original': None,
         'menu': "📋 查看记录",
-        'form_data': {
-            'equipment': '',
-            'test_date': date.today(),
-            'name': '',
-            'contact': '',
-            'advisor': '',
-            'machine_hours': 0.0,
-            'cost': 0,
-            'remark': '',
-            'start_time': '08:00',
-            'end_time': '09:00'
-        }
+        'records_cursor': None,
+        'records_direction': "next",
+        'records_page_no': 1,
+        'form_data': Record().to_form_data()
     }
     
     for key, value in default_state.items():
@@ -208,11 +152,10 @@ def show_password_dialog(action_name: str = "此操作") -> bool:
         if submitted:
             if verify_password(password):
                 st.session_state.is_authenticated = True
-                st.success("验证成功！")
+                notify("验证成功！")
                 # 如果是登记记录，设置菜单状态
                 if action_name == "登记记录":
                     st.session_state.menu = "📝 登记记录"
-                time.sleep(0.5)
                 st.rerun()  # 这里添加 rerun
                 return True
             else:
@@ -222,9 +165,36 @@ def show_password_dialog(action_name: str = "此操作") -> bool:
     # 如果显示对话框但未提交，返回False
     return False
 
+# ==================== 通知 ====================
+# 通知类型对应的 toast 图标
+NOTIFY_ICONS = {
+    'success': "✅",
+    'info': "ℹ️",
+    'warning': "⚠️",
+    'error': "❌"
+}
+
+def notify(message: str, kind: str = "success"):
+    """把提示消息放入会话通知队列
+    
+    消息在下一次执行脚本时以 toast 显示，调用方可以立即 st.rerun()，
+    不需要 sleep 等待用户看到消息。
+    """
+    st.session_state.setdefault('notifications', []).append((kind, message))
+
+def show_notifications():
+    """显示并清空会话通知队列"""
+    for kind, message in st.session_state.pop('notifications', []):
+        st.toast(message, icon=NOTIFY_ICONS.get(kind))
+
 # ==================== 表单组件 ====================
+@st.fragment
 def show_records_table():
-    """显示记录表格 - 简洁两行布局"""
+    """显示记录表格 - 分页查询，单个表格组件显示
+    
+    过滤面板和结果列表在同一个片段中：修改过滤条件、选中行或翻页只重新执行这个片段，
+    不会重新绘制侧边栏；查询条件和页码不变时直接复用会话中已加载的数据。
+    """
     st.header("📋 登记记录")
     
     # 搜索过滤区域
@@ -295,70 +265,35 @@ def show_records_table():
     col_refresh, col_stats = st.columns([1, 4])
     with col_refresh:
         if st.button("🔄 刷新", use_container_width=True):
-            st.rerun()
+            invalidate_records_view()
+            st.rerun(scope="fragment")
+    
+    # 查询条件变化时回到第一页
+    query_key = (time_filter, str(start_date), str(end_date),
+                 search_name, search_equipment, search_advisor)
+    if st.session_state.get('records_query_key') != query_key:
+        st.session_state.records_query_key = query_key
+        reset_records_page()
     
     try:
-        # 获取所有记录，然后在内存中进行模糊过滤
-        with st.spinner("正在加载数据..."):
-            records = st.session_state.db_manager.get_records_as_tuples(
-                date_field="test_date",
-                order_by="test_date DESC, id DESC",
-                limit=500
-            )
+        # 所有过滤条件下推到服务端，每次只取一页
+        filter_kwargs = {
+            'date_range': (start_date, end_date) if start_date else None,
+            'date_field': "test_date",
+            'name': search_name,
+            'advisor': search_advisor,
+            'equipment': search_equipment or None
+        }
+        page, total_count, stats = load_records_view(filter_kwargs, query_key)
+        records = page['records']
         
         if not records:
             st.info("📭 暂无记录")
+            if page['has_prev'] and st.button("⬅️ 返回第一页"):
+                reset_records_page()
+                st.rerun(scope="fragment")
             return
         
-        # 应用模糊搜索过滤
-        filtered_records = []
-        for record in records:
-            record_dict = {
-                'id': record[0],
-                'register_datetime': record[1],
-                'test_date': record[2],
-                'test_time': record[3],
-                'name': record[4],
-                'contact': record[5],
-                'advisor': record[6],
-                'equipment': record[7],
-                'machine_hours': record[8],
-                'cost': record[9],
-                'remark': record[10]
-            }
-            
-            # 姓名模糊匹配
-            if search_name:
-                if search_name.lower() not in str(record[4]).lower():
-                    continue
-            
-            # 设备精确匹配（因为现在是选择，不是模糊搜索）
-            if search_equipment:  # 只有当选择了具体设备时才筛选
-                if search_equipment != record[7]:  # 精确匹配
-                    continue
-            
-            # 领导模糊匹配
-            if search_advisor:
-                if search_advisor.lower() not in str(record[6]).lower():
-                    continue
-            
-            # 日期范围过滤 - 修复逻辑
-            if start_date:
-                try:
-                    record_date = datetime.strptime(record[2], '%Y-%m-%d').date()
-                    # 只检查开始日期，不检查结束日期（允许未来日期）
-                    if record_date < start_date:
-                        continue
-                    # 如果有结束日期限制，才检查结束日期
-                    if end_date and record_date > end_date:
-                        continue
-                except:
-                    continue
-            
-            filtered_records.append(record)
-        
-        records = filtered_records
-        
         # 显示筛选信息
         filter_info = []
         if time_filter:
@@ -380,123 +315,231 @@ def show_records_table():
         if filter_info:
             st.caption("📌 " + " | ".join(filter_info))
         
-        # 统计信息
-        total_hours = sum(r[8] for r in records)
-        total_cost = sum(r[9] for r in records)
+        show_export_panel(filter_kwargs)
         
+        # 统计信息 - 服务端按相同条件聚合全部匹配记录
         with col_stats:
-            st.caption(f"📊 统计：共 {len(records)} 条记录 | 总机时 {total_hours:.1f}小时 | 总费用 {total_cost}元")
+            if stats is not None:
+                st.caption(f"📊 统计：{stats['count']} 条记录 | 总机时 {stats['machine_hours']:.1f}小时 | 总费用 {stats['cost']}元")
+            elif total_count is not None:
+                st.caption(f"📊 统计：{total_count} 条记录 | 机时和费用统计暂不可用")
+            else:
+                st.caption("📊 统计暂不可用")
         
-        # 显示记录列表 - 使用简洁两行布局
-        st.markdown(f"### 📝 记录详情 (共 {len(records)} 条)")
+        # 显示记录列表
+        total_info = f"共 {total_count} 条，" if total_count is not None else ""
+        st.markdown(f"### 📝 记录详情 ({total_info}第 {st.session_state.records_page_no} 页，本页 {len(records)} 条)")
+        st.caption("点击表格左侧选中一行，查看详情或编辑")
         
-        # 添加美化样式
-        st.markdown("""
-        <style>
-        /* 美化分割线 */
-        .compact-divider {
-            margin: 6px 0 !important;
-            border: none;
-            border-top: 1px solid #e8e8e8;
-        }
-        /* 美化详情展开区域 */
-        .detail-content {
-            padding: 8px 0;
-        }
-        /* 美化备注区域 */
-        .remark-box {
-            margin-top: 8px;
-            padding: 8px 12px;
-            background-color: #f0f7ff;
-            border-radius: 6px;
-            border-left: 4px solid #1890ff;
-            font-size: 0.9em;
-            color: #333;
-        }
-        /* 图标颜色调整 */
-        .icon-gray {
-            opacity: 0.7;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        # 整页记录（原始行）用一个表格组件显示（浏览器端虚拟滚动），选中一行后在下方显示详情和编辑按钮
+        selected = show_records_grid(records, grid_key=f"records_grid_{abs(hash(query_key))}_"
+                                                         f"{st.session_state.records_page_no}")
+        if selected is not None:
+            show_record_detail(selected)
         
-        for i, record in enumerate(records, 1):
-            record_id = record[0]
-            
-            # 提取记录数据
-            name = record[4] or "未填写"
-            equipment = record[7] or "未指定"
-            contact = record[5] or "未填写"
-            test_date = record[2]
-            test_time = record[3] or "08:00-09:00"
-            advisor = record[6] or "未填写"
-            cost = record[9]
-            hours = record[8]
-            remark = record[10]
-            
-            # 第一行：姓名|设备|手机号 + 测试日期|时间段 + 编辑按钮
-            col1_left, col1_middle, col1_right = st.columns([3, 2, 1])
-            
-            with col1_left:
-                # 姓名 | 设备 | 手机号 - 使用Markdown格式而非HTML
-                contact_icon = "📧" if "@" in contact else "📞"
-                # 使用更简单的格式，或者使用st.markdown的html特性
-                html_content = f"**{name}** | **{equipment}** | {contact_icon} {contact}"
-                st.markdown(html_content)
-            
-            with col1_middle:
-                # 测试日期 | 时间段 - 简化格式
-                html_content = f"📅 {test_date} | 🕒 {test_time}"
-                st.markdown(html_content)
-            
-            with col1_right:
-                # 编辑按钮
-                edit_key = f"edit_{record_id}_{i}"
-                if st.button(f"✏️ 编辑", key=edit_key, use_container_width=True, 
-                           help=f"编辑 {name} 的记录"):
-                    load_record_for_editing(record_id)
-            
-            # 第二行：查看详情按钮
-            detail_label = f"📋 查看详情"
-            
-            # 创建详情展开器
-            with st.expander(detail_label):
-                # 构建紧凑的信息字符串
-                detail_info = []
-                
-                # 领导信息
-                if advisor and advisor != "未填写":
-                    detail_info.append(f"👨‍🏫 领导： {advisor}")
-                
-                # 机时信息
-                detail_info.append(f"⏱️ 机时： {hours:.1f}小时")
-                
-                # 费用信息
-                cost_info = f"{cost}元" if cost > 0 else "免费"
-                detail_info.append(f"💵 费用： {cost_info}")
-                
-                # 登记时间
-                register_date = record[1].split()[0] if record[1] else "未知"
-                detail_info.append(f"📅 登记： {register_date}")
-                
-                # 将所有信息组合在一行，用分隔符分隔
-                separator = "&nbsp;&nbsp;|&nbsp;&nbsp;"
-                info_html = f"<div class='detail-content'>{separator.join(detail_info)}</div>"
-                st.markdown(info_html, unsafe_allow_html=True)
-                
-                # 备注信息（如果有）
-                if remark:
-                    remark_html = f"<div class='remark-box'>📝 <strong>备注：</strong> {remark}</div>"
-                    st.markdown(remark_html, unsafe_allow_html=True)
-            
-            # 添加美化分割线
-            if i < len(records):
-                st.markdown('<div class="compact-divider"></div>', unsafe_allow_html=True)
+        # 翻页控制
+        show_page_controls(page)
     
     except Exception as e:
         logger.error(f"加载数据失败: {e}")
         st.error(f"加载数据失败：{str(e)}")
 
+def show_records_grid(rows: list, grid_key: str):
+    """用单个 st.dataframe 显示一页原始行，返回选中行的 Record（未选中时为 None）
+    
+    无论一页多少条，页面上只有一个表格组件，不再为每行创建按钮和展开器；
+    整页按列转换为 DataFrame，只有选中的一行解析为 Record。
+    """
+    frame = records_to_frame(rows)
+    event = st.dataframe(
+        frame,
+        key=grid_key,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        column_order=RECORD_GRID_COLUMNS,
+        column_config={
+            'test_date': st.column_config.DateColumn("测试日期", format="YYYY-MM-DD"),
+            'test_time': st.column_config.TextColumn("时间段"),
+            'name': st.column_config.TextColumn("姓名"),
+            'equipment': st.column_config.TextColumn("设备"),
+            'contact': st.column_config.TextColumn("联系方式"),
+            'advisor': st.column_config.TextColumn("领导"),
+            'machine_hours': st.column_config.NumberColumn("机时(小时)", format="%.1f"),
+            'cost': st.column_config.NumberColumn("费用(元)", format="%d"),
+            'remark': st.column_config.TextColumn("备注"),
+            'register_datetime': st.column_config.DatetimeColumn("登记时间", format="YYYY-MM-DD HH:mm")
+        }
+    )
+    
+    selected = event.selection.rows if event is not None else []
+    if selected and selected[0] < len(rows):
+        return Record.from_row(rows[selected[0]])
+    return None
+
+def show_record_detail(record: Record):
+    """显示选中记录的详情和编辑按钮"""
+    st.markdown("""
+    <style>
+    /* 美化详情区域 */
+    .detail-content {
+        padding: 8px 0;
+    }
+    /* 美化备注区域 */
+    .remark-box {
+        margin-top: 8px;
+        padding: 8px 12px;
+        background-color: #f0f7ff;
+        border-radius: 6px;
+        border-left: 4px solid #1890ff;
+        font-size: 0.9em;
+        color: #333;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+    
+    name = record.name or "未填写"
+    equipment = record.equipment or "未指定"
+    contact = record.contact or "未填写"
+    test_time = record.test_time or "08:00-09:00"
+    
+    with st.container(border=True):
+        col_info, col_edit = st.columns([5, 1])
+        
+        with col_info:
+            # 姓名 | 设备 | 手机号 + 测试日期 | 时间段
+            contact_icon = "📧" if "@" in contact else "📞"
+            st.markdown(f"**{name}** | **{equipment}** | {contact_icon} {contact} "
+                        f"&nbsp;&nbsp; 📅 {record.test_date} | 🕒 {test_time}")
+        
+        with col_edit:
+            if st.button("✏️ 编辑", key=f"edit_{record.id}", use_container_width=True,
+                         help=f"编辑 {name} 的记录"):
+                load_record_for_editing(record.id)
+        
+        detail_info = []
+        if record.advisor:
+            detail_info.append(f"👨‍🏫 领导： {record.advisor}")
+        detail_info.append(f"⏱️ 机时： {record.machine_hours:.1f}小时")
+        detail_info.append(f"💵 费用： {record.cost}元" if record.cost > 0 else "💵 费用： 免费")
+        register_date = record.register_datetime.date() if record.register_datetime else "未知"
+        detail_info.append(f"📅 登记： {register_date}")
+        
+        separator = "&nbsp;&nbsp;|&nbsp;&nbsp;"
+        st.markdown(f"<div class='detail-content'>{separator.join(detail_info)}</div>",
+                    unsafe_allow_html=True)
+        
+        if record.remark:
+            st.markdown(f"<div class='remark-box'>📝 <strong>备注：</strong> {record.remark}</div>",
+                        unsafe_allow_html=True)
+
+def show_export_panel(filter_kwargs: dict):
+    """导出当前过滤条件下的全部记录（不限于当前页）"""
+    from record_export import EXPORT_FORMATS
+    
+    with st.expander("📥 导出记录", expanded=False):
+        col_format, col_button = st.columns([2, 1])
+        with col_format:
+            fmt = st.radio("导出格式", list(EXPORT_FORMATS), horizontal=True,
+                           format_func=lambda value: "CSV" if value == "csv" else "Excel (xlsx)")
+        
+        db_manager = st.session_state.db_manager
+        
+        def build_export() -> bytes:
+            # 用户点击下载时才在后台线程中执行，页面重新运行时不查询也不生成文件；
+            # 这里不能使用 st 命令和 session_state。st.download_button 不支持流式下载，
+            # 按块查询和编码后仍要把整个文件拼接在内存中
+            try:
+                return b''.join(db_manager.export_records(fmt, **filter_kwargs))
+            except Exception as e:
+                logger.error(f"导出记录失败: {e}")
+                raise
+        
+        mime, extension = EXPORT_FORMATS[fmt]
+        with col_button:
+            st.download_button("⬇️ 下载导出文件", data=build_export, mime=mime, on_click="ignore",
+                               use_container_width=True,
+                               file_name=f"登记记录_{date.today().isoformat()}{extension}")
+
+def load_records_view(filter_kwargs: dict, query_key: tuple):
+    """加载当前页 - 查询条件、页码都没变且未过期时复用会话中的结果，不访问数据库"""
+    view_key = (query_key, st.session_state.records_cursor, st.session_state.records_direction)
+    cached = st.session_state.get('records_view')
+    if (cached is not None and cached['key'] == view_key
+            and time.monotonic() - cached['loaded_at'] < RECORDS_VIEW_TTL_SECONDS):
+        return cached['data']
+    
+    with st.spinner("正在加载数据..."):
+        data = load_records_page(filter_kwargs)
+    st.session_state.records_view = {'key': view_key, 'loaded_at': time.monotonic(), 'data': data}
+    return data
+
+def invalidate_records_view():
+    """丢弃会话中已加载的记录页，下次显示时重新查询"""
+    st.session_state.pop('records_view', None)
+
+def load_records_page(filter_kwargs: dict):
+    """加载当前页记录（原始行）、总数和统计
+    
+    本地副本已同步时由同步数据层读取副本；否则异步数据层可用时并发查询服务端。
+    """
+    page_kwargs = {
+        'page_size': RECORDS_PAGE_SIZE,
+        'cursor': st.session_state.records_cursor,
+        'direction': st.session_state.records_direction,
+        'columns': RECORD_LIST_COLUMNS
+    }
+    
+    async_manager = None
+    if not st.session_state.db_manager.replica_ready():
+        try:
+            from async_supabase import get_async_manager, run_async
+            async_manager = get_async_manager()
+        except ImportError as e:
+            logger.warning(f"异步数据层不可用: {e}")
+    
+    if async_manager is not None:
+        timeout = st.session_state.config_manager.get("read_timeout_seconds", 20)
+        data = run_async(async_manager.load_records_view(**page_kwargs, **filter_kwargs), timeout=timeout)
+        page = data['page']
+        if page is not None:
+            stats = data['stats'] or st.session_state.db_manager.get_record_stats(**filter_kwargs)
+            return page, data['count'], stats
+    
+    page = st.session_state.db_manager.get_records_page(**page_kwargs, as_rows=True, **filter_kwargs)
+    total_count = st.session_state.db_manager.count_records(**filter_kwargs)
+    stats = st.session_state.db_manager.get_record_stats(**filter_kwargs)
+    return page, total_count, stats
+
+def reset_records_page():
+    """回到记录列表第一页"""
+    st.session_state.records_cursor = None
+    st.session_state.records_direction = "next"
+    st.session_state.records_page_no = 1
+
+def show_page_controls(page: dict):
+    """显示上一页/下一页按钮"""
+    st.markdown("---")
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    
+    with col_prev:
+        if st.button("⬅️ 上一页", use_container_width=True, disabled=not page['has_prev']):
+            st.session_state.records_cursor = page['first_cursor']
+            st.session_state.records_direction = "prev"
+            st.session_state.records_page_no = max(1, st.session_state.records_page_no - 1)
+            st.rerun(scope="fragment")
+    
+    with col_page:
+        st.caption(f"第 {st.session_state.records_page_no} 页")
+    
+    with col_next:
+        if st.button("下一页 ➡️", use_container_width=True, disabled=not page['has_next']):
+            st.session_state.records_cursor = page['last_cursor']
+            st.session_state.records_direction = "next"
+            st.session_state.records_page_no += 1
+            st.rerun(scope="fragment")
+
 def save_record(**kwargs):
     """保存记录"""
     try:
@@ -518,7 +561,8 @@ def save_record(**kwargs):
         if st.session_state.current_edit_id:
             success = st.session_state.db_manager.save_record(
                 record_data, 
-                st.session_state.current_edit_id
+                st.session_state.current_edit_id,
+                original=get_edit_original(st.session_state.current_edit_id)
             )
             action = "更新"
         else:
@@ -526,41 +570,36 @@ def save_record(**kwargs):
             action = "新增"
         
         if success:
-            # 显示成功消息
-            success_msg = st.success(f"✅ 记录{action}成功！页面将在2秒后刷新...")
+            # 成功消息在刷新后显示
+            notify(f"记录{action}成功！")
             clear_form()
-            time.sleep(2)
-            success_msg.empty()  # 清除消息
+            invalidate_records_view()
             st.rerun()
         else:
-            error_msg = st.error("❌ 保存失败，请检查数据格式")
-            time.sleep(2)
-            error_msg.empty()  # 清除消息
+            st.error("❌ 保存失败，请检查数据格式")
             st.stop()
             
+    except RecordConflictError as e:
+        st.warning(f"⚠️ {e}")
     except Exception as e:
         logger.error(f"保存记录失败: {e}")
         st.error(f"❌ 保存失败：{str(e)}")
 
 def clear_form():
     """清空表单"""
-    st.session_state.form_data = {
-        'equipment': '',
-        'test_date': date.today(),
-        'name': '',
-        'contact': '',
-        'advisor': '',
-        'machine_hours': 0.0,
-        'cost': 0,
-        'remark': '',
-        'start_time': '08:00',
-        'end_time': '09:00'
-    }
+    st.session_state.form_data = Record().to_form_data()
     st.session_state.current_edit_id = None
+    st.session_state.edit_original = None
+
+def get_edit_original(record_id: int):
+    """正在编辑的记录在打开编辑时读取到的内容"""
+    original = st.session_state.get('edit_original')
+    return original if original is not None and original.id == record_id else None
 
 # ==================== 登记表单组件 ====================
+@st.fragment
 def show_registration_form():
-    """显示登记表单"""
+    """显示登记表单 - 独立片段，填写表单时只重新执行表单本身"""
     # 标题
     if st.session_state.current_edit_id:
         st.header(f"✏️ 编辑记录 (ID: {st.session_state.current_edit_id})")
@@ -607,19 +646,9 @@ def show_registration_form():
                 help="请选择实验设备"
             )
         
-        # 安全处理日期
-        try:
-            test_date_value = st.session_state.form_data.get('test_date')
-            if isinstance(test_date_value, date):
-                test_date = test_date_value
-            elif isinstance(test_date_value, str):
-                test_date = datetime.strptime(test_date_value, '%Y-%m-%d').date()
-            else:
-                test_date = date.today()
-        except:
-            test_date = date.today()
-            
-        test_date = st.date_input("测试日期 *", value=test_date)
+        # 表单数据来自 Record.to_form_data()，日期和时间已经是 date/time
+        test_date = st.date_input("测试日期 *",
+                                  value=st.session_state.form_data.get('test_date') or date.today())
         
         name = st.text_input("姓名 *", 
                             value=st.session_state.form_data.get('name', ''),
@@ -635,26 +664,14 @@ def show_registration_form():
         # 时间处理
         time_col1, time_col2 = st.columns(2)
         with time_col1:
-            try:
-                start_time_str = st.session_state.form_data.get('start_time', '08:00')
-                if isinstance(start_time_str, str):
-                    start_time_val = datetime.strptime(start_time_str, "%H:%M").time()
-                else:
-                    start_time_val = datetime.strptime("08:00", "%H:%M").time()
-            except:
-                start_time_val = datetime.strptime("08:00", "%H:%M").time()
-            start_time = st.time_input("开始时间", value=start_time_val, step=1800) 
+            start_time = st.time_input("开始时间",
+                                       value=st.session_state.form_data.get('start_time') or DEFAULT_START_TIME,
+                                       step=1800)
 
         with time_col2:
-            try:
-                end_time_str = st.session_state.form_data.get('end_time', '09:00')
-                if isinstance(end_time_str, str):
-                    end_time_val = datetime.strptime(end_time_str, "%H:%M").time()
-                else:
-                    end_time_val = datetime.strptime("09:00", "%H:%M").time()
-            except:
-                end_time_val = datetime.strptime("09:00", "%H:%M").time()
-            end_time = st.time_input("结束时间", value=end_time_val, step=1800)      
+            end_time = st.time_input("结束时间",
+                                     value=st.session_state.form_data.get('end_time') or DEFAULT_END_TIME,
+                                     step=1800)
         # 安全处理数字字段
         try:
             machine_hours_value = st.session_state.form_data.get('machine_hours', 0.0)
@@ -727,7 +744,8 @@ def show_registration_form():
                     if st.session_state.current_edit_id:
                         success = st.session_state.db_manager.save_record(
                             record_data, 
-                            st.session_state.current_edit_id
+                            st.session_state.current_edit_id,
+                            original=get_edit_original(st.session_state.current_edit_id)
                         )
                         action = "更新"
                     else:
@@ -735,37 +753,26 @@ def show_registration_form():
                         action = "新增"
                     
                     if success:
-                        # 显示成功消息并清空表单
-                        success_container = st.empty()
-                        success_container.success(f"✅ 记录{action}成功！")
+                        # 成功消息在刷新后显示
+                        notify(f"记录{action}成功！")
                         
-                        # 清空表单
+                        # 清空表单，记录列表下次显示时重新查询
                         clear_form()
+                        invalidate_records_view()
                         
-                        # 如果是编辑模式，自动返回查看记录页面
+                        # 如果是编辑模式，自动返回查看记录页面；新增记录则刷新表单（保持在同一页面）
                         if st.session_state.current_edit_id:
                             st.session_state.current_edit_id = None
                             st.session_state.menu = "📋 查看记录"
-                            time.sleep(1)
-                            success_container.empty()
-                            st.rerun()
-                        else:
-                            # 如果是新增记录，等待2秒后自动刷新表单（保持在同一页面）
-                            time.sleep(2)
-                            success_container.empty()
-                            st.rerun()
+                        st.rerun()
                     else:
-                        error_container = st.empty()
-                        error_container.error("❌ 保存失败，请检查数据格式")
-                        time.sleep(2)
-                        error_container.empty()
+                        st.error("❌ 保存失败，请检查数据格式")
                         
+                except RecordConflictError as e:
+                    st.warning(f"⚠️ {e}")
                 except Exception as e:
                     logger.error(f"保存记录失败: {e}")
-                    error_container = st.empty()
-                    error_container.error(f"❌ 保存失败：{str(e)}")
-                    time.sleep(2)
-                    error_container.empty()
+                    st.error(f"❌ 保存失败：{str(e)}")
     
     with col_btn2:
         if st.button("🧹 清空表单", use_container_width=True):
@@ -816,94 +823,132 @@ def show_change_password():
                 try:
                     new_hash = hash_password(new_password1)
                     if st.session_state.db_manager.set_setting("admin_password_hash", new_hash):
-                        # 显示成功消息
-                        success_msg = st.success("✅ 密码已更新，页面将在2秒后刷新...")
+                        # 成功消息在刷新后显示
+                        notify("密码已更新，请使用新密码重新验证")
                         st.session_state.is_authenticated = False
-                        time.sleep(2)
-                        success_msg.empty()  # 清除消息
                         st.rerun()
                     else:
-                        error_msg = st.error("❌ 密码更新失败")
-                        time.sleep(2)
-                        error_msg.empty()  # 清除消息
+                        st.error("❌ 密码更新失败")
                         st.stop()
                 except Exception as e:
-                    error_msg = st.error(f"❌ 密码更新失败：{str(e)}")
-                    time.sleep(2)
-                    error_msg.empty()  # 清除消息
+                    st.error(f"❌ 密码更新失败：{str(e)}")
                     st.stop()
 
 # ==================== 侧边栏 ====================
 def show_sidebar():
     """显示侧边栏"""
     with st.sidebar:
-        # 添加自定义Logo和标题
-        col_logo, col_title = st.columns([1, 3])
-        
-        with col_logo:
-            # 加载并显示自定义Logo
-            try:
-                # 确保logo.png文件存在
-                st.image("logo.png", width=50)  # 调整宽度以适应您的Logo
-            except FileNotFoundError:
-                # 如果找不到Logo文件，显示默认图标
-                st.markdown("🔬")
-        
-        with col_title:
-            st.title("仪器使用系统")
-        
-        st.markdown("---")
-        
-        # 改为4个功能按钮，不再使用下拉菜单
-        st.subheader("📋 功能菜单")
-        
-        # 查看记录按钮
-        if st.button("📋 查看记录", use_container_width=True, type="primary" if st.session_state.menu == "📋 查看记录" else "secondary"):
-            st.session_state.menu = "📋 查看记录"
-            st.session_state.current_edit_id = None
-            st.rerun()
-        
-        # 登记记录按钮（需要密码验证）
-        if st.button("📝 登记记录", use_container_width=True, type="primary" if st.session_state.menu == "📝 登记记录" else "secondary"):
-            # 直接设置菜单状态，让main函数处理验证
-            st.session_state.menu = "📝 登记记录"
-            st.session_state.current_edit_id = None
-            st.rerun()
-        
-        # 设备管理按钮
-        if st.button("⚙️ 设备管理", use_container_width=True, type="primary" if st.session_state.menu == "⚙️ 设备管理" else "secondary"):
-            st.session_state.menu = "⚙️ 设备管理"
-            st.rerun()
-        
-        # 修改密码按钮
-        if st.button("🔑 修改密码", use_container_width=True, type="primary" if st.session_state.menu == "🔑 修改密码" else "secondary"):
-            st.session_state.menu = "🔑 修改密码"
+        show_sidebar_content()
+
+@st.fragment
+def show_sidebar_content():
+    """侧边栏内容 - 独立片段，主页面的局部刷新不会重新执行这里的查询"""
+    # 添加自定义Logo和标题
+    col_logo, col_title = st.columns([1, 3])
+    
+    with col_logo:
+        # 加载并显示自定义Logo
+        try:
+            # 确保logo.png文件存在
+            st.image("logo.png", width=50)  # 调整宽度以适应您的Logo
+        except FileNotFoundError:
+            # 如果找不到Logo文件，显示默认图标
+            st.markdown("🔬")
+    
+    with col_title:
+        st.title("仪器使用系统")
+    
+    st.markdown("---")
+    
+    # 改为4个功能按钮，不再使用下拉菜单
+    st.subheader("📋 功能菜单")
+    
+    # 查看记录按钮
+    if st.button("📋 查看记录", use_container_width=True, type="primary" if st.session_state.menu == "📋 查看记录" else "secondary"):
+        st.session_state.menu = "📋 查看记录"
+        st.session_state.current_edit_id = None
+        st.rerun()
+    
+    # 登记记录按钮（需要密码验证）
+    if st.button("📝 登记记录", use_container_width=True, type="primary" if st.session_state.menu == "📝 登记记录" else "secondary"):
+        # 直接设置菜单状态，让main函数处理验证
+        st.session_state.menu = "📝 登记记录"
+        st.session_state.current_edit_id = None
+        st.rerun()
+    
+    # 设备管理按钮
+    if st.button("⚙️ 设备管理", use_container_width=True, type="primary" if st.session_state.menu == "⚙️ 设备管理" else "secondary"):
+        st.session_state.menu = "⚙️ 设备管理"
+        st.rerun()
+    
+    # 修改密码按钮
+    if st.button("🔑 修改密码", use_container_width=True, type="primary" if st.session_state.menu == "🔑 修改密码" else "secondary"):
+        st.session_state.menu = "🔑 修改密码"
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # 用户状态
+    status = "管理员" if st.session_state.is_authenticated else "普通用户"
+    st.caption(f"👤 当前用户: {status}")
+    
+    # 登出按钮
+    if st.session_state.is_authenticated:
+        if st.button("🚪 退出管理员", use_container_width=True):
+            st.session_state.is_authenticated = False
+            notify("已退出管理员模式", "info")
             st.rerun()
+    
+    st.markdown("---")
+    
+    # 系统信息 - 连接状态来自共享的健康监视器（TTL 内不重复探测，熔断期间不发请求），
+    # 记录总数来自共享的计数缓存（HEAD 请求，不传输行；本地副本已同步时在副本中统计）
+    try:
+        db_manager = st.session_state.db_manager
+        if not db_manager.is_available():
+            if db_manager.replica_ready():
+                st.caption("🔴 数据库暂不可用，正在显示本地副本数据")
+            else:
+                st.caption("🔴 数据库暂不可用，稍后自动重试")
         
-        st.markdown("---")
-        
-        # 用户状态
-        status = "管理员" if st.session_state.is_authenticated else "普通用户"
-        st.caption(f"👤 当前用户: {status}")
-        
-        # 登出按钮
-        if st.session_state.is_authenticated:
-            if st.button("🚪 退出管理员", use_container_width=True):
-                st.session_state.is_authenticated = False
-                st.success("已退出管理员模式")
-                time.sleep(0.5)
-                st.rerun()
-        
-        st.markdown("---")
+        total = db_manager.count_records()
+        if total is not None:
+            st.caption(f"📊 记录总数: {total}")
         
-        # 系统信息
-        try:
-            records = st.session_state.db_manager.get_records(limit=5)
-            st.caption(f"📊 最近记录数: {len(records)}")
-        except:
-            st.caption("📊 无法获取记录")
+        pending = st.session_state.db_manager.pending_write_count()
+        if pending:
+            st.caption(f"⏳ 待同步记录: {pending}")
         
-        st.caption(f"📅 系统时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        # 已提示用户保存成功、之后被后端拒绝的记录必须让管理员看到
+        rejected = st.session_state.db_manager.pending_write_count('rejected')
+        if rejected:
+            st.error(f"⚠️ 同步失败记录: {rejected}")
+            if st.session_state.is_authenticated:
+                show_rejected_writes()
+    except:
+        st.caption("📊 无法获取记录")
+    
+    st.caption(f"📅 系统时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+def show_rejected_writes():
+    """管理员查看、重试或放弃被后端拒绝的离线写操作"""
+    with st.expander("查看同步失败记录"):
+        for entry in st.session_state.db_manager.get_rejected_writes():
+            payload = entry['payload']
+            st.markdown(f"**#{entry['seq']}** {payload.get('name', '')} | {payload.get('equipment', '')} | "
+                        f"{payload.get('test_date', '')}")
+            st.caption(f"登记于 {entry['created_at']}，原因：{entry['last_error']}")
+            col_retry, col_discard = st.columns(2)
+            with col_retry:
+                if st.button("重试", key=f"retry_write_{entry['seq']}", use_container_width=True):
+                    st.session_state.db_manager.retry_rejected_writes([entry['seq']])
+                    notify(f"记录 #{entry['seq']} 已重新加入同步队列", "info")
+                    st.rerun()
+            with col_discard:
+                if st.button("放弃", key=f"discard_write_{entry['seq']}", use_container_width=True):
+                    st.session_state.db_manager.discard_rejected_writes([entry['seq']])
+                    notify(f"记录 #{entry['seq']} 已放弃", "warning")
+                    st.rerun()
 
 def show_edit_record_page(record_id: int):
     """显示编辑记录页面"""
@@ -925,39 +970,8 @@ def show_edit_record_page(record_id: int):
     st.header(f"✏️ 编辑记录 (ID: {record_id})")
     
     # 使用现有的登记表单组件，但预先填充数据
-    # 解析测试时间
-    test_time = record.get('test_time', '08:00-09:00')
-    start_time = '08:00'
-    end_time = '09:00'
-    if test_time and '-' in test_time:
-        try:
-            times = test_time.split('-')
-            start_time = times[0].strip()
-            end_time = times[1].strip() if len(times) > 1 else '09:00'
-        except:
-            pass
-    
-    # 处理日期
-    test_date_value = record.get('test_date', date.today())
-    if isinstance(test_date_value, str):
-        try:
-            test_date_value = datetime.strptime(test_date_value, '%Y-%m-%d').date()
-        except:
-            test_date_value = date.today()
-    
-    # 设置表单数据
-    st.session_state.form_data = {
-        'equipment': record.get('equipment', ''),
-        'test_date': test_date_value,
-        'name': record.get('name', ''),
-        'contact': record.get('contact', ''),
-        'advisor': record.get('advisor', ''),
-        'machine_hours': record.get('machine_hours', 0.0),
-        'cost': record.get('cost', 0),
-        'remark': record.get('remark', ''),
-        'start_time': start_time,
-        'end_time': end_time
-    }
+    st.session_state.form_data = record.to_form_data()
+    st.session_state.edit_original = record
     
     st.session_state.current_edit_id = record_id
     
@@ -989,8 +1003,7 @@ def show_equipment_management():
                 if submitted:
                     if verify_password(password):
                         st.session_state.is_authenticated = True
-                        st.success("验证成功！")
-                        time.sleep(0.5)
+                        notify("验证成功！")
                         st.rerun()
                     else:
                         st.error("密码错误！")
@@ -1021,8 +1034,7 @@ def show_equipment_management():
                     if st.button("删除", key=delete_key, use_container_width=True):
                         # 直接删除，不再需要确认对话框
                         if st.session_state.db_manager.delete_equipment_by_name(device):
-                            st.success(f"已删除设备: {device}")
-                            time.sleep(1)
+                            notify(f"已删除设备: {device}")
                             st.rerun()
                         else:
                             st.error(f"删除设备失败")
@@ -1045,40 +1057,30 @@ def show_equipment_management():
                 else:
                     device_name = new_device.strip()
                     
-                    # 检查是否已存在
-                    existing_devices = Utils.get_preset_equipment()
-                    if device_name in existing_devices:
+                    # 是否已存在由数据库的唯一约束判断，一次请求完成
+                    added = st.session_state.db_manager.add_equipment(device_name)
+                    if added:
+                        notify(f"已添加设备: {device_name}")
+                        st.rerun()
+                    elif added is False:
                         st.warning(f"设备 '{device_name}' 已存在")
                     else:
-                        # 添加到数据库
-                        if st.session_state.db_manager.add_equipment(device_name):
-                            st.success(f"已添加设备: {device_name}")
-                            time.sleep(1)
-                            st.rerun()
-                        else:
-                            st.error("添加设备失败")
+                        st.error("添加设备失败")
         
         # 只保留恢复默认按钮
         st.markdown("---")
         if st.button("恢复默认设备", use_container_width=True):
             # 直接恢复默认，不再需要确认对话框
-            default_devices = ["疲劳性能试验机", "透射电子显微镜"]
-            restored_count = 0
-            
             with st.spinner("正在恢复默认设备..."):
-                for device in default_devices:
-                    # 检查是否已存在
-                    existing_devices = Utils.get_preset_equipment()
-                    if device not in existing_devices:
-                        if st.session_state.db_manager.add_equipment(device):
-                            restored_count += 1
+                restored_count = st.session_state.db_manager.restore_default_equipment()
             
             if restored_count > 0:
-                st.success(f"已恢复 {restored_count} 个默认设备")
-                time.sleep(1)
+                notify(f"已恢复 {restored_count} 个默认设备")
                 st.rerun()
-            else:
+            elif restored_count == 0:
                 st.info("默认设备已全部存在")
+            else:
+                st.error("恢复默认设备失败")
         
     except Exception as e:
         logger.error(f"设备管理失败: {e}", exc_info=True)
@@ -1094,6 +1096,9 @@ def main():
     # 初始化session state - 设置默认显示查看记录
     init_session_state()
     
+    # 显示上一次操作留下的通知
+    show_notifications()
+    
     # 默认显示查看记录
     if 'menu' not in st.session_state or not st.session_state.menu:
         st.session_state.menu = "📋 查看记录"
@@ -1115,9 +1120,7 @@ def main():
                 if submitted:
                     if verify_password(password):
                         st.session_state.is_authenticated = True
-                        success_msg = st.success("验证成功！")
-                        time.sleep(0.5)
-                        success_msg.empty()
+                        notify("验证成功！")
                         st.rerun()
                     else:
                         st.error("密码错误！")
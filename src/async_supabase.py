@@ -0,0 +1,254 @@
+# src/async_supabase.py - 异步数据层
+import asyncio
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+import streamlit as st
+
+from errors import classify_error, CircuitOpenError, SupabaseRequestError
+from health_monitor import health_monitor
+from retry_policy import RetryPolicy
+from supabase_client import build_select, client_options
+from search_index import narrow_filters
+from record_counts import record_counts, count_key
+from record_query import (build_record_filters, keyset_filter, page_columns, build_page,
+                          empty_page, PAGE_ORDER, PAGE_ORDER_REVERSED,
+                          STATS_AGGREGATES, STATS_FUNCTION, stats_group_column, stats_rpc_params,
+                          stats_rpc_rows, rollup_stats, aggregate_support)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSupabaseClient:
+    """Supabase异步客户端封装类 - 超时、重试和异常类型与 SupabaseClient 一致"""
+
+    def __init__(self, retry_policy: RetryPolicy = None):
+        self.client = None
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    async def connect(self, url: str, key: str, timeout_seconds: float = 10):
+        """创建异步客户端"""
+        try:
+            from supabase import acreate_client
+            self.client = await acreate_client(url, key, options=client_options(timeout_seconds, is_async=True))
+            logger.info("✅ Supabase异步连接成功")
+        except Exception as e:
+            logger.error(f"Supabase异步客户端初始化失败: {e}")
+            self.client = None
+        return self
+
+    async def _execute_once(self, query, operation: str):
+        """执行一次请求并向健康监视器报告结果，熔断期间直接失败"""
+        if not health_monitor.allow_request():
+            raise CircuitOpenError(f"后端暂不可用，{health_monitor.retry_after():.0f} 秒后重试", operation)
+        try:
+            response = await query.execute()
+        except Exception as e:
+            error = classify_error(e, operation)
+            if error.retryable:
+                health_monitor.record_failure(e)
+            else:
+                health_monitor.record_success()
+            raise error from e
+        health_monitor.record_success()
+        return response
+
+    async def select(self, table: str, conditions: dict = None, order_by: str = None, limit: int = None,
+                     filters: list = None, columns=None):
+        """查询数据 - 参数含义同 SupabaseClient.select"""
+        if not self.client:
+            return []
+        query = build_select(self.client.table(table),
+                             conditions=conditions,
+                             filters=filters,
+                             order_by=order_by,
+                             limit=limit,
+                             columns=columns)
+        response = await self.retry_policy.acall(lambda: self._execute_once(query, f"查询{table}"))
+        return response.data if response.data else []
+
+    async def count(self, table: str, conditions: dict = None, filters: list = None,
+                    method: str = "exact") -> Optional[int]:
+        """统计行数 - HEAD 请求，不传输任何行"""
+        if not self.client:
+            return None
+        query = build_select(self.client.table(table),
+                             conditions=conditions,
+                             filters=filters,
+                             columns=['id'],
+                             count=method,
+                             head=True)
+        response = await self.retry_policy.acall(lambda: self._execute_once(query, f"统计{table}"))
+        return response.count
+
+    async def rpc(self, function: str, params: dict = None):
+        """调用只读的数据库函数，返回结果行"""
+        if not self.client:
+            return None
+        query = self.client.rpc(function, params or {})
+        response = await self.retry_policy.acall(lambda: self._execute_once(query, f"调用{function}"))
+        return response.data or []
+
+
+class AsyncSupabaseManager:
+    """Supabase异步数据库管理器
+
+    与 SupabaseManager 共用查询构造和计数缓存，
+    互不依赖的读取通过 asyncio.gather 并发执行。只访问服务端，
+    SupabaseManager 的本地副本已同步时调用方应改用同步数据层读取副本。
+    """
+
+    def __init__(self, client: AsyncSupabaseClient, index_max_ids: int = 500):
+        self.client = client
+        self.index_max_ids = index_max_ids
+
+    @classmethod
+    async def create(cls, url: str, key: str, config_manager=None):
+        """创建并连接异步管理器"""
+        timeout = config_manager.get("timeout_seconds", 10) if config_manager else 10
+        client = AsyncSupabaseClient(RetryPolicy.from_config(config_manager))
+        await client.connect(url, key, timeout)
+        index_max_ids = config_manager.get("search_index_max_ids", 500) if config_manager else 500
+        return cls(client, index_max_ids)
+
+    def _record_filters(self, **filter_kwargs) -> list:
+        """构造记录过滤条件，关键词条件先由内存索引换算为候选 id"""
+        return build_record_filters(**narrow_filters(filter_kwargs, max_ids=self.index_max_ids))
+
+    async def get_records_page(self,
+                               page_size: int = 50,
+                               cursor: Optional[tuple] = None,
+                               direction: str = "next",
+                               columns: Optional[List[str]] = None,
+                               **filter_kwargs) -> Dict[str, Any]:
+        """键集分页查询记录 - 参数含义同 SupabaseManager.get_records_page"""
+        if self.client.client is None:
+            return empty_page()
+
+        filters = self._record_filters(**filter_kwargs)
+        backward = direction == "prev" and cursor is not None
+        if cursor is not None:
+            filters.append(keyset_filter(cursor, backward))
+
+        records = await self.client.select('entries',
+                                           filters=filters,
+                                           order_by=PAGE_ORDER_REVERSED if backward else PAGE_ORDER,
+                                           limit=page_size + 1,
+                                           columns=page_columns(columns))
+        return build_page(records, page_size, cursor, backward)
+
+    async def count_records(self, **filter_kwargs) -> Optional[int]:
+        """统计符合条件的记录数 - 与 SupabaseManager.count_records 共用按过滤条件的计数缓存"""
+        key = count_key("exact", filter_kwargs)
+        hit, count, version = record_counts.lookup(key)
+        if hit:
+            return count
+        count = await self.client.count('entries', filters=self._record_filters(**filter_kwargs))
+        record_counts.store(key, count, version)
+        return count
+
+    async def get_record_stats(self, group_by: Optional[str] = None, **filter_kwargs) -> Optional[Dict[str, Any]]:
+        """服务端聚合统计 - 参数含义同 SupabaseManager.get_record_stats
+
+        依次使用 PostgREST 聚合查询和 record_stats 数据库函数，不可用的方式记在共享的
+        aggregate_support 中；两者都不可用时返回 None，由调用方改用 SupabaseManager 汇总明细。
+        """
+        if self.client.client is None:
+            return None
+        column = stats_group_column(group_by)
+        filters = self._record_filters(**filter_kwargs)
+        if aggregate_support.enabled:
+            columns = [column, *STATS_AGGREGATES] if column else STATS_AGGREGATES
+            try:
+                return rollup_stats(await self.client.select('entries', filters=filters, columns=columns),
+                                    group_by)
+            except SupabaseRequestError as e:
+                if not aggregate_support.check(e):
+                    raise
+                logger.warning("服务端未启用 PostgREST 聚合函数，改用 record_stats 数据库函数统计")
+        if aggregate_support.function_enabled:
+            try:
+                rows = await self.client.rpc(STATS_FUNCTION, stats_rpc_params(filters, column))
+                return rollup_stats(stats_rpc_rows(rows, column), group_by)
+            except SupabaseRequestError as e:
+                if not aggregate_support.check_function(e):
+                    raise
+                logger.error("数据库中没有 record_stats 函数")
+        return None
+
+    async def load_records_view(self,
+                                page_size: int = 50,
+                                cursor: Optional[tuple] = None,
+                                direction: str = "next",
+                                columns: Optional[List[str]] = None,
+                                **filter_kwargs) -> Dict[str, Any]:
+        """并发加载记录页面所需的数据：当前页、总数和统计"""
+        return await gather_reads(
+            page=self.get_records_page(page_size=page_size, cursor=cursor, direction=direction,
+                                       columns=columns, **filter_kwargs),
+            count=self.count_records(**filter_kwargs),
+            stats=self.get_record_stats(**filter_kwargs)
+        )
+
+
+async def gather_reads(**calls) -> Dict[str, Any]:
+    """并发执行多个互不依赖的读取，返回 {名称: 结果}
+
+    总耗时取决于最慢的一个调用；单个调用失败时记录日志并返回 None，不影响其他结果。
+    """
+    names = list(calls)
+    results = await asyncio.gather(*calls.values(), return_exceptions=True)
+    data = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"并发读取 {name} 失败: {result}")
+            result = None
+        data[name] = result
+    return data
+
+
+# ========== 后台事件循环 ==========
+# Streamlit 脚本在普通线程中运行，异步客户端绑定在进程内唯一的后台事件循环上
+
+_loop = None
+_loop_lock = threading.Lock()
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="supabase-async-loop", daemon=True).start()
+        return _loop
+
+
+def run_async(coro, timeout: float = None):
+    """在后台事件循环中运行协程，阻塞等待结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+def get_async_manager() -> Optional[AsyncSupabaseManager]:
+    """获取进程内共享的异步管理器，未配置或连接失败时返回 None"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            try:
+                if "SUPABASE_URL" not in st.secrets or "SUPABASE_KEY" not in st.secrets:
+                    raise ValueError("缺少Supabase配置")
+                from config_manager import ConfigManager
+                manager = run_async(AsyncSupabaseManager.create(st.secrets["SUPABASE_URL"],
+                                                                st.secrets["SUPABASE_KEY"],
+                                                                ConfigManager()))
+            except Exception as e:
+                logger.error(f"异步管理器初始化失败: {e}")
+                return None
+            # 连接失败时不缓存，下次调用重新连接
+            if manager.client.client is None:
+                logger.error("异步管理器连接失败，下次调用时重试")
+                return None
+            _manager = manager
+    return _manager
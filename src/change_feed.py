@@ -0,0 +1,295 @@
+# src/change_feed.py - 数据变更订阅，驱动进程内缓存失效
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from equipment_catalog import equipment_catalog
+from settings_store import settings_store
+
+logger = logging.getLogger(__name__)
+
+# 订阅变更的表
+WATCHED_TABLES = ('entries', 'equipment', 'settings')
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+def make_event(table: str, event_type: str, record: Optional[Dict[str, Any]] = None,
+               old_record: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """构造变更事件：{table, type, record, old_record}，type 为 insert/update/delete"""
+    return {
+        'table': table,
+        'type': event_type.lower(),
+        'record': record or {},
+        'old_record': old_record or {}
+    }
+
+
+class ChangeFeed:
+    """变更分发器
+
+    事件源（Supabase Realtime、轮询或测试用的 FakeChangeSource）把变更事件交给 publish()，
+    由订阅者更新各自的缓存。订阅者按相等性去重，重复订阅同一个回调不会重复执行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.source = None
+
+    def subscribe(self, callback):
+        """订阅全部变更事件，callback(event)"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event: Dict[str, Any]):
+        """把事件分发给所有订阅者，单个订阅者出错不影响其他订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"处理变更事件失败: {e}, 事件: {event}")
+
+    def start(self, source) -> bool:
+        """启动事件源，已有事件源在运行时不重复启动"""
+        with self._lock:
+            if self.source is not None:
+                return False
+            self.source = source
+        try:
+            source.start(self)
+            logger.info(f"变更订阅已启动: {source.name}")
+            return True
+        except Exception:
+            with self._lock:
+                self.source = None
+            raise
+
+    def stop(self):
+        """停止事件源"""
+        with self._lock:
+            source, self.source = self.source, None
+        if source is not None:
+            source.stop()
+
+    def wait_baseline(self, timeout: Optional[float] = None) -> bool:
+        """等待事件源记下变更起点，之后的写入都会以事件送达；没有事件源时返回 False
+
+        需要全量加载的缓存（如关键词索引）在起点之后再读取数据，
+        否则加载和起点之间的写入既不在加载结果中，也不会收到事件。
+        """
+        source = self.source
+        if source is None:
+            return False
+        baseline = getattr(source, 'baseline_taken', None)
+        return True if baseline is None else baseline.wait(timeout)
+
+
+def apply_to_caches(event: Dict[str, Any]):
+    """根据变更事件更新设备目录和设置缓存"""
+    table = event['table']
+    if table == 'equipment':
+        equipment_catalog.invalidate()
+    elif table == 'settings':
+        if event['type'] == DELETE:
+            key = event['old_record'].get('key')
+            if key is None:
+                settings_store.invalidate()
+            else:
+                settings_store.remove(key)
+        elif 'key' in event['record']:
+            settings_store.put(event['record']['key'], event['record'].get('value'))
+        else:
+            settings_store.invalidate()
+
+
+class FakeChangeSource:
+    """本地事件源，供测试和开发环境手动注入变更"""
+
+    name = "fake"
+
+    def __init__(self):
+        self.feed = None
+
+    def start(self, feed: ChangeFeed):
+        self.feed = feed
+
+    def stop(self):
+        self.feed = None
+
+    def emit(self, table: str, event_type: str, record: Optional[Dict[str, Any]] = None,
+             old_record: Optional[Dict[str, Any]] = None):
+        """同步地发布一个变更事件"""
+        if self.feed is not None:
+            self.feed.publish(make_event(table, event_type, record, old_record))
+
+
+class RealtimeChangeSource:
+    """Supabase Realtime 事件源
+
+    在后台事件循环上订阅 postgres_changes，需要在 Supabase 中为这些表启用 Realtime。
+    """
+
+    name = "realtime"
+
+    def __init__(self, async_client, tables=WATCHED_TABLES):
+        self.async_client = async_client
+        self.tables = tables
+        self._channel = None
+
+    def start(self, feed: ChangeFeed):
+        from async_supabase import run_async
+        run_async(self._subscribe(feed), timeout=30)
+
+    async def _subscribe(self, feed: ChangeFeed):
+        channel = self.async_client.channel('db-changes')
+        for table in self.tables:
+            channel.on_postgres_changes(
+                '*', schema='public', table=table,
+                callback=lambda payload, table=table: feed.publish(_from_realtime(table, payload))
+            )
+        await channel.subscribe()
+        self._channel = channel
+
+    def stop(self):
+        if self._channel is not None:
+            from async_supabase import run_async
+            try:
+                run_async(self.async_client.remove_channel(self._channel), timeout=10)
+            except Exception as e:
+                logger.error(f"取消 Realtime 订阅失败: {e}")
+            self._channel = None
+
+
+def _from_realtime(table: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """把 Realtime 推送的负载转换为变更事件（兼容 data/record 和 eventType/new 两种格式）"""
+    data = payload.get('data', payload)
+    event_type = data.get('type') or data.get('eventType') or UPDATE
+    record = data.get('record') or data.get('new')
+    old_record = data.get('old_record') or data.get('old')
+    return make_event(data.get('table', table), event_type, record, old_record)
+
+
+class PollingChangeSource:
+    """轮询事件源 - Realtime 不可用时的后备方案
+
+    entries 按 id 发现新增、按 (last_modified, id) 水位发现修改，无法发现删除；
+    equipment 和 settings 表很小，每次整表读取后与上一次的快照比较。
+    首次轮询成功记下起点后设置 baseline_taken。
+    """
+
+    name = "polling"
+
+    def __init__(self, client, interval_seconds: float = 30, batch_size: int = 500):
+        self.client = client
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.feed = None
+        self._snapshots = {}
+        self._max_id = None
+        self._watermark = None
+        self._stopped = threading.Event()
+        self.baseline_taken = threading.Event()
+        self._thread = None
+
+    def start(self, feed: ChangeFeed):
+        self.feed = feed
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="change-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.warning(f"轮询数据变更失败: {e}")
+            self._stopped.wait(self.interval_seconds)
+
+    def poll_once(self) -> List[Dict[str, Any]]:
+        """检查一次变更并发布，返回本次发布的事件（首次调用只记录起点）"""
+        events = self._diff_table('equipment', 'id') + self._diff_table('settings', 'key')
+        events += self._poll_entries()
+        self.baseline_taken.set()
+        for event in events:
+            self.feed.publish(event)
+        return events
+
+    def _diff_table(self, table: str, key: str) -> List[Dict[str, Any]]:
+        rows = {row[key]: row for row in self.client.select(table)}
+        previous = self._snapshots.get(table)
+        self._snapshots[table] = rows
+        if previous is None:
+            return []
+
+        events = []
+        for row_key, row in rows.items():
+            if row_key not in previous:
+                events.append(make_event(table, INSERT, row))
+            elif row != previous[row_key]:
+                events.append(make_event(table, UPDATE, row, previous[row_key]))
+        for row_key, row in previous.items():
+            if row_key not in rows:
+                events.append(make_event(table, DELETE, None, row))
+        return events
+
+    def _poll_entries(self) -> List[Dict[str, Any]]:
+        if self._max_id is None:
+            latest = self.client.select('entries', order_by='id DESC', limit=1, columns=['id'])
+            self._max_id = latest[0]['id'] if latest else 0
+            self._watermark = self._latest_modified()
+            return []
+
+        events = []
+        new_rows = self.client.select('entries', filters=[('id', 'gt', self._max_id)],
+                                      order_by='id ASC', limit=self.batch_size)
+        for row in new_rows:
+            events.append(make_event('entries', INSERT, row))
+        new_ids = {row['id'] for row in new_rows}
+        if new_rows:
+            self._max_id = new_rows[-1]['id']
+
+        if self._watermark is None:
+            # 还没有带 last_modified 的行，之后的修改从最新的一行开始计算
+            self._watermark = self._latest_modified()
+            return events
+
+        modified, row_id = self._watermark
+        filters = [(None, 'or', [
+            ('last_modified', 'gt', modified),
+            (None, 'and', [('last_modified', 'eq', modified), ('id', 'gt', row_id)])
+        ])]
+        changed = self.client.select('entries', filters=filters,
+                                     order_by='last_modified ASC, id ASC', limit=self.batch_size)
+        for row in changed:
+            if row['id'] not in new_ids:
+                events.append(make_event('entries', UPDATE, row))
+        if changed:
+            self._watermark = (changed[-1]['last_modified'], changed[-1]['id'])
+        return events
+
+    def _latest_modified(self) -> Optional[tuple]:
+        rows = self.client.select('entries', order_by='last_modified DESC NULLS LAST, id DESC',
+                                  limit=1, columns=['id', 'last_modified'])
+        if rows and rows[0]['last_modified'] is not None:
+            return rows[0]['last_modified'], rows[0]['id']
+        return None
+
+
+# 进程内共享的变更分发器
+change_feed = ChangeFeed()
+change_feed.subscribe(apply_to_caches)
@@ -25,7 +25,26 @@ class ConfigManager:
                 self.config = {
                     "default_admin_password": "9999",
                     "max_records_per_page": 200,
-                    "timeout_seconds": 30
+                    "timeout_seconds": 10,
+                    "read_timeout_seconds": 20,
+                    "read_max_attempts": 3,
+                    "retry_base_delay_seconds": 0.2,
+                    "retry_max_delay_seconds": 2.0,
+                    "health_check_ttl_seconds": 60,
+                    "circuit_failure_threshold": 3,
+                    "circuit_cooldown_seconds": 30,
+                    "settings_cache_ttl_seconds": 300,
+                    "offline_journal_path": "data/offline_journal.db",
+                    "replica_enabled": False,
+                    "replica_path": "data/replica.db",
+                    "replica_sync_interval_seconds": 30,
+                    "replica_reconcile_every": 10,
+                    "change_feed": "polling",
+                    "change_feed_poll_seconds": 30,
+                    "change_feed_cache_ttl_seconds": 3600,
+                    "search_index_enabled": True,
+                    "search_index_max_ids": 500,
+                    "record_count_cache_ttl_seconds": 30
                 }
         except Exception as e:
             logger.error(f"加载配置失败: {e}")
@@ -0,0 +1,62 @@
+# src/equipment_catalog.py - 进程内共享的设备目录缓存
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EquipmentCatalog:
+    """设备目录缓存
+
+    所有会话共享同一份设备列表。每次写设备表后调用 invalidate() 递增版本号，
+    读取时只有缓存的版本落后于当前版本才会重新查询数据库。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.version = 0
+        self._loaded_version = -1
+        self._devices = []
+
+    def invalidate(self):
+        """设备表已变更，递增版本号"""
+        with self._lock:
+            self.version += 1
+            logger.info(f"设备目录版本更新为 {self.version}")
+
+    def get(self, loader) -> list:
+        """返回设备列表，缓存过期时调用 loader() 重新加载
+
+        loader 失败时抛出异常：已有缓存时继续返回旧的设备列表，否则向上抛出。
+        """
+        with self._lock:
+            if self._loaded_version == self.version:
+                return list(self._devices)
+
+        # 同一时间只允许一个会话加载，其余会话等待后直接读取缓存
+        with self._load_lock:
+            with self._lock:
+                if self._loaded_version == self.version:
+                    return list(self._devices)
+                version = self.version
+
+            try:
+                devices = loader()
+            except Exception as e:
+                with self._lock:
+                    if self._loaded_version < 0:
+                        raise
+                    logger.warning(f"重新加载设备目录失败，继续使用缓存: {e}")
+                    return list(self._devices)
+
+            with self._lock:
+                # 加载期间如果又有写入，版本号已经变化，下次读取会重新加载
+                self._devices = list(devices)
+                self._loaded_version = version
+            logger.info(f"设备目录已加载 {len(devices)} 个设备 (版本 {version})")
+            return list(devices)
+
+
+# 进程内共享的设备目录
+equipment_catalog = EquipmentCatalog()
@@ -0,0 +1,72 @@
+# src/errors.py - 后端调用的类型化异常
+import logging
+
+logger = logging.getLogger(__name__)
+
+# PostgREST/PostgreSQL 中可以重试的错误码
+# PGRST000-003: PostgREST 与数据库之间的连接错误；57014: 语句超时；
+# 40001/40P01: 序列化失败/死锁；53300: 连接数过多
+_TRANSIENT_CODES = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003', '40001', '40P01', '53300'}
+_TIMEOUT_CODES = {'57014'}
+
+
+class SupabaseError(Exception):
+    """后端调用失败"""
+
+    # 是否值得重试
+    retryable = False
+
+    def __init__(self, message: str, operation: str = None, cause: Exception = None):
+        super().__init__(message)
+        self.operation = operation
+        self.cause = cause
+
+
+class SupabaseTimeoutError(SupabaseError):
+    """后端响应超时"""
+
+    retryable = True
+
+
+class SupabaseUnavailableError(SupabaseError):
+    """后端暂时不可用（网络错误、5xx、限流）"""
+
+    retryable = True
+
+
+class CircuitOpenError(SupabaseUnavailableError):
+    """熔断器打开时的快速失败，不重试"""
+
+    retryable = False
+
+
+class SupabaseRequestError(SupabaseError):
+    """请求被后端拒绝（参数错误、约束冲突等），重试无意义"""
+
+
+class RecordConflictError(SupabaseRequestError):
+    """记录在读取之后已被其他会话修改或删除（乐观并发检查失败）"""
+
+
+def classify_error(error: Exception, operation: str = None) -> SupabaseError:
+    """把底层异常转换为类型化异常"""
+    if isinstance(error, SupabaseError):
+        return error
+
+    try:
+        import httpx
+        if isinstance(error, httpx.TimeoutException):
+            return SupabaseTimeoutError(f"后端响应超时: {error}", operation, error)
+        if isinstance(error, httpx.TransportError):
+            return SupabaseUnavailableError(f"无法连接后端: {error}", operation, error)
+    except ImportError:
+        pass
+
+    code = str(getattr(error, 'code', '') or '')
+    if code in _TIMEOUT_CODES:
+        return SupabaseTimeoutError(f"数据库语句超时: {error}", operation, error)
+    # 网关返回非 JSON 错误时，错误码就是 HTTP 状态码
+    is_http_status = len(code) == 3 and code.isdigit()
+    if code in _TRANSIENT_CODES or (is_http_status and (code == '429' or int(code) >= 500)):
+        return SupabaseUnavailableError(f"后端暂时不可用: {error}", operation, error)
+    return SupabaseRequestError(f"请求失败: {error}", operation, error)
@@ -0,0 +1,132 @@
+# src/health_monitor.py - 后端健康检查与熔断器
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """后端健康监视器
+
+    所有会话共享同一个实例：
+    - 最近一次成功请求在 ttl_seconds 内视为健康，不再额外探测；
+    - 连续失败 failure_threshold 次后熔断，cooldown_seconds 内的请求直接失败，
+      不再等待完整的 HTTP 超时；
+    - 冷却结束后进入半开状态，只放行一个探测请求，成功则恢复，失败则重新熔断；
+      探测请求超过 probe_timeout_seconds（HTTP 超时）仍无结果时放行下一个探测。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown_seconds: float = 30, ttl_seconds: float = 60,
+                 probe_timeout_seconds: float = 10):
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.ttl_seconds = ttl_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self.last_success_at = 0.0
+        self.last_error = None
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    def configure(self, failure_threshold=None, cooldown_seconds=None, ttl_seconds=None,
+                  probe_timeout_seconds=None):
+        """更新熔断参数"""
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = max(1, int(failure_threshold))
+            if cooldown_seconds is not None:
+                self.cooldown_seconds = float(cooldown_seconds)
+            if ttl_seconds is not None:
+                self.ttl_seconds = float(ttl_seconds)
+            if probe_timeout_seconds is not None:
+                self.probe_timeout_seconds = float(probe_timeout_seconds)
+
+    def allow_request(self) -> bool:
+        """判断当前是否允许向后端发起请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                    return False
+                # 冷却结束，放行一个探测请求
+                self.state = self.HALF_OPEN
+                self._start_probe()
+                logger.info("熔断冷却结束，尝试探测后端")
+                return True
+            # 半开状态只允许一个探测请求
+            if self._probe_in_flight and self._probe_time_left() > 0:
+                return False
+            self._start_probe()
+            return True
+
+    def _start_probe(self):
+        self._probe_in_flight = True
+        self._probe_started_at = time.monotonic()
+
+    def _probe_time_left(self) -> float:
+        return max(0.0, self.probe_timeout_seconds - (time.monotonic() - self._probe_started_at))
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("✅ 后端已恢复，关闭熔断")
+            self.state = self.CLOSED
+            self.failure_count = 0
+            self.last_success_at = time.monotonic()
+            self.last_error = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error=None):
+        """记录一次失败请求，必要时打开熔断"""
+        with self._lock:
+            self.failure_count += 1
+            self.last_error = str(error) if error else None
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failure_count >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"⚠️ 后端连续失败 {self.failure_count} 次，熔断 {self.cooldown_seconds} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_healthy(self, probe=None) -> bool:
+        """返回后端是否可用
+
+        TTL 内有成功记录时直接返回缓存结果；熔断期间直接返回 False；
+        其余情况调用 probe() 探测一次（probe 应通过客户端执行，以便记录结果）。
+        """
+        with self._lock:
+            if self.state == self.CLOSED and time.monotonic() - self.last_success_at < self.ttl_seconds:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at < self.cooldown_seconds:
+                return False
+
+        if probe is None:
+            return self.state != self.OPEN
+        try:
+            return bool(probe())
+        except Exception as e:
+            logger.error(f"健康探测失败: {e}")
+            return False
+
+    def retry_after(self) -> float:
+        """距离允许下一个请求的秒数：熔断时为剩余冷却时间，半开时为正在进行的探测剩余的时间"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+            if self.state == self.HALF_OPEN and self._probe_in_flight:
+                return self._probe_time_left()
+            return 0.0
+
+
+# 进程内共享的健康监视器
+health_monitor = HealthMonitor()
@@ -0,0 +1,454 @@
+# src/local_replica.py - entries/equipment/settings 的本地 SQLite 只读副本
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+
+from errors import SupabaseError
+from supabase_client import parse_order_by
+
+logger = logging.getLogger(__name__)
+
+# 副本表结构：列名 -> SQLite 类型，第一列为主键；服务端多出的列不会保存
+_SCHEMAS = {
+    'entries': {
+        'id': 'INTEGER PRIMARY KEY',
+        'register_datetime': 'TEXT',
+        'test_date': 'TEXT',
+        'test_time': 'TEXT',
+        'name': 'TEXT',
+        'contact': 'TEXT',
+        'advisor': 'TEXT',
+        'equipment': 'TEXT',
+        'machine_hours': 'REAL',
+        'cost': 'INTEGER',
+        'remark': 'TEXT',
+        'created_at': 'TEXT',
+        'last_modified': 'TEXT'
+    },
+    'equipment': {
+        'id': 'INTEGER PRIMARY KEY',
+        'name': 'TEXT',
+        'is_active': 'INTEGER',
+        'created_at': 'TEXT'
+    },
+    'settings': {
+        'key': 'TEXT PRIMARY KEY',
+        'value': 'TEXT'
+    }
+}
+
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_entries_test_date ON entries (test_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_entries_equipment ON entries (equipment)",
+    "CREATE INDEX IF NOT EXISTS idx_entries_name ON entries (name)",
+    "CREATE INDEX IF NOT EXISTS idx_entries_last_modified ON entries (last_modified, id)"
+)
+
+_SIMPLE_SQL_OPS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+_COLUMN_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class LocalReplica:
+    """本地只读副本
+
+    entries 按 (last_modified, id) 水位增量同步，新插入的行按 id 增量同步；
+    增量同步发现不了服务端的删除，由 reconcile_deletes() 定期按 id 核对。
+    equipment 和 settings 表很小且没有 last_modified 列，每次同步整表刷新。
+    查询接口与 SupabaseClient.select 相同，后端不可用时仍可读取。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for table, schema in _SCHEMAS.items():
+            columns = ", ".join(f"{column} {kind}" for column, kind in schema.items())
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+        for statement in _INDEXES:
+            self._conn.execute(statement)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT PRIMARY KEY,
+                watermark TEXT,
+                watermark_id INTEGER,
+                synced_at TEXT
+            )
+        """)
+
+    @property
+    def ready(self) -> bool:
+        """是否已完成过一次全量同步"""
+        return self._watermark('entries') is not None
+
+    def _watermark(self, table: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, watermark_id FROM sync_state WHERE table_name = ?", (table,)
+            ).fetchone()
+        return row
+
+    def _set_watermark(self, table: str, watermark: Optional[str], watermark_id: Optional[int]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (table_name, watermark, watermark_id, synced_at) "
+                "VALUES (?, ?, ?, datetime('now', 'localtime'))",
+                (table, watermark, watermark_id)
+            )
+
+    def upsert_rows(self, table: str, rows: List[Dict[str, Any]]):
+        """写入或覆盖副本中的行"""
+        if rows:
+            self._write(table, rows, replace=False)
+
+    def replace_all(self, table: str, rows: List[Dict[str, Any]]):
+        """用服务端的整表数据替换副本"""
+        self._write(table, rows, replace=True)
+
+    def _write(self, table: str, rows: List[Dict[str, Any]], replace: bool):
+        """在一个事务内写入，读取方不会看到写了一半的表"""
+        columns = list(_SCHEMAS[table])
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if replace:
+                    self._conn.execute(f"DELETE FROM {table}")
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                    [tuple(_to_sqlite(row.get(column)) for column in columns) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_rows(self, table: str, ids: list):
+        """删除副本中的行"""
+        key = next(iter(_SCHEMAS[table]))
+        with self._lock:
+            self._conn.executemany(f"DELETE FROM {table} WHERE {key} = ?", [(i,) for i in ids])
+
+    def apply_change(self, event: Dict[str, Any]):
+        """把变更订阅收到的事件应用到副本"""
+        table = event['table']
+        if table not in _SCHEMAS or not self.ready:
+            return
+        key = next(iter(_SCHEMAS[table]))
+        if event['type'] == 'delete':
+            if key in event['old_record']:
+                self.delete_rows(table, [event['old_record'][key]])
+        elif key in event['record']:
+            self.upsert_rows(table, [event['record']])
+
+    def delete_missing(self, table: str, keep_ids: set, up_to: Optional[int] = None):
+        """删除服务端已不存在的行；up_to 不为 None 时只核对 id 不超过它的行"""
+        with self._lock:
+            if up_to is None:
+                local_ids = {row[0] for row in self._conn.execute(f"SELECT id FROM {table}")}
+            else:
+                local_ids = {row[0] for row in self._conn.execute(f"SELECT id FROM {table} WHERE id <= ?",
+                                                                   (up_to,))}
+            stale = local_ids - keep_ids
+            if stale:
+                self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in stale])
+        if stale:
+            logger.info(f"本地副本删除 {len(stale)} 条服务端已不存在的 {table} 记录")
+
+    def select(self, table: str, conditions: dict = None, order_by: str = None, limit: int = None,
+               filters: list = None, columns=None) -> List[Dict[str, Any]]:
+        """查询副本 - 参数含义同 SupabaseClient.select"""
+        if table not in _SCHEMAS:
+            raise ValueError(f"本地副本不包含表: {table}")
+
+        where, params = _format_where(conditions, filters)
+        sql = f"SELECT {_format_columns(columns)} FROM {table}{where}"
+        if order_by:
+            sql += " ORDER BY " + _format_order(parse_order_by(order_by))
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        return self._query(sql, params)
+
+    def record_stats(self, filters: list = None, group_column: Optional[str] = None) -> List[Dict[str, Any]]:
+        """在副本中聚合 entries：每组返回分组字段、count、hours、cost，供 rollup_stats 汇总"""
+        where, params = _format_where(None, filters)
+        aggregates = "COUNT(*) AS count, SUM(machine_hours) AS hours, SUM(cost) AS cost"
+        if group_column is None:
+            return self._query(f"SELECT {aggregates} FROM entries{where}", params)
+        column = _column(group_column)
+        return self._query(f"SELECT {column}, {aggregates} FROM entries{where} GROUP BY {column}", params)
+
+    def _query(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def sync(self, client, batch_size: int = 1000) -> int:
+        """从服务端增量拉取变更，返回写入副本的 entries 行数（失败时抛出 SupabaseError）"""
+        for table in ('equipment', 'settings'):
+            self.replace_all(table, client.select(table))
+
+        state = self._watermark('entries')
+        if state is None:
+            return self._full_sync(client, batch_size)
+
+        watermark, watermark_id = state
+        # 新插入的行按 id 拉取，不依赖客户端写入的 last_modified 时间
+        with self._lock:
+            max_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+        total = self._pull(client, batch_size, lambda last: [('id', 'gt', last)],
+                           'id ASC', lambda row: row['id'], max_id)
+
+        # 修改过的行按 (last_modified, id) 水位拉取
+        if watermark is not None:
+            def after(position):
+                modified, row_id = position
+                return [(None, 'or', [
+                    ('last_modified', 'gt', modified),
+                    (None, 'and', [('last_modified', 'eq', modified), ('id', 'gt', row_id)])
+                ])]
+
+            position = (watermark, watermark_id or 0)
+            total += self._pull(client, batch_size, after, 'last_modified ASC, id ASC',
+                                lambda row: (row['last_modified'], row['id']), position,
+                                on_batch=lambda last: self._set_watermark('entries', *last))
+        else:
+            # 上次同步时还没有带 last_modified 的行
+            self._set_watermark('entries', *self._max_modified())
+        return total
+
+    def reconcile_deletes(self, client, batch_size: int = 1000) -> int:
+        """按 id 键集分批读取服务端全部 id（不传输其他列），删除副本中服务端已不存在的 entries
+
+        只核对开始时副本中已有的行，核对期间由变更订阅写入的新行不会被误删。
+        返回删除的行数。
+        """
+        with self._lock:
+            local_max, before = self._conn.execute("SELECT MAX(id), COUNT(*) FROM entries").fetchone()
+        if local_max is None:
+            return 0
+
+        ids = set()
+        last_id = 0
+        while True:
+            rows = client.select('entries', filters=[('id', 'gt', last_id)], order_by='id ASC',
+                                 limit=batch_size, columns=['id'])
+            ids.update(row['id'] for row in rows)
+            if rows:
+                last_id = rows[-1]['id']
+            if len(rows) < batch_size:
+                break
+
+        self.delete_missing('entries', ids, up_to=local_max)
+        with self._lock:
+            after = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return before - after
+
+    def _full_sync(self, client, batch_size: int) -> int:
+        """首次同步：按 id 分批拉取全表，再以最大的 last_modified 作为水位"""
+        ids = set()
+        total = self._pull(client, batch_size, lambda last: [('id', 'gt', last)],
+                           'id ASC', lambda row: row['id'], 0,
+                           on_rows=lambda rows: ids.update(row['id'] for row in rows))
+        self.delete_missing('entries', ids)
+        self._set_watermark('entries', *self._max_modified())
+        logger.info(f"本地副本全量同步完成: {total} 条记录")
+        return total
+
+    def _max_modified(self) -> tuple:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_modified, id FROM entries WHERE last_modified IS NOT NULL "
+                "ORDER BY last_modified DESC, id DESC LIMIT 1"
+            ).fetchone()
+        return row if row else (None, None)
+
+    def _pull(self, client, batch_size, filters_after, order_by, position_of, start,
+              on_batch=None, on_rows=None) -> int:
+        """按键集分批拉取 entries 并写入副本"""
+        total = 0
+        position = start
+        while True:
+            rows = client.select('entries', filters=filters_after(position),
+                                 order_by=order_by, limit=batch_size)
+            if not rows:
+                return total
+            self.upsert_rows('entries', rows)
+            if on_rows:
+                on_rows(rows)
+            position = position_of(rows[-1])
+            if on_batch:
+                on_batch(position)
+            total += len(rows)
+            if len(rows) < batch_size:
+                return total
+
+
+class ReplicaSyncer:
+    """后台同步线程 - 每 interval_seconds 增量同步一次，wake() 立即同步
+
+    每 reconcile_every 次同步后按 id 核对一次服务端的删除。
+    """
+
+    def __init__(self, replica: LocalReplica, client, interval_seconds: float = 30,
+                 reconcile_every: int = 10):
+        self.replica = replica
+        self.client = client
+        self.interval_seconds = interval_seconds
+        self.reconcile_every = max(1, int(reconcile_every))
+        self._passes = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="replica-syncer", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """立即同步一次"""
+        self._wake.set()
+
+    def on_flushed(self, rows: list):
+        """离线日志回放完成后拉取新写入的记录"""
+        self.wake()
+
+    def stop(self):
+        """停止后台线程"""
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.sync_once()
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def sync_once(self) -> bool:
+        """同步一次，失败时记录日志，副本保留上次同步的数据"""
+        try:
+            count = self.replica.sync(self.client)
+            if count:
+                logger.info(f"本地副本同步 {count} 条记录")
+            self._passes += 1
+            if self._passes % self.reconcile_every == 0:
+                deleted = self.replica.reconcile_deletes(self.client)
+                if deleted:
+                    logger.info(f"本地副本删除 {deleted} 条服务端已删除的记录")
+            return True
+        except SupabaseError as e:
+            logger.warning(f"后端暂不可用，本地副本保留上次同步的数据: {e}")
+        except Exception as e:
+            logger.error(f"本地副本同步失败: {e}", exc_info=True)
+        return False
+
+
+def _to_sqlite(value):
+    """布尔值存为整数，其余原样存储"""
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _column(name: str) -> str:
+    if not _COLUMN_RE.match(name):
+        raise ValueError(f"无效的字段名: {name}")
+    return name
+
+
+def _format_columns(columns) -> str:
+    if not columns:
+        return "*"
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',')]
+    return ", ".join(_column(c) for c in columns)
+
+
+def _format_where(conditions: Optional[dict], filters: Optional[list]) -> tuple:
+    """把等值条件和过滤条件翻译为 WHERE 子句，返回 (SQL, 参数)"""
+    clauses, params = [], []
+    for field, value in (conditions or {}).items():
+        clauses.append(f"{_column(field)} = ?")
+        params.append(_to_sqlite(value))
+    for condition in filters or []:
+        clause, values = _format_filter(condition)
+        clauses.append(clause)
+        params.extend(values)
+    if not clauses:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def _format_order(keys: list) -> str:
+    """把排序字段渲染为 SQLite ORDER BY 子句"""
+    items = []
+    for column, desc, nulls in keys:
+        item = f"{_column(column)} {'DESC' if desc else 'ASC'}"
+        if nulls:
+            item += f" NULLS {nulls.upper()}"
+        items.append(item)
+    return ", ".join(items)
+
+
+def _format_filter(condition) -> tuple:
+    """把过滤条件翻译为 SQLite 表达式，返回 (SQL, 参数)"""
+    column, op, value = condition
+    if op in ('or', 'and'):
+        parts, params = [], []
+        for sub in value:
+            clause, values = _format_filter(sub)
+            parts.append(clause)
+            params.extend(values)
+        if not parts:
+            return ("1" if op == 'and' else "0"), []
+        return "(" + f" {op.upper()} ".join(parts) + ")", params
+    column = _column(column)
+    if op in _SIMPLE_SQL_OPS:
+        return f"{column} {_SIMPLE_SQL_OPS[op]} ?", [_to_sqlite(value)]
+    if op in ('like', 'ilike'):
+        # PostgREST 的 * 通配符等同于 %；SQLite 的 LIKE 对 ASCII 不区分大小写
+        return f"{column} LIKE ? ESCAPE '\\'", [str(value).replace('*', '%')]
+    if op == 'in':
+        values = list(value)
+        if not values:
+            return "0", []
+        return f"{column} IN ({', '.join('?' for _ in values)})", [_to_sqlite(v) for v in values]
+    if op == 'is':
+        if value is None:
+            return f"{column} IS NULL", []
+        return f"{column} IS ?", [_to_sqlite(value)]
+    raise ValueError(f"不支持的过滤操作符: {op}")
+
+
+# 同一进程内每个副本文件只有一个实例和一个同步线程
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_replica(path: str, client=None, interval_seconds: float = 30, reconcile_every: int = 10):
+    """返回 path 对应的 (副本, 同步线程)
+
+    client 已连接时创建并启动同步线程；否则同步线程为 None，副本只提供上次同步的数据。
+    """
+    path = os.path.abspath(path)
+    with _shared_lock:
+        replica, syncer = _shared.get(path, (None, None))
+        if replica is None:
+            replica = LocalReplica(path)
+        if syncer is None and client is not None and client.client is not None:
+            syncer = ReplicaSyncer(replica, client, interval_seconds, reconcile_every)
+            syncer.start()
+        _shared[path] = (replica, syncer)
+        return replica, syncer
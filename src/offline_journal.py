@@ -0,0 +1,324 @@
+# src/offline_journal.py - 本地 SQLite 写前日志与后台回放
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from errors import SupabaseError, SupabaseRequestError
+
+logger = logging.getLogger(__name__)
+
+# 每条日志写入时生成的幂等键，回放时按它合并写入，超时后重试不会重复插入。
+# 被回放的表需要有带唯一约束的同名列，见 supabase/migrations/*_entries_client_uuid.sql
+IDEMPOTENCY_KEY = 'client_uuid'
+
+# 数据库缺少幂等键列或其唯一约束时的错误码：
+# 42703/PGRST204: 列不存在；42P10: 没有与 ON CONFLICT 匹配的唯一约束
+_MISSING_KEY_CODES = {'42703', 'PGRST204', '42P10'}
+
+
+def _error_code(error: Exception) -> str:
+    return str(getattr(getattr(error, 'cause', None), 'code', '') or '')
+
+
+def check_idempotency_key(client) -> Optional[bool]:
+    """检查 entries 表是否有幂等键列 - 有返回 True，没有返回 False，后端不可用时返回 None
+
+    只读查询无法确认唯一约束是否存在，缺少约束时由回放时的 42P10 错误发现。
+    """
+    try:
+        client.select('entries', columns=[IDEMPOTENCY_KEY], limit=1)
+        return True
+    except SupabaseRequestError as e:
+        if _error_code(e) in _MISSING_KEY_CODES:
+            return False
+        raise
+    except SupabaseError as e:
+        logger.warning(f"无法检查 entries.{IDEMPOTENCY_KEY} 列，回放时再确认: {e}")
+        return None
+
+
+def _is_rejection(error: Exception) -> bool:
+    """回放失败是否应拒绝条目：后端拒绝的请求以及后端错误以外的异常，重试同样会失败"""
+    return isinstance(error, SupabaseRequestError) or not isinstance(error, SupabaseError)
+
+
+class WriteAheadJournal:
+    """本地写前日志
+
+    写操作先落盘到 SQLite 再确认，由 JournalFlusher 在后端可用时回放。
+    被后端拒绝的条目标记为 rejected 并保留，便于排查，不会阻塞后续条目。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                op TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_status ON journal (status, seq)")
+
+    def append(self, table: str, op: str, payload: dict) -> int:
+        """追加一条待回放的写操作，返回序号；payload 中没有幂等键时自动生成"""
+        payload = {**payload, IDEMPOTENCY_KEY: payload.get(IDEMPOTENCY_KEY) or str(uuid.uuid4())}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO journal (table_name, op, payload, created_at) VALUES (?, ?, ?, ?)",
+                (table, op, json.dumps(payload, ensure_ascii=False, default=str),
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            return cursor.lastrowid
+
+    def pending(self, limit: int = 50) -> list:
+        """按写入顺序返回待回放的条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, table_name, op, payload FROM journal "
+                "WHERE status = 'pending' ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{'seq': seq, 'table': table, 'op': op, 'payload': json.loads(payload)}
+                for seq, table, op, payload in rows]
+
+    def remove(self, seqs: list):
+        """删除已成功回放的条目"""
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM journal WHERE seq = ? AND status = 'pending'",
+                                   [(seq,) for seq in seqs])
+
+    def mark_attempt(self, seqs: list, error: str):
+        """记录一次失败的回放尝试"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                [(error, seq) for seq in seqs]
+            )
+
+    def reject(self, seq: int, error: str):
+        """后端拒绝的条目不再回放"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET status = 'rejected', attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                (error, seq)
+            )
+
+    def rejected(self, limit: int = 100) -> list:
+        """按写入顺序返回被后端拒绝的条目，含拒绝原因"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, table_name, op, payload, created_at, attempts, last_error FROM journal "
+                "WHERE status = 'rejected' ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{'seq': seq, 'table': table, 'op': op, 'payload': json.loads(payload),
+                 'created_at': created_at, 'attempts': attempts, 'last_error': last_error}
+                for seq, table, op, payload, created_at, attempts, last_error in rows]
+
+    def retry(self, seqs: list):
+        """把被拒绝的条目重新标记为待回放（例如修复数据库约束之后）"""
+        with self._lock:
+            self._conn.executemany("UPDATE journal SET status = 'pending' WHERE seq = ? AND status = 'rejected'",
+                                   [(seq,) for seq in seqs])
+
+    def discard(self, seqs: list):
+        """删除被拒绝的条目"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM journal WHERE seq = ? AND status = 'rejected'",
+                                   [(seq,) for seq in seqs])
+
+    def count(self, status: str = 'pending') -> int:
+        """统计指定状态的条目数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal WHERE status = ?", (status,)).fetchone()[0]
+
+
+class JournalFlusher:
+    """后台回放线程
+
+    有新条目时立即唤醒，否则每 interval_seconds 检查一次；
+    连续的插入按表合并为一次批量插入。后端不可用时本轮停止，等待下一轮。
+    数据库缺少幂等键列或唯一约束时（idempotent 为 False）退回普通插入，
+    写入不再丢失，但超时后的重试可能重复插入。
+    """
+
+    def __init__(self, journal: WriteAheadJournal, client, batch_size: int = 50,
+                 interval_seconds: float = 10):
+        self.journal = journal
+        self.client = client
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.on_flushed = []
+        self.idempotent = True
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """有新条目，立即回放"""
+        self._wake.set()
+
+    def stop(self):
+        """停止后台线程"""
+        self._stopped.set()
+        self._wake.set()
+
+    def disable_idempotency(self, reason: str):
+        """数据库不支持按幂等键合并写入，改为普通插入"""
+        if self.idempotent:
+            logger.error(f"❌ entries 表缺少 {IDEMPOTENCY_KEY} 列或其唯一约束，离线写操作改为普通插入，"
+                         f"超时重试可能产生重复记录；请执行 supabase/migrations 中的迁移。原因: {reason}")
+        self.idempotent = False
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            try:
+                # 一批满额说明可能还有积压，继续回放
+                while self.flush_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"回放写前日志失败: {e}", exc_info=True)
+
+    def flush_once(self) -> int:
+        """回放一批条目，返回本批处理的条目数（含被拒绝的）"""
+        entries = self.journal.pending(self.batch_size)
+        done = 0
+        flushed = []
+        for group in _group_entries(entries):
+            try:
+                flushed.extend(self._replay(group))
+            except SupabaseError as e:
+                self.journal.mark_attempt([entry['seq'] for entry in group], str(e))
+                logger.warning(f"后端暂不可用，{self.journal.count()} 条写操作等待回放: {e}")
+                break
+            done += len(group)
+
+        if flushed:
+            # 回调收到服务端返回的行（含数据库分配的 id）
+            logger.info(f"✅ 已回放 {len(flushed)} 条离线写操作")
+            for callback in self.on_flushed:
+                try:
+                    callback(flushed)
+                except Exception as e:
+                    logger.error(f"回放回调失败: {e}")
+        return done
+
+    def _replay(self, group: list) -> list:
+        """回放一组条目，返回服务端新写入的行
+
+        按幂等键 ON CONFLICT DO NOTHING 写入：请求超时但服务端已提交的条目在下一轮重试时被跳过，
+        不会重复插入（此时服务端不返回这些行）。整批被拒绝时逐条重试，只拒绝出错的条目；
+        每条成功后立即从日志删除。后端暂时不可用的错误向上抛出，条目保留待下一轮回放；
+        其余异常（包括后端错误以外的异常）拒绝对应的条目，避免同一条目每轮都失败。
+        """
+        table, op = group[0]['table'], group[0]['op']
+        try:
+            rows = self._insert(table, op, [entry['payload'] for entry in group])
+            self.journal.remove([entry['seq'] for entry in group])
+            return rows
+        except Exception as e:
+            if not _is_rejection(e):
+                raise
+            if len(group) == 1:
+                logger.error(f"离线写操作被拒绝: {e}", exc_info=not isinstance(e, SupabaseError))
+                self.journal.reject(group[0]['seq'], str(e))
+                return []
+
+        flushed = []
+        for entry in group:
+            try:
+                rows = self._insert(table, op, [entry['payload']])
+            except Exception as e:
+                if not _is_rejection(e):
+                    raise
+                logger.error(f"离线写操作被拒绝: {e}", exc_info=not isinstance(e, SupabaseError))
+                self.journal.reject(entry['seq'], str(e))
+                continue
+            self.journal.remove([entry['seq']])
+            flushed.extend(rows)
+        return flushed
+
+    def _insert(self, table: str, op: str, payloads: list) -> list:
+        """按幂等键插入，已存在的行保持不变（旧版本写入的条目没有幂等键时在这里补上）
+
+        数据库缺少幂等键列或唯一约束时改为不带幂等键的普通插入。
+        """
+        if op != 'insert':
+            raise ValueError(f"不支持的日志操作: {op}")
+        if self.idempotent:
+            payloads = [{**payload, IDEMPOTENCY_KEY: payload.get(IDEMPOTENCY_KEY) or str(uuid.uuid4())}
+                        for payload in payloads]
+            try:
+                return self.client.upsert(table, payloads, on_conflict=IDEMPOTENCY_KEY,
+                                          ignore_duplicates=True) or []
+            except SupabaseRequestError as e:
+                if _error_code(e) not in _MISSING_KEY_CODES:
+                    raise
+                self.disable_idempotency(str(e))
+        rows = [{key: value for key, value in payload.items() if key != IDEMPOTENCY_KEY}
+                for payload in payloads]
+        return self.client.insert_many(table, rows) or []
+
+
+def _group_entries(entries: list) -> list:
+    """把相邻的同表插入合并为一组"""
+    groups = []
+    for entry in entries:
+        if groups and groups[-1][0]['table'] == entry['table'] and groups[-1][0]['op'] == entry['op']:
+            groups[-1].append(entry)
+        else:
+            groups.append([entry])
+    return groups
+
+
+# 同一进程内每个日志文件只有一个日志实例和一个回放线程，避免重复回放
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_journal(path: str, client=None):
+    """返回 path 对应的 (日志, 回放线程)
+
+    client 已连接时创建并启动回放线程；否则回放线程为 None，写操作仍会落盘，
+    等之后某次以可用的客户端调用时再开始回放。
+    """
+    path = os.path.abspath(path)
+    with _shared_lock:
+        journal, flusher = _shared.get(path, (None, None))
+        if journal is None:
+            journal = WriteAheadJournal(path)
+        if flusher is None and client is not None and client.client is not None:
+            flusher = JournalFlusher(journal, client)
+            flusher.start()
+            # 启动时回放上次遗留的条目
+            flusher.wake()
+        _shared[path] = (journal, flusher)
+        return journal, flusher
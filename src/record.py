@@ -0,0 +1,198 @@
+# src/record.py - 登记记录模型
+from datetime import datetime, date, time
+from typing import Any, Dict, Optional
+
+# 未填写测试时间时表单使用的默认时间段
+DEFAULT_START_TIME = time(8, 0)
+DEFAULT_END_TIME = time(9, 0)
+
+
+class Record:
+    """一条登记记录
+
+    从数据库行构造时一次性解析：日期为 date，登记/修改时间为 datetime，
+    测试时间段拆分为 start_time/end_time 两个 time，机时为 float，费用为 int。
+    之后管理器和界面直接使用这些字段，不再重复解析字符串。
+    last_modified_raw 保留数据库返回的原始修改时间（含小数秒和时区），供乐观并发检查按原值比较。
+    """
+
+    __slots__ = ('id', 'register_datetime', 'test_date', 'start_time', 'end_time', 'name', 'contact',
+                 'advisor', 'equipment', 'machine_hours', 'cost', 'remark', 'created_at', 'last_modified',
+                 'last_modified_raw')
+
+    def __init__(self, id: Optional[int] = None,
+                 register_datetime: Optional[datetime] = None,
+                 test_date: Optional[date] = None,
+                 start_time: Optional[time] = None,
+                 end_time: Optional[time] = None,
+                 name: str = '',
+                 contact: str = '',
+                 advisor: str = '',
+                 equipment: str = '',
+                 machine_hours: float = 0.0,
+                 cost: int = 0,
+                 remark: str = '',
+                 created_at: Optional[date] = None,
+                 last_modified: Optional[datetime] = None,
+                 last_modified_raw: Any = None):
+        self.id = id
+        self.register_datetime = register_datetime
+        self.test_date = test_date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.name = name
+        self.contact = contact
+        self.advisor = advisor
+        self.equipment = equipment
+        self.machine_hours = machine_hours
+        self.cost = cost
+        self.remark = remark
+        self.created_at = created_at
+        self.last_modified = last_modified
+        self.last_modified_raw = last_modified_raw
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'Record':
+        """从数据库行（字典）构造记录，缺少的列取默认值"""
+        start_time, end_time = parse_test_time(row.get('test_time'))
+        return cls(id=row.get('id'),
+                   register_datetime=parse_datetime(row.get('register_datetime')),
+                   test_date=parse_date(row.get('test_date')),
+                   start_time=start_time,
+                   end_time=end_time,
+                   name=row.get('name') or '',
+                   contact=row.get('contact') or '',
+                   advisor=row.get('advisor') or '',
+                   equipment=row.get('equipment') or '',
+                   machine_hours=_to_number(row.get('machine_hours'), float, 0.0),
+                   cost=_to_number(row.get('cost'), int, 0),
+                   remark=row.get('remark') or '',
+                   created_at=parse_date(row.get('created_at')),
+                   last_modified=parse_datetime(row.get('last_modified')),
+                   last_modified_raw=row.get('last_modified'))
+
+    @classmethod
+    def coerce(cls, value) -> 'Record':
+        """记录或数据库行统一转换为记录"""
+        return value if isinstance(value, cls) else cls.from_row(value)
+
+    @property
+    def test_time(self) -> str:
+        """测试时间段，如 "08:00-09:00"，未填写时为空字符串"""
+        if self.start_time is None:
+            return ''
+        if self.end_time is None:
+            return self.start_time.strftime('%H:%M')
+        return f"{self.start_time.strftime('%H:%M')}-{self.end_time.strftime('%H:%M')}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """按数据库列名返回已解析的字段值"""
+        return {
+            'id': self.id,
+            'register_datetime': self.register_datetime,
+            'test_date': self.test_date,
+            'test_time': self.test_time,
+            'name': self.name,
+            'contact': self.contact,
+            'advisor': self.advisor,
+            'equipment': self.equipment,
+            'machine_hours': self.machine_hours,
+            'cost': self.cost,
+            'remark': self.remark,
+            'created_at': self.created_at,
+            'last_modified': self.last_modified
+        }
+
+    def to_tuple(self) -> tuple:
+        """转换为元组格式（兼容旧接口），日期时间格式化为字符串"""
+        return (
+            self.id,
+            _format(self.register_datetime, "%Y-%m-%d %H:%M:%S"),
+            _format(self.test_date, "%Y-%m-%d"),
+            self.test_time,
+            self.name,
+            self.contact,
+            self.advisor,
+            self.equipment,
+            self.machine_hours,
+            self.cost,
+            self.remark,
+            _format(self.created_at, "%Y-%m-%d"),
+            _format(self.last_modified, "%Y-%m-%d %H:%M:%S")
+        )
+
+    def to_form_data(self) -> Dict[str, Any]:
+        """登记表单的初始值"""
+        return {
+            'equipment': self.equipment,
+            'test_date': self.test_date or date.today(),
+            'name': self.name,
+            'contact': self.contact,
+            'advisor': self.advisor,
+            'machine_hours': self.machine_hours,
+            'cost': self.cost,
+            'remark': self.remark,
+            'start_time': self.start_time or DEFAULT_START_TIME,
+            'end_time': self.end_time or DEFAULT_END_TIME
+        }
+
+    def __repr__(self):
+        return f"Record(id={self.id!r}, name={self.name!r}, test_date={self.test_date!r})"
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """解析日期时间：支持 ISO 格式（含 T、Z、时区和小数秒），去掉时区保留原时间"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    text = str(value).strip().replace('T', ' ')
+    try:
+        return datetime.strptime(text[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        pass
+    parsed = parse_date(text)
+    return datetime.combine(parsed, time()) if parsed else None
+
+
+def parse_date(value) -> Optional[date]:
+    """解析日期，日期时间取其日期部分"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def parse_test_time(value) -> tuple:
+    """把 "08:00-09:00" 拆分为 (开始时间, 结束时间)，无法解析的部分为 None"""
+    if not value:
+        return None, None
+    parts = [part.strip() for part in str(value).split('-', 1)]
+    times = []
+    for part in parts:
+        try:
+            times.append(datetime.strptime(part[:5], "%H:%M").time())
+        except ValueError:
+            times.append(None)
+    if len(times) == 1:
+        times.append(None)
+    return times[0], times[1]
+
+
+def _to_number(value, kind, default):
+    try:
+        return kind(float(value)) if value is not None and value != '' else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _format(value, fmt: str) -> str:
+    return value.strftime(fmt) if value else ''
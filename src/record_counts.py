@@ -0,0 +1,99 @@
+# src/record_counts.py - 进程内共享的记录数缓存
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 计数缓存键包含的过滤参数及其默认值，与 SupabaseManager.count_records 的参数一致
+COUNT_FILTER_DEFAULTS = {
+    'conditions': None,
+    'date_range': None,
+    'date_field': "test_date",
+    'name': None,
+    'advisor': None,
+    'equipment': None,
+    'keywords': None
+}
+
+
+def count_key(method: str, filter_kwargs: Dict[str, Any]) -> tuple:
+    """计数缓存键 - 同步和异步管理器共用，未传入的过滤参数按默认值补齐"""
+    values = {**COUNT_FILTER_DEFAULTS, **filter_kwargs}
+    return method, repr(sorted(values.items()))
+
+
+class RecordCountCache:
+    """记录数缓存
+
+    按过滤条件缓存 HEAD 请求得到的行数，所有会话共享。写入记录、离线日志回放或收到
+    entries 变更事件时 invalidate() 递增版本号，之前的结果全部作废；
+    没有写入时结果超过 ttl_seconds 后重新统计，以便看到变更订阅发现不了的删除。
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 256):
+        self._lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = 0
+        self._counts = {}
+
+    def configure(self, ttl_seconds=None):
+        """更新缓存过期时间"""
+        if ttl_seconds is not None:
+            with self._lock:
+                self.ttl_seconds = float(ttl_seconds)
+
+    def invalidate(self):
+        """记录已变更，作废全部缓存的行数"""
+        with self._lock:
+            self.version += 1
+            self._counts = {}
+
+    def get(self, key, loader) -> Optional[int]:
+        """返回 key 对应的行数，没有缓存或已过期时调用 loader() 重新统计
+
+        loader 返回 None（统计失败）时不缓存；统计期间发生写入时结果只返回、不缓存。
+        """
+        hit, count, version = self.lookup(key)
+        if hit:
+            return count
+        count = loader()
+        self.store(key, count, version)
+        return count
+
+    def lookup(self, key) -> tuple:
+        """查找缓存，返回 (是否命中, 行数, 当前版本号)；未命中时统计完成后用版本号调用 store()"""
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                return True, entry[0], self.version
+            return False, None, self.version
+
+    def store(self, key, count: Optional[int], version: int):
+        """缓存统计结果；count 为 None 或统计期间版本号已变化时忽略"""
+        if count is None:
+            return
+        with self._lock:
+            if self.version != version:
+                return
+            self._counts.pop(key, None)
+            if len(self._counts) >= self.max_entries:
+                # 丢弃最早写入的条目
+                del self._counts[next(iter(self._counts))]
+            self._counts[key] = (count, time.monotonic())
+
+    def apply_change(self, event: Dict[str, Any]):
+        """变更订阅收到 entries 事件时作废缓存"""
+        if event['table'] == 'entries':
+            self.invalidate()
+
+    def on_flushed(self, rows: list):
+        """离线日志回放成功后作废缓存"""
+        if rows:
+            self.invalidate()
+
+
+# 进程内共享的记录数缓存
+record_counts = RecordCountCache()
@@ -0,0 +1,96 @@
+# src/record_export.py - 记录导出（CSV / Excel），按块流式生成
+import csv
+import io
+import logging
+import tempfile
+from typing import Iterable, Iterator, List
+
+from record import Record
+
+logger = logging.getLogger(__name__)
+
+# 导出的列：(字段, 表头)
+EXPORT_COLUMNS = [
+    ('id', "编号"),
+    ('register_datetime', "登记时间"),
+    ('test_date', "测试日期"),
+    ('test_time', "时间段"),
+    ('name', "姓名"),
+    ('contact', "联系方式"),
+    ('advisor', "领导"),
+    ('equipment', "设备"),
+    ('machine_hours', "机时(小时)"),
+    ('cost', "费用(元)"),
+    ('remark', "备注")
+]
+
+# 导出时需要从数据库读取的列
+EXPORT_FIELDS = [field for field, _ in EXPORT_COLUMNS]
+
+# 支持的导出格式：格式 -> (MIME 类型, 扩展名)
+EXPORT_FORMATS = {
+    'csv': ("text/csv", ".csv"),
+    'xlsx': ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx")
+}
+
+# Excel 文件在内存中缓冲的上限，超过后转存到临时文件
+_XLSX_SPOOL_BYTES = 8 * 1024 * 1024
+_READ_BLOCK_BYTES = 64 * 1024
+
+
+def export_row(record: Record) -> list:
+    """一条记录的导出值，日期时间格式化为字符串
+
+    EXPORT_COLUMNS 与 Record.to_tuple() 的前 11 项顺序一致。
+    """
+    return list(record.to_tuple()[:len(EXPORT_COLUMNS)])
+
+
+def iter_csv(chunks: Iterable[List[Record]]) -> Iterator[bytes]:
+    """逐块生成 CSV 字节（UTF-8 带 BOM，Excel 直接打开不乱码），每块记录编码后立即产出"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([title for _, title in EXPORT_COLUMNS])
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(export_row(record) for record in chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(chunks: Iterable[List[Record]]) -> Iterator[bytes]:
+    """生成 Excel 文件字节
+
+    使用 openpyxl 的只写模式逐行写入，内存占用与行数无关；xlsx 是 zip 格式，
+    全部行写完后才能产出文件内容，随后按块读出。
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        logger.error("导出 Excel 需要安装 openpyxl")
+        raise
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("登记记录")
+    sheet.append([title for _, title in EXPORT_COLUMNS])
+    for chunk in chunks:
+        for record in chunk:
+            sheet.append(export_row(record))
+
+    with tempfile.SpooledTemporaryFile(max_size=_XLSX_SPOOL_BYTES) as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            block = output.read(_READ_BLOCK_BYTES)
+            if not block:
+                break
+            yield block
+
+
+def iter_export(chunks: Iterable[List[Record]], fmt: str = "csv") -> Iterator[bytes]:
+    """按格式生成导出文件字节"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return iter_xlsx(chunks) if fmt == 'xlsx' else iter_csv(chunks)
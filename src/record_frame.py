@@ -0,0 +1,37 @@
+# src/record_frame.py - 记录的列式 DataFrame 表示
+import logging
+from typing import List, Dict, Any
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# DataFrame 的列顺序，与 record_to_tuple 的元组顺序一致
+FRAME_COLUMNS = ['id', 'register_datetime', 'test_date', 'test_time', 'name', 'contact', 'advisor',
+                 'equipment', 'machine_hours', 'cost', 'remark', 'created_at', 'last_modified']
+
+_DATETIME_COLUMNS = ('register_datetime', 'test_date', 'created_at', 'last_modified')
+_TEXT_COLUMNS = ('test_time', 'name', 'contact', 'advisor', 'remark')
+
+
+def records_to_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """把数据库返回的原始行（字典）列表转换为带类型的 DataFrame
+
+    日期时间列为 datetime64（无法解析的为 NaT），machine_hours 为 float64，
+    cost 为 int64，equipment 为 category；每列整体转换，不经过 Record 逐行解析。
+    """
+    frame = pd.DataFrame.from_records(rows, columns=FRAME_COLUMNS)
+    return _coerce_types(frame)
+
+
+def _coerce_types(frame: pd.DataFrame) -> pd.DataFrame:
+    frame['id'] = pd.to_numeric(frame['id'], errors='coerce').astype('Int64')
+    for column in _DATETIME_COLUMNS:
+        # 统一换算到 UTC 后去掉时区，与不带时区的时间戳可以直接比较
+        frame[column] = pd.to_datetime(frame[column], errors='coerce', utc=True).dt.tz_localize(None)
+    frame['machine_hours'] = pd.to_numeric(frame['machine_hours'], errors='coerce').fillna(0.0).astype('float64')
+    frame['cost'] = pd.to_numeric(frame['cost'], errors='coerce').fillna(0).astype('int64')
+    frame['equipment'] = frame['equipment'].astype('category')
+    for column in _TEXT_COLUMNS:
+        frame[column] = frame[column].fillna('').astype(str)
+    return frame
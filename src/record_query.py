@@ -0,0 +1,256 @@
+# src/record_query.py - 记录查询条件构造（同步/异步数据层共用）
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Any, Optional, Union
+
+# 关键词搜索覆盖的字段
+SEARCH_FIELDS = ('name', 'advisor', 'equipment', 'remark', 'contact')
+
+# 键集分页的排序
+PAGE_ORDER = "test_date DESC, id DESC"
+PAGE_ORDER_REVERSED = "test_date ASC, id ASC"
+
+
+def to_date_str(value) -> Optional[str]:
+    """把 date/datetime/字符串统一为 YYYY-MM-DD"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).split('T')[0].split(' ')[0]
+
+
+def like_pattern(keyword: str) -> str:
+    """构造 ilike 子串匹配模式，转义通配符"""
+    escaped = keyword.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def build_record_filters(conditions: Optional[Dict[str, Any]] = None,
+                         date_range: Optional[tuple] = None,
+                         date_field: str = "test_date",
+                         name: Optional[str] = None,
+                         advisor: Optional[str] = None,
+                         equipment: Union[str, List[str], None] = None,
+                         keywords: Optional[str] = None,
+                         ids: Optional[List[int]] = None) -> List[tuple]:
+    """把记录查询条件翻译为下推到服务端的过滤条件
+
+    ids 为关键词索引预先算出的候选记录 id，给出时只在这些记录中查询。
+    """
+    filters = []
+    if ids is not None:
+        filters.append(('id', 'in', list(ids)))
+
+    if conditions:
+        for field, value in conditions.items():
+            if value is not None and value != '':
+                filters.append((field, 'eq', value))
+
+    # 日期范围：任一端为 None 表示该端不限制
+    if date_range and len(date_range) == 2:
+        start_date = to_date_str(date_range[0])
+        end_date = to_date_str(date_range[1])
+        if date_field == "register_datetime":
+            # 登记时间是日期时间，结束日期取次日零点之前
+            if start_date:
+                filters.append((date_field, 'gte', start_date))
+            if end_date:
+                next_day = datetime.strptime(end_date, "%Y-%m-%d").date() + timedelta(days=1)
+                filters.append((date_field, 'lt', next_day.isoformat()))
+        else:
+            if start_date:
+                filters.append((date_field, 'gte', start_date))
+            if end_date:
+                filters.append((date_field, 'lte', end_date))
+
+    # 子串模糊匹配
+    if name and name.strip():
+        filters.append(('name', 'ilike', like_pattern(name)))
+    if advisor and advisor.strip():
+        filters.append(('advisor', 'ilike', like_pattern(advisor)))
+
+    # 设备精确匹配，支持单个或多个设备
+    if isinstance(equipment, str):
+        if equipment:
+            filters.append(('equipment', 'eq', equipment))
+    elif equipment:
+        filters.append(('equipment', 'in', list(equipment)))
+
+    # 关键词在多个字段中任一匹配
+    if keywords and keywords.strip():
+        pattern = like_pattern(keywords)
+        filters.append((None, 'or', [(field, 'ilike', pattern) for field in SEARCH_FIELDS]))
+
+    return filters
+
+
+def keyset_filter(cursor: tuple, backward: bool = False) -> tuple:
+    """(test_date, id) 游标之后（backward 时为之前）的过滤条件"""
+    cursor_date, cursor_id = cursor
+    op = 'gt' if backward else 'lt'
+    return (None, 'or', [
+        ('test_date', op, cursor_date),
+        (None, 'and', [('test_date', 'eq', cursor_date), ('id', op, cursor_id)])
+    ])
+
+
+def page_columns(columns: Optional[List[str]]) -> Optional[List[str]]:
+    """分页查询的列投影，总是包含游标列"""
+    if not columns:
+        return columns
+    return list(dict.fromkeys(['id', 'test_date', *columns]))
+
+
+def build_page(records: List[Dict[str, Any]], page_size: int,
+               cursor: Optional[tuple], backward: bool) -> Dict[str, Any]:
+    """根据多取一行的查询结果构造分页结果"""
+    has_more = len(records) > page_size
+    records = records[:page_size]
+    if backward:
+        records.reverse()
+
+    page = empty_page()
+    if records:
+        page['first_cursor'] = (records[0].get('test_date'), records[0].get('id'))
+        page['last_cursor'] = (records[-1].get('test_date'), records[-1].get('id'))
+    page['has_next'] = True if backward else has_more
+    page['has_prev'] = has_more if backward else cursor is not None
+    page['records'] = records
+    return page
+
+
+def empty_page() -> Dict[str, Any]:
+    """空的分页结果"""
+    return {
+        'records': [],
+        'first_cursor': None,
+        'last_cursor': None,
+        'has_next': False,
+        'has_prev': False
+    }
+
+
+# ========== 统计 ==========
+
+# 统计分组方式 -> 分组字段；按月统计时先按日期分组，再合并到月份
+STATS_GROUPS = {'equipment': 'equipment', 'advisor': 'advisor', 'month': 'test_date'}
+
+# PostgREST 聚合查询的列：两个 sum() 需要别名区分
+STATS_AGGREGATES = ['count()', 'hours:machine_hours.sum()', 'cost:cost.sum()']
+
+# 服务端未启用聚合函数时 PostgREST 返回的错误码
+AGGREGATES_DISABLED_CODE = 'PGRST123'
+
+# 统计用的数据库函数（supabase/migrations/*_record_stats.sql），不存在时 PostgREST 返回 PGRST202
+STATS_FUNCTION = 'record_stats'
+FUNCTION_MISSING_CODE = 'PGRST202'
+
+
+def _error_code(error: Exception) -> str:
+    return str(getattr(getattr(error, 'cause', None), 'code', '') or '')
+
+
+class AggregateSupport:
+    """服务端支持哪种统计方式，同步和异步管理器共用
+
+    统计依次使用：PostgREST 聚合查询（需要启用，Supabase 默认关闭）：
+    ALTER ROLE authenticator SET pgrst.db_aggregates_enabled = 'true';
+    NOTIFY pgrst, 'reload config';
+    其次是迁移中的 record_stats 数据库函数。收到 PGRST123 / PGRST202 后记住结果，
+    之后不再发送注定失败的请求。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.function_enabled = True
+
+    def check(self, error: Exception) -> bool:
+        """error 是否表示聚合函数未启用，是则记住"""
+        if _error_code(error) != AGGREGATES_DISABLED_CODE:
+            return False
+        self.enabled = False
+        return True
+
+    def check_function(self, error: Exception) -> bool:
+        """error 是否表示数据库中没有统计函数，是则记住"""
+        if _error_code(error) != FUNCTION_MISSING_CODE:
+            return False
+        self.function_enabled = False
+        return True
+
+
+# 进程内共享的聚合查询可用状态
+aggregate_support = AggregateSupport()
+
+
+def stats_rpc_params(filters: List[tuple], group_column: Optional[str] = None) -> Dict[str, Any]:
+    """统计函数的参数：过滤条件序列化为 [{column, op, value}]，or/and 的子条件递归序列化"""
+    return {'filters': [_filter_json(condition) for condition in filters], 'group_column': group_column}
+
+
+def _filter_json(condition: tuple) -> Dict[str, Any]:
+    column, op, value = condition
+    if op in ('or', 'and'):
+        value = [_filter_json(sub) for sub in value]
+    elif op == 'in':
+        value = [_json_value(v) for v in value]
+    else:
+        value = _json_value(value)
+    return {'column': column, 'op': op, 'value': value}
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def stats_rpc_rows(rows: List[Dict[str, Any]], group_column: Optional[str] = None) -> List[Dict[str, Any]]:
+    """把统计函数返回的 group_value 放回分组字段，供 rollup_stats 汇总"""
+    if group_column is None:
+        return rows
+    return [{**row, group_column: row.get('group_value')} for row in rows]
+
+
+def stats_group_column(group_by: Optional[str]) -> Optional[str]:
+    """统计分组字段，group_by 为 None 时不分组"""
+    if group_by is None:
+        return None
+    if group_by not in STATS_GROUPS:
+        raise ValueError(f"不支持的统计分组: {group_by}")
+    return STATS_GROUPS[group_by]
+
+
+def rollup_stats(rows: List[Dict[str, Any]], group_by: Optional[str] = None) -> Dict[str, Any]:
+    """把聚合查询结果汇总为统计结果
+
+    rows 中每行包含 count、hours、cost 和分组字段；逐行明细也可以传入
+    （没有 count 时按 1 计，机时和费用取 machine_hours、cost）。
+    返回 {'count', 'machine_hours', 'cost', 'groups': [{'key', 'count', 'machine_hours', 'cost'}]}，
+    groups 按分组值排序，不分组时为空列表。
+    """
+    column = stats_group_column(group_by)
+    totals = {'count': 0, 'machine_hours': 0.0, 'cost': 0}
+    groups = {}
+    for row in rows:
+        count = row.get('count', 1) or 0
+        hours = float(row.get('hours', row.get('machine_hours')) or 0)
+        cost = row.get('cost') or 0
+        totals['count'] += count
+        totals['machine_hours'] += hours
+        totals['cost'] += cost
+
+        if column is None:
+            continue
+        key = row.get(column)
+        if group_by == 'month' and key:
+            key = to_date_str(key)[:7]
+        group = groups.setdefault(key, {'key': key, 'count': 0, 'machine_hours': 0.0, 'cost': 0})
+        group['count'] += count
+        group['machine_hours'] += hours
+        group['cost'] += cost
+
+    totals['groups'] = sorted(groups.values(), key=lambda g: (g['key'] is None, g['key'] or ''))
+    return totals
@@ -0,0 +1,72 @@
+# src/retry_policy.py - 有界指数退避重试
+import asyncio
+import logging
+import random
+import time
+
+from errors import SupabaseError
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """有界的指数退避重试策略（full jitter）
+
+    只重试 retryable 的 SupabaseError；最多 max_attempts 次，
+    且包括等待在内的总耗时不超过 budget_seconds。
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 budget_seconds: float = 20):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.budget_seconds = float(budget_seconds)
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        """从配置读取读操作的重试参数"""
+        if config_manager is None:
+            return cls()
+        return cls(max_attempts=config_manager.get("read_max_attempts", 3),
+                   base_delay=config_manager.get("retry_base_delay_seconds", 0.2),
+                   max_delay=config_manager.get("retry_max_delay_seconds", 2.0),
+                   budget_seconds=config_manager.get("read_timeout_seconds", 20))
+
+    def _next_delay(self, attempt: int, started_at: float, error: SupabaseError):
+        """返回下一次重试前的等待秒数，不应再重试时返回 None"""
+        if not error.retryable or attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if time.monotonic() - started_at + delay > self.budget_seconds:
+            return None
+        logger.warning(f"{error.operation or '请求'}失败，{delay:.2f} 秒后第 {attempt + 1} 次尝试: {error}")
+        return delay
+
+    def call(self, fn):
+        """执行 fn()，失败时按策略重试"""
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn()
+            except SupabaseError as e:
+                delay = self._next_delay(attempt, started_at, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def acall(self, fn):
+        """执行 await fn()，失败时按策略重试"""
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except SupabaseError as e:
+                delay = self._next_delay(attempt, started_at, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
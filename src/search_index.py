@@ -0,0 +1,187 @@
+# src/search_index.py - 记录关键词的内存倒排索引
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from change_feed import change_feed as default_feed
+from record_query import SEARCH_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def _grams(text: str, n: int) -> set:
+    """text 的全部长度为 n 的字符片段"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """字符 n-gram 倒排索引
+
+    中文姓名和备注没有空格分词，因此按字符建索引：每个字段分别记录单字和二字片段到记录 id 的映射。
+    查询时取关键词各片段中最短的倒排表求交集，再用子串匹配校验候选，
+    结果与服务端 ilike '%关键词%'（不区分大小写）一致，耗时与命中数成正比而与表大小无关。
+    """
+
+    def __init__(self, fields: Iterable[str] = SEARCH_FIELDS):
+        self.fields = tuple(fields)
+        self._lock = threading.Lock()
+        self._postings = {field: {} for field in self.fields}
+        self._docs = {}
+        self.ready = False
+        # 重建期间的增量更新先记下，重建完成后重放，避免被旧的全量数据覆盖
+        self._building = False
+        self._pending = []
+
+    def __len__(self):
+        return len(self._docs)
+
+    def start_build(self, loader):
+        """在后台线程中用 loader() 返回的全部记录建立索引，已在建立或已建立时不重复执行"""
+        with self._lock:
+            if self.ready or self._building:
+                return
+            self._building = True
+            self._pending = []
+
+        def run():
+            try:
+                self.build(loader())
+            except Exception as e:
+                logger.error(f"建立关键词索引失败，关键词搜索继续由数据库完成: {e}")
+                with self._lock:
+                    self._building = False
+
+        threading.Thread(target=run, name="search-index-build", daemon=True).start()
+
+    def build(self, rows: Iterable[Dict[str, Any]]):
+        """用全部记录重建索引"""
+        with self._lock:
+            self._postings = {field: {} for field in self.fields}
+            self._docs = {}
+            for row in rows:
+                self._add(row)
+            for op, value in self._pending:
+                self._remove(value['id'] if op == 'upsert' else value)
+                if op == 'upsert':
+                    self._add(value)
+            self._pending = []
+            self._building = False
+            self.ready = True
+        logger.info(f"关键词索引已建立: {len(self._docs)} 条记录")
+
+    def upsert(self, row: Dict[str, Any]):
+        """新增或更新一条记录"""
+        if row.get('id') is None:
+            return
+        with self._lock:
+            if self._building:
+                self._pending.append(('upsert', row))
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, record_id):
+        """删除一条记录"""
+        with self._lock:
+            if self._building:
+                self._pending.append(('remove', record_id))
+            self._remove(record_id)
+
+    def apply_change(self, event: Dict[str, Any]):
+        """把变更订阅收到的 entries 事件应用到索引"""
+        if event['table'] != 'entries':
+            return
+        if event['type'] == 'delete':
+            if 'id' in event['old_record']:
+                self.remove(event['old_record']['id'])
+        elif all(field in event['record'] for field in self.fields):
+            self.upsert(event['record'])
+
+    def on_flushed(self, rows: list):
+        """离线日志回放成功后索引新写入的记录"""
+        for row in rows:
+            self.upsert(row)
+
+    def _add(self, row: Dict[str, Any]):
+        record_id = row['id']
+        doc = {}
+        for field in self.fields:
+            text = str(row.get(field) or '').lower()
+            doc[field] = text
+            postings = self._postings[field]
+            for gram in _grams(text, 1) | _grams(text, 2):
+                postings.setdefault(gram, set()).add(record_id)
+        self._docs[record_id] = doc
+
+    def _remove(self, record_id):
+        doc = self._docs.pop(record_id, None)
+        if doc is None:
+            return
+        for field, text in doc.items():
+            postings = self._postings[field]
+            for gram in _grams(text, 1) | _grams(text, 2):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(record_id)
+                    if not ids:
+                        del postings[gram]
+
+    def search(self, keyword: str, fields: Optional[Iterable[str]] = None) -> set:
+        """返回任一字段包含 keyword（不区分大小写）的记录 id"""
+        keyword = keyword.strip().lower()
+        fields = tuple(fields) if fields else self.fields
+        with self._lock:
+            if not keyword:
+                return set(self._docs)
+            hits = set()
+            for field in fields:
+                hits |= self._search_field(field, keyword)
+            return hits
+
+    def _search_field(self, field: str, keyword: str) -> set:
+        postings = self._postings[field]
+        grams = _grams(keyword, min(2, len(keyword)))
+        # 从最短的倒排表开始求交集，任一片段不存在时直接返回
+        lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        if not lists or not lists[0]:
+            return set()
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            candidates &= ids
+            if not candidates:
+                return candidates
+        if len(keyword) <= 2:
+            return candidates
+        # 片段都出现不代表连续出现，逐个校验
+        return {record_id for record_id in candidates if keyword in self._docs[record_id][field]}
+
+
+def narrow_filters(filter_kwargs: Dict[str, Any], index: SearchIndex = None,
+                   max_ids: int = 500, feed=None) -> Dict[str, Any]:
+    """用关键词索引为 name/advisor/keywords 子串条件附加候选 ids 条件
+
+    索引通过变更订阅更新，可能落后于数据库，因此 ilike 条件保留不变，由数据库复核，
+    ids 只用来缩小扫描范围，已删除或已不匹配的记录不会出现在结果中。
+    索引未建立、没有关键词条件或命中超过 max_ids 条时原样返回；
+    变更订阅（feed，默认为进程内的 change_feed）没有运行时索引看不到其他进程的写入，
+    同样原样返回，避免漏掉匹配的记录。多个关键词条件的命中取交集。
+    返回的参数可以直接传给 build_record_filters。
+    """
+    index = index or record_index
+    feed = feed or default_feed
+    texts = {key: filter_kwargs[key] for key in ('name', 'advisor', 'keywords')
+             if filter_kwargs.get(key) and filter_kwargs[key].strip()}
+    if not texts or not index.ready or feed.source is None:
+        return filter_kwargs
+
+    ids = None
+    for key, value in texts.items():
+        hits = index.search(value, fields=None if key == 'keywords' else (key,))
+        ids = hits if ids is None else ids & hits
+    if len(ids) > max_ids:
+        return filter_kwargs
+
+    return {**filter_kwargs, 'ids': sorted(ids)}
+
+
+# 进程内共享的记录关键词索引
+record_index = SearchIndex()
@@ -0,0 +1,92 @@
+# src/settings_store.py - 进程内共享的设置缓存
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsStore:
+    """设置缓存
+
+    settings 表整体加载到内存中，由所有会话共享；超过 ttl_seconds 后重新加载，
+    写入时同步更新缓存（write-through）。加载失败时继续使用上一次的值；
+    从未加载成功过时没有可用的值，异常向上抛出，由调用方决定后备方案。
+    """
+
+    def __init__(self, ttl_seconds: float = 300):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+        self._values = {}
+        self._loaded_at = None
+        self._ever_loaded = False
+
+    def configure(self, ttl_seconds=None):
+        """更新缓存过期时间"""
+        if ttl_seconds is not None:
+            with self._lock:
+                self.ttl_seconds = float(ttl_seconds)
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def get_all(self, loader) -> dict:
+        """返回全部设置，缓存过期时调用 loader() 重新加载
+
+        loader 返回 {key: value} 字典，失败时抛出异常，此时继续使用缓存的设置；
+        还没有缓存过设置时把异常抛给调用方。
+        """
+        with self._lock:
+            if self._is_fresh():
+                return dict(self._values)
+
+        with self._load_lock:
+            with self._lock:
+                if self._is_fresh():
+                    return dict(self._values)
+
+            try:
+                values = loader()
+            except Exception as e:
+                with self._lock:
+                    if not self._ever_loaded:
+                        raise
+                    logger.warning(f"加载设置失败，继续使用缓存的设置: {e}")
+                    return dict(self._values)
+            with self._lock:
+                self._values = dict(values)
+                self._loaded_at = time.monotonic()
+                self._ever_loaded = True
+                logger.info(f"设置已加载 {len(values)} 项")
+                return dict(self._values)
+
+    def get(self, key: str, loader, default=None):
+        """获取单个设置值"""
+        return self.get_all(loader).get(key, default)
+
+    def set_all(self, values: dict):
+        """用已经查询到的全部设置刷新缓存"""
+        with self._lock:
+            self._values = dict(values)
+            self._loaded_at = time.monotonic()
+            self._ever_loaded = True
+
+    def put(self, key: str, value):
+        """写入成功后同步更新缓存"""
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, key: str):
+        """设置被删除后同步移除缓存中的值"""
+        with self._lock:
+            self._values.pop(key, None)
+
+    def invalidate(self):
+        """使缓存失效，下次读取时重新加载"""
+        with self._lock:
+            self._loaded_at = None
+
+
+# 进程内共享的设置缓存
+settings_store = SettingsStore()
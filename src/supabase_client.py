@@ -1,14 +1,24 @@
 # src/supabase_client.py - 修复版本
 import logging
+import re
 import streamlit as st
 
+from errors import classify_error, CircuitOpenError
+from health_monitor import health_monitor
+from retry_policy import RetryPolicy
+
 logger = logging.getLogger(__name__)
 
 class SupabaseClient:
-    """Supabase客户端封装类"""
+    """Supabase客户端封装类
+    
+    请求失败时抛出 errors 中的类型化异常：读操作按重试策略有界重试，
+    写操作只执行一次。HTTP 超时、重试次数和读操作总时限来自配置。
+    """
     
-    def __init__(self):
+    def __init__(self, config_manager=None):
         self.client = None
+        self.retry_policy = RetryPolicy.from_config(config_manager)
         
         try:
             # 检查secrets
@@ -23,7 +33,8 @@ class SupabaseClient:
             
             # 导入并创建客户端
             from supabase import create_client
-            self.client = create_client(url, key)
+            timeout = config_manager.get("timeout_seconds", 10) if config_manager else 10
+            self.client = create_client(url, key, options=client_options(timeout))
             
             logger.info("✅ Supabase连接成功")
             
@@ -31,73 +42,286 @@ class SupabaseClient:
             logger.error(f"Supabase客户端初始化失败: {e}")
             self.client = None
     
+    def _execute_once(self, query, operation: str):
+        """执行一次请求并向健康监视器报告结果，熔断期间直接失败"""
+        if not health_monitor.allow_request():
+            raise CircuitOpenError(f"后端暂不可用，{health_monitor.retry_after():.0f} 秒后重试", operation)
+        try:
+            response = query.execute()
+        except Exception as e:
+            error = classify_error(e, operation)
+            if error.retryable:
+                health_monitor.record_failure(e)
+            else:
+                # 后端已返回错误响应，说明连接正常
+                health_monitor.record_success()
+            raise error from e
+        health_monitor.record_success()
+        return response
+    
+    def _execute(self, query, operation: str, retry: bool = False):
+        """执行请求，retry=True 时（只用于读操作）按重试策略重试"""
+        if retry:
+            return self.retry_policy.call(lambda: self._execute_once(query, operation))
+        return self._execute_once(query, operation)
+    
+    def ping(self) -> bool:
+        """探测后端是否可用"""
+        if not self.client:
+            return False
+        self._execute(self.client.table('entries').select('id').limit(1), "健康探测")
+        return True
+    
     def insert(self, table: str, data: dict):
-        """插入数据"""
+        """插入数据，返回插入的行"""
         if not self.client:
             return None
-        try:
-            response = self.client.table(table).insert(data).execute()
-            return response.data[0] if response.data else None
-        except Exception as e:
-            logger.error(f"插入失败: {e}")
+        response = self._execute(self.client.table(table).insert(data), f"插入{table}")
+        return response.data[0] if response.data else None
+    
+    def insert_many(self, table: str, rows: list):
+        """批量插入数据 - 一次请求，返回插入的行"""
+        if not self.client:
             return None
+        if not rows:
+            return []
+        response = self._execute(self.client.table(table).insert(rows), f"批量插入{table}")
+        return response.data or []
     
-    def update(self, table: str, data: dict, record_id: int):
-        """更新数据"""
+    def upsert(self, table: str, data, on_conflict: str, ignore_duplicates: bool = False):
+        """插入或更新数据 - 按 on_conflict 唯一列合并，一次请求
+        
+        data 可以是单行字典或多行列表；ignore_duplicates=True 时已存在的行保持不变，
+        返回结果中只包含真正写入的行。
+        """
         if not self.client:
             return None
-        try:
-            response = self.client.table(table).update(data).eq('id', record_id).execute()
-            return response.data[0] if response.data else None
-        except Exception as e:
-            logger.error(f"更新失败: {e}")
+        if not data:
+            return []
+        response = self._execute(self.client.table(table).upsert(
+            data,
+            on_conflict=on_conflict,
+            ignore_duplicates=ignore_duplicates
+        ), f"合并写入{table}")
+        return response.data or []
+    
+    def rpc(self, function: str, params: dict = None, retry: bool = False):
+        """调用数据库函数，返回结果行；retry=True 时（只用于只读函数）按重试策略重试"""
+        if not self.client:
+            return None
+        response = self._execute(self.client.rpc(function, params or {}), f"调用{function}", retry=retry)
+        return response.data or []
+    
+    def update(self, table: str, data: dict, record_id: int, filters: list = None):
+        """更新数据，返回更新后的行，没有匹配的行时返回 None
+        
+        filters 为附加的 (字段, 操作符, 值) 条件，如按 last_modified 做乐观并发检查，
+        条件不满足时同样没有匹配的行。
+        """
+        if not self.client:
             return None
+        query = self.client.table(table).update(data).eq('id', record_id)
+        for column, op, value in filters or []:
+            query = _apply_filter(query, column, op, value)
+        response = self._execute(query, f"更新{table}")
+        return response.data[0] if response.data else None
     
     def delete(self, table: str, record_id: int):
         """删除数据"""
         if not self.client:
             return False
-        try:
-            response = self.client.table(table).delete().eq('id', record_id).execute()
-            # 检查是否成功删除
-            if hasattr(response, 'data'):
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"删除失败: {e}")
+        self._execute(self.client.table(table).delete().eq('id', record_id), f"删除{table}")
+        return True
+    
+    def delete_where(self, table: str, column: str, in_values) -> bool:
+        """按集合删除数据 - column in (in_values)，一次请求"""
+        if not self.client:
             return False
+        values = list(in_values)
+        if not values:
+            return True
+        self._execute(self.client.table(table).delete().in_(column, values), f"批量删除{table}")
+        return True
     
-    def select(self, table: str, conditions: dict = None, order_by: str = None, limit: int = None):
-        """查询数据"""
+    def select(self, table: str, conditions: dict = None, order_by: str = None, limit: int = None,
+               filters: list = None, columns=None):
+        """查询数据
+
+        columns 为需要返回的列（列表或逗号分隔字符串），默认返回全部列。
+        order_by 支持多个字段，如 "test_date DESC, id DESC NULLS LAST"，整体下推到服务端。
+        filters 为 (字段, 操作符, 值) 三元组列表，直接下推到 PostgREST：
+        eq/neq/gt/gte/lt/lte/like/ilike/in/is，以及 (None, 'or', [子条件...])，
+        子条件中可以嵌套 (None, 'and', [子条件...])。
+        """
         if not self.client:
             return []
         
-        try:
-            query = self.client.table(table).select("*")
-            
-            if conditions:
-                for key, value in conditions.items():
-                    if value is not None:
-                        query = query.eq(key, value)
-            
-            # 修复排序处理
-            if order_by:
-                # 解析排序参数
-                parts = order_by.strip().split()
-                if len(parts) >= 1:
-                    field = parts[0]
-                    # 默认降序，除非明确指定ASC
-                    desc = True
-                    if len(parts) >= 2 and parts[1].upper() == 'ASC':
-                        desc = False
-                    query = query.order(field, desc=desc)
-            
-            if limit:
-                query = query.limit(limit)
-            
-            response = query.execute()
-            return response.data if response.data else []
-            
-        except Exception as e:
-            logger.error(f"查询失败: {e}")
-            return []
+        query = build_select(self.client.table(table),
+                             conditions=conditions,
+                             filters=filters,
+                             order_by=order_by,
+                             limit=limit,
+                             columns=columns)
+        response = self._execute(query, f"查询{table}", retry=True)
+        return response.data if response.data else []
+    
+    def count(self, table: str, conditions: dict = None, filters: list = None,
+              method: str = "exact"):
+        """统计行数 - HEAD 请求，不传输任何行
+
+        method 为 "exact"（精确计数）、"planned" 或 "estimated"（按查询计划估算，大表更快）。
+        """
+        if not self.client:
+            return None
+        
+        query = build_select(self.client.table(table),
+                             conditions=conditions,
+                             filters=filters,
+                             columns=['id'],
+                             count=method,
+                             head=True)
+        response = self._execute(query, f"统计{table}", retry=True)
+        return response.count
+
+
+def client_options(timeout_seconds: float, is_async: bool = False):
+    """构造带 HTTP 超时的 Supabase 客户端选项"""
+    try:
+        if is_async:
+            from supabase import AsyncClientOptions as Options
+        else:
+            from supabase import ClientOptions as Options
+    except ImportError:
+        from supabase.lib.client_options import ClientOptions as Options
+    return Options(postgrest_client_timeout=timeout_seconds)
+
+
+# ========== 查询构造（同步/异步客户端共用） ==========
+
+def build_select(table_query, conditions: dict = None, filters: list = None, order_by: str = None,
+                 limit: int = None, columns=None, count: str = None, head: bool = False):
+    """在 table_query 上构造 select 查询，参数含义同 SupabaseClient.select
+
+    count 为 "exact"/"planned"/"estimated" 时同时请求总行数；
+    head=True 时只发 HEAD 请求取总行数，不传输任何行。
+    """
+    if count:
+        query = table_query.select(_format_columns(columns), count=count, head=head)
+    else:
+        query = table_query.select(_format_columns(columns))
+    
+    if conditions:
+        for key, value in conditions.items():
+            if value is not None:
+                query = query.eq(key, value)
+    
+    if filters:
+        for column, op, value in filters:
+            query = _apply_filter(query, column, op, value)
+    
+    # 多字段排序作为一个 order 参数整体下推
+    if order_by:
+        query.params = query.params.set("order", _format_order(parse_order_by(order_by)))
+    
+    if limit:
+        query = query.limit(limit)
+    
+    return query
+
+
+# ========== 排序 ==========
+
+_COLUMN_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def parse_order_by(order_by: str) -> list:
+    """解析 SQL 风格的排序参数
+
+    "test_date DESC, id ASC NULLS FIRST" -> [(列名, 是否降序, 空值位置), ...]
+    未指定方向时默认降序；空值位置为 "first"、"last" 或 None（使用数据库默认）。
+    """
+    keys = []
+    for item in order_by.split(','):
+        parts = item.strip().split()
+        if not parts:
+            continue
+        column = parts[0]
+        if not _COLUMN_RE.match(column):
+            raise ValueError(f"无效的排序字段: {column}")
+        
+        rest = [part.upper() for part in parts[1:]]
+        # 默认降序，除非明确指定ASC
+        desc = True
+        if rest and rest[0] in ('ASC', 'DESC'):
+            desc = rest.pop(0) == 'DESC'
+        
+        nulls = None
+        if rest:
+            if len(rest) != 2 or rest[0] != 'NULLS' or rest[1] not in ('FIRST', 'LAST'):
+                raise ValueError(f"无效的排序参数: {item.strip()}")
+            nulls = rest[1].lower()
+        
+        keys.append((column, desc, nulls))
+    return keys
+
+
+def _format_order(keys: list) -> str:
+    """把排序字段渲染为 PostgREST order 参数"""
+    items = []
+    for column, desc, nulls in keys:
+        item = f"{column}.{'desc' if desc else 'asc'}"
+        if nulls:
+            item += f".nulls{nulls}"
+        items.append(item)
+    return ",".join(items)
+
+
+def _format_columns(columns) -> str:
+    """把列投影渲染为 PostgREST select 参数"""
+    if not columns:
+        return "*"
+    if isinstance(columns, str):
+        return columns
+    return ",".join(columns)
+
+
+# ========== 过滤条件下推 ==========
+
+_SIMPLE_OPS = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'like', 'ilike')
+_RESERVED_CHARS = set(',.:()"\\ ')
+
+
+def _apply_filter(query, column, op, value):
+    """把单个过滤条件应用到 PostgREST 查询上"""
+    if op in _SIMPLE_OPS:
+        return getattr(query, op)(column, value)
+    if op == 'in':
+        return query.in_(column, list(value))
+    if op == 'is':
+        return query.is_(column, value)
+    if op == 'or':
+        return query.or_(",".join(_format_filter(f) for f in value))
+    raise ValueError(f"不支持的过滤操作符: {op}")
+
+
+def _format_filter(condition) -> str:
+    """把过滤条件渲染为 PostgREST 逻辑表达式（用于 or/and）"""
+    column, op, value = condition
+    if op in ('or', 'and'):
+        return f"{op}({','.join(_format_filter(f) for f in value)})"
+    if op == 'in':
+        return f"{column}.in.({','.join(_format_value(v) for v in value)})"
+    if op == 'is':
+        return f"{column}.is.{'null' if value is None else str(value).lower()}"
+    if op in _SIMPLE_OPS:
+        return f"{column}.{op}.{_format_value(value)}"
+    raise ValueError(f"不支持的过滤操作符: {op}")
+
+
+def _format_value(value) -> str:
+    """按 PostgREST 语法转义值：含保留字符时加双引号"""
+    text = str(value)
+    if any(ch in _RESERVED_CHARS for ch in text):
+        text = text.replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{text}"'
+    return text
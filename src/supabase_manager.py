@@ -1,6 +1,6 @@
 # src/supabase_manager.py - 修复版本
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterator, Optional, Union
 import logging
 import sys
 import os
@@ -10,18 +10,58 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
+from errors import SupabaseError, SupabaseRequestError, RecordConflictError
+from record import Record
+from search_index import record_index, narrow_filters
+from record_counts import record_counts, count_key
+from equipment_catalog import equipment_catalog
+from settings_store import settings_store
+from record_query import (build_record_filters, keyset_filter, page_columns, build_page,
+                          empty_page, PAGE_ORDER, PAGE_ORDER_REVERSED,
+                          STATS_AGGREGATES, STATS_FUNCTION, stats_group_column, stats_rpc_params,
+                          stats_rpc_rows, rollup_stats, SEARCH_FIELDS, aggregate_support)
+
 logger = logging.getLogger(__name__)
 
+# 默认设备列表
+DEFAULT_EQUIPMENT = [
+    "疲劳性能试验机",
+    "透射电子显微镜",
+]
+
+# 数据库缺少 ON CONFLICT 所需唯一约束时的错误码
+_NO_UNIQUE_CONSTRAINT = '42P10'
+
+
+def normalize_equipment_name(name: str) -> str:
+    """设备名称规范化：去掉首尾空白，中间连续空白合并为一个空格
+
+    equipment.name 上的唯一约束作用于规范化后的名称，写入前必须经过这里：
+    ALTER TABLE equipment ADD CONSTRAINT equipment_name_key UNIQUE (name);
+    """
+    return ' '.join((name or '').split())
+
 class SupabaseManager:
     """Supabase数据库管理器"""
     
     def __init__(self):
+        self.journal = None
+        self.flusher = None
+        self.replica = None
+        self.syncer = None
         try:
             from supabase_client import SupabaseClient
             from config_manager import ConfigManager
             
-            self.client = SupabaseClient()
             self.config_manager = ConfigManager()
+            self.client = SupabaseClient(self.config_manager)
+            self._configure_health_monitor()
+            settings_store.configure(ttl_seconds=self.config_manager.get("settings_cache_ttl_seconds"))
+            record_counts.configure(ttl_seconds=self.config_manager.get("record_count_cache_ttl_seconds"))
+            self._open_offline_journal()
+            self._open_replica()
+            self._start_change_feed()
+            self._open_search_index()
             self.init_tables()
             
         except ImportError as e:
@@ -29,6 +69,201 @@ class SupabaseManager:
             self.client = None
             self.config_manager = None
     
+    def _open_offline_journal(self):
+        """打开本地写前日志，后端可用时由后台线程回放"""
+        try:
+            from offline_journal import shared_journal, check_idempotency_key
+            
+            path = self._data_path("offline_journal_path", "data/offline_journal.db")
+            self.journal, self.flusher = shared_journal(path, self.client)
+            # 数据库还没有执行幂等键迁移时，回放改为普通插入，否则每条新记录都会被拒绝
+            if self.flusher is not None and self.flusher.idempotent \
+                    and check_idempotency_key(self.client) is False:
+                self.flusher.disable_idempotency("启动检查未找到幂等键列")
+            # 回放写入了新记录，缓存的记录数随之作废
+            if self.flusher is not None and record_counts.on_flushed not in self.flusher.on_flushed:
+                self.flusher.on_flushed.append(record_counts.on_flushed)
+        except Exception as e:
+            logger.error(f"打开离线日志失败，新增记录将直接写入数据库: {e}")
+            self.journal = None
+            self.flusher = None
+    
+    def _open_replica(self):
+        """按配置打开本地只读副本，后端可用时由后台线程增量同步"""
+        if not self.config_manager.get("replica_enabled", False):
+            return
+        try:
+            from local_replica import shared_replica
+            
+            path = self._data_path("replica_path", "data/replica.db")
+            interval = self.config_manager.get("replica_sync_interval_seconds", 30)
+            reconcile_every = self.config_manager.get("replica_reconcile_every", 10)
+            self.replica, self.syncer = shared_replica(path, self.client, interval, reconcile_every)
+            # 离线日志回放后立即拉取新记录
+            if self.flusher is not None and self.syncer is not None \
+                    and self.syncer.on_flushed not in self.flusher.on_flushed:
+                self.flusher.on_flushed.append(self.syncer.on_flushed)
+        except Exception as e:
+            logger.error(f"打开本地副本失败，记录查询将直接访问数据库: {e}")
+            self.replica = None
+            self.syncer = None
+    
+    def _start_change_feed(self):
+        """订阅其他会话和其他实例的数据变更，收到事件后更新进程内缓存
+        
+        change_feed 为 "realtime" 时使用 Supabase Realtime，失败则退回轮询；
+        为 "polling" 时按 last_modified 轮询；为 "off" 时只依赖缓存过期时间。
+        """
+        mode = self.config_manager.get("change_feed", "polling")
+        if mode == "off" or self.client.client is None:
+            return
+        try:
+            from change_feed import change_feed, RealtimeChangeSource, PollingChangeSource
+            
+            if self.replica is not None:
+                change_feed.subscribe(self.replica.apply_change)
+            change_feed.subscribe(record_counts.apply_change)
+            if change_feed.source is not None:
+                return
+            
+            started = False
+            if mode == "realtime":
+                try:
+                    from async_supabase import get_async_manager
+                    async_manager = get_async_manager()
+                    if async_manager is not None:
+                        started = change_feed.start(RealtimeChangeSource(async_manager.client.client))
+                except Exception as e:
+                    logger.warning(f"Realtime 订阅失败，改为轮询: {e}")
+            if not started:
+                interval = self.config_manager.get("change_feed_poll_seconds", 30)
+                change_feed.start(PollingChangeSource(self.client, interval))
+            
+            # 有变更订阅时缓存可以保留更久
+            settings_store.configure(ttl_seconds=self.config_manager.get("change_feed_cache_ttl_seconds", 3600))
+        except Exception as e:
+            logger.error(f"启动变更订阅失败，缓存只按过期时间刷新: {e}")
+    
+    def _open_search_index(self):
+        """在后台建立记录关键词索引，并通过写入回调和变更订阅保持索引最新"""
+        if not self.config_manager.get("search_index_enabled", True) or self.client.client is None:
+            return
+        try:
+            from change_feed import change_feed
+            
+            # 没有变更订阅时索引看不到其他进程的写入，关键词搜索只能由数据库完成
+            if change_feed.source is None:
+                logger.info("变更订阅未运行，不建立关键词索引")
+                return
+            change_feed.subscribe(record_index.apply_change)
+            if self.flusher is not None and record_index.on_flushed not in self.flusher.on_flushed:
+                self.flusher.on_flushed.append(record_index.on_flushed)
+            record_index.start_build(self._load_index_rows)
+        except Exception as e:
+            logger.error(f"启动关键词索引失败，关键词搜索由数据库完成: {e}")
+    
+    def _load_index_rows(self) -> List[Dict[str, Any]]:
+        """关键词索引的全量数据 - 先等变更订阅记下起点再读取（在建索引的后台线程中执行）
+        
+        起点之前的写入都在读取结果中，之后的写入都会以事件送达，两者之间不会漏掉记录。
+        """
+        from change_feed import change_feed
+        
+        if not change_feed.wait_baseline():
+            raise RuntimeError("变更订阅已停止")
+        return self._select_all('entries', [], ['id', *SEARCH_FIELDS])
+    
+    def _record_filters(self, **filter_kwargs) -> list:
+        """构造记录过滤条件，关键词条件先由内存索引换算为候选 id"""
+        max_ids = self.config_manager.get("search_index_max_ids", 500) if self.config_manager else 500
+        return build_record_filters(**narrow_filters(filter_kwargs, max_ids=max_ids))
+    
+    def _data_path(self, key: str, default: str) -> str:
+        """配置中的本地数据文件路径，相对路径以项目根目录为准"""
+        path = self.config_manager.get(key, default)
+        if not os.path.isabs(path):
+            path = os.path.join(current_dir, '..', path)
+        return path
+    
+    def replica_ready(self) -> bool:
+        """本地副本是否已完成过一次同步 - 此时记录查询、分页、导出、计数和统计都读取副本"""
+        try:
+            return self.replica is not None and self.replica.ready
+        except Exception as e:
+            logger.error(f"读取本地副本状态失败: {e}")
+            return False
+    
+    def _record_source(self):
+        """读取 entries 的数据源：本地副本已同步时为副本，否则为服务端"""
+        return self.replica if self.replica_ready() else self.client
+    
+    def pending_write_count(self, status: str = 'pending') -> int:
+        """离线写操作数 - status 为 'pending'（等待回放）或 'rejected'（被后端拒绝）"""
+        if self.journal is None:
+            return 0
+        try:
+            return self.journal.count(status)
+        except Exception as e:
+            logger.error(f"读取离线日志失败: {e}")
+            return 0
+    
+    def get_rejected_writes(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """被后端拒绝的离线写操作，含写入内容和拒绝原因"""
+        if self.journal is None:
+            return []
+        try:
+            return self.journal.rejected(limit)
+        except Exception as e:
+            logger.error(f"读取离线日志失败: {e}")
+            return []
+    
+    def retry_rejected_writes(self, seqs: list) -> bool:
+        """重新回放被拒绝的离线写操作"""
+        if self.journal is None:
+            return False
+        try:
+            self.journal.retry(seqs)
+            if self.flusher is not None:
+                self.flusher.wake()
+            return True
+        except Exception as e:
+            logger.error(f"重试离线写操作失败: {e}")
+            return False
+    
+    def discard_rejected_writes(self, seqs: list) -> bool:
+        """放弃被拒绝的离线写操作"""
+        if self.journal is None:
+            return False
+        try:
+            self.journal.discard(seqs)
+            logger.warning(f"已放弃 {len(seqs)} 条被拒绝的离线写操作: {seqs}")
+            return True
+        except Exception as e:
+            logger.error(f"删除离线写操作失败: {e}")
+            return False
+    
+    def _configure_health_monitor(self):
+        """从配置读取熔断参数"""
+        from health_monitor import health_monitor
+        
+        health_monitor.configure(
+            failure_threshold=self.config_manager.get("circuit_failure_threshold"),
+            cooldown_seconds=self.config_manager.get("circuit_cooldown_seconds"),
+            ttl_seconds=self.config_manager.get("health_check_ttl_seconds"),
+            probe_timeout_seconds=self.config_manager.get("timeout_seconds")
+        )
+    
+    def is_available(self) -> bool:
+        """后端是否可用 - TTL（health_check_ttl_seconds）内复用上次结果，熔断期间直接返回 False
+        
+        TTL 已过且没有新的成功请求时发送一次探测，供侧边栏显示连接状态。
+        """
+        if self.client is None or self.client.client is None:
+            return False
+        
+        from health_monitor import health_monitor
+        return health_monitor.is_healthy(probe=self.client.ping)
+    
     def init_tables(self):
         """初始化数据库表结构"""
         if self.client is None:
@@ -38,11 +273,10 @@ class SupabaseManager:
         try:
             # 检查表是否存在
             try:
-                self.client.select('entries', limit=1)
-                self.client.select('equipment', limit=1)  # 新增：检查设备表
+                self.client.select('entries', columns=['id'], limit=1)
                 logger.info("数据库表检查完成")
                 
-                # 初始化设置和设备
+                # 初始化设置和设备（加载设置缓存和设备目录的同时完成另外两张表的检查）
                 self.init_default_settings()
                 self.init_default_equipment()  # 新增：初始化设备
                 return True
@@ -63,17 +297,16 @@ class SupabaseManager:
             
         try:
             # 检查设备表是否为空
-            existing_equipment = self.get_all_equipment()
+            # 直接读取设备目录，查询失败时抛出异常，避免误判为空表
+            existing_equipment = equipment_catalog.get(self._load_equipment)
             
-            # 如果没有设备，插入默认设备
+            # 如果没有设备，一次性插入默认设备
             if not existing_equipment:
-                default_equipment = [
-                    "疲劳性能试验机",
-                    "透射电子显微镜",
-                ]
-                
-                for equipment_name in default_equipment:
-                    self.add_equipment(equipment_name)
+                rows = [self._equipment_row(name) for name in DEFAULT_EQUIPMENT]
+                result = self.client.insert_many('equipment', rows)
+                equipment_catalog.invalidate()
+                if result is None:
+                    return False
                 
                 logger.info("默认设备已初始化")
             
@@ -89,8 +322,9 @@ class SupabaseManager:
             return False
             
         try:
-            # 检查是否已有设置
-            existing_settings = self.client.select('settings')
+            # 检查是否已有设置（同时预热设置缓存）
+            existing_settings = self._load_settings()
+            settings_store.set_all(existing_settings)
             
             # 如果没有设置，创建默认设置
             if not existing_settings:
@@ -100,7 +334,8 @@ class SupabaseManager:
                 ]
                 
                 for setting in default_settings:
-                    self.client.insert('settings', setting)
+                    if self.client.insert('settings', setting) is not None:
+                        settings_store.put(setting['key'], setting['value'])
                 
                 logger.info("默认设置已初始化")
             
@@ -111,14 +346,63 @@ class SupabaseManager:
             return False
     
     # ========== 设备管理方法 ==========
+    
+    @staticmethod
+    def _equipment_row(name: str) -> Dict[str, Any]:
+        """构造新设备行"""
+        return {
+            'name': normalize_equipment_name(name),
+            'is_active': True,
+            'created_at': datetime.now().isoformat()
+        }
+    
+    def restore_default_equipment(self) -> int:
+        """恢复默认设备 - 返回新增的设备数，失败返回 -1"""
+        if self.client is None:
+            return -1
+            
+        try:
+            inserted = self._insert_new_equipment([self._equipment_row(name) for name in DEFAULT_EQUIPMENT])
+            if inserted:
+                logger.info(f"已恢复 {len(inserted)} 个默认设备")
+            return len(inserted)
+                
+        except Exception as e:
+            logger.error(f"恢复默认设备失败: {e}")
+            return -1
+    
+    def _insert_new_equipment(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """插入设备，同名设备已存在时跳过 - 返回真正新增的行（失败时抛出 SupabaseError）
+        
+        依靠 equipment.name 的唯一约束做 ON CONFLICT DO NOTHING，一次请求完成，
+        多个管理员同时添加同一设备也只会新增一行。数据库还没有该约束时退回先查后插。
+        """
+        try:
+            inserted = self.client.upsert('equipment', rows, on_conflict='name', ignore_duplicates=True)
+        except SupabaseRequestError as e:
+            if str(getattr(e.cause, 'code', '') or '') != _NO_UNIQUE_CONSTRAINT:
+                raise
+            logger.warning("equipment.name 缺少唯一约束，改为先查后插（并发添加时可能重复）")
+            inserted = self._insert_missing_equipment(rows)
+        finally:
+            equipment_catalog.invalidate()
+        return inserted
+    
+    def _insert_missing_equipment(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """没有唯一约束时的添加方式：读取已有名称，只插入缺少的设备"""
+        existing_names = {device['name'] for device in self.client.select('equipment', columns=['name'])}
+        rows = [row for row in rows if row['name'] not in existing_names]
+        if not rows:
+            return []
+        return self.client.insert_many('equipment', rows) or []
    
-    def get_equipment_by_name(self, name):
+    def get_equipment_by_name(self, name, columns=None):
         """根据名称获取设备"""
         if self.client is None:
             return None
             
         try:
-            result = self.client.select('equipment', conditions={'name': name})
+            result = self.client.select('equipment', conditions={'name': name}, columns=columns)
             return result[0] if result else None
         except Exception as e:
             logger.error(f"获取设备失败: {e}")
@@ -135,6 +419,7 @@ class SupabaseManager:
                 'is_active': is_active
             }
             result = self.client.update('equipment', data, equipment_id)
+            equipment_catalog.invalidate()
             return result is not None
                 
         except Exception as e:
@@ -151,6 +436,7 @@ class SupabaseManager:
                 'is_active': False
             }
             result = self.client.update('equipment', data, equipment_id)
+            equipment_catalog.invalidate()
             return result is not None
                 
         except Exception as e:
@@ -164,10 +450,11 @@ class SupabaseManager:
             
         try:
             # 查找设备
-            equipment = self.get_equipment_by_name(equipment_name)
+            equipment = self.get_equipment_by_name(equipment_name, columns=['id'])
             if equipment:
                 # 从数据库硬删除（永久删除）
                 result = self.client.delete('equipment', equipment['id'])
+                equipment_catalog.invalidate()
                 return result
             return False
                 
@@ -175,56 +462,59 @@ class SupabaseManager:
             logger.error(f"删除设备失败: {e}")
             return False
     
-    def add_equipment(self, name):
-        """添加新设备"""
+    def add_equipment(self, name) -> Optional[bool]:
+        """添加新设备 - 新增返回 True，同名设备已存在返回 False，失败返回 None
+        
+        名称规范化后按唯一约束合并写入，一次请求完成，不需要预先检查是否存在。
+        """
         if self.client is None:
             logger.error("添加设备失败：数据库客户端未初始化")
-            return False
+            return None
             
         try:
-            logger.info(f"📝 开始添加设备: '{name}'")
-            
-            # 检查设备是否已存在
-            existing = self.get_equipment_by_name(name)
-            if existing:
-                logger.warning(f"⚠️ 设备 '{name}' 已存在，id={existing.get('id')}")
-                return False  # 已存在
-            
-            # 插入新设备
-            from datetime import datetime
-            data = {
-                'name': name.strip(),
-                'is_active': True,
-                'created_at': datetime.now().isoformat()
-            }
+            data = self._equipment_row(name)
+            if not data['name']:
+                return None
             
-            logger.info(f"📤 插入数据: {data}")
-            result = self.client.insert('equipment', data)
-            
-            if result is not None:
-                logger.info(f"✅ 设备添加成功: '{name}' -> id={result.get('id')}")
-                return True
-            else:
-                logger.error("❌ 设备添加失败: 插入操作返回 None")
+            inserted = self._insert_new_equipment([data])
+            if not inserted:
+                logger.warning(f"⚠️ 设备 '{data['name']}' 已存在")
                 return False
+            
+            logger.info(f"✅ 设备添加成功: '{data['name']}' -> id={inserted[0].get('id')}")
+            return True
                     
         except Exception as e:
             logger.error(f"❌ 添加设备失败: {e}", exc_info=True)
-            return False
+            return None
+    
+    def _load_equipment(self):
+        """从数据库加载所有在用设备，供设备目录缓存使用（失败时抛出 SupabaseError）"""
+        return self.client.select('equipment', 
+                              order_by='name ASC', 
+                              conditions={'is_active': True})
     
-    def get_all_equipment(self):
-        """获取所有设备"""
+    def get_all_equipment(self, columns=None):
+        """获取所有设备 - 读取进程内设备目录缓存，columns 指定只返回的列"""
         if self.client is None:
             return []
             
         try:
-            result = self.client.select('equipment', 
-                                    order_by='name ASC', 
-                                    conditions={'is_active': True})
-            return result
+            devices = equipment_catalog.get(self._load_equipment)
+            if columns:
+                return [{column: device.get(column) for column in columns} for device in devices]
+            return devices
         except Exception as e:
+            if self.replica_ready():
+                logger.warning(f"获取设备列表失败，使用本地副本: {e}")
+                return self.replica.select('equipment', order_by='name ASC',
+                                           conditions={'is_active': True}, columns=columns)
             logger.error(f"获取设备列表失败: {e}")
             return []
+    
+    def get_equipment_names(self) -> List[str]:
+        """获取所有在用设备名称"""
+        return [device['name'] for device in self.get_all_equipment(columns=['name'])]
     def search_equipment_by_name(self, keyword: str):
         """根据关键词搜索设备（模糊查询）"""
         if self.client is None:
@@ -254,52 +544,56 @@ class SupabaseManager:
     def get_equipment_count(self):
         """获取设备总数"""
         try:
-            equipment_list = self.get_all_equipment()
+            equipment_list = self.get_all_equipment(columns=['id'])
             return len(equipment_list)
         except Exception as e:
             logger.error(f"获取设备数量失败: {e}")
             return 0
     def batch_delete_equipment(self, equipment_names: list):
-        """批量删除设备"""
+        """批量删除设备 - 一次请求"""
         if self.client is None:
             return False
             
         try:
-            success_count = 0
-            fail_count = 0
-            
-            for name in equipment_names:
-                if self.delete_equipment_by_name(name):
-                    success_count += 1
-                else:
-                    fail_count += 1
+            if not equipment_names:
+                return False
             
-            logger.info(f"批量删除设备完成: 成功 {success_count} 个, 失败 {fail_count} 个")
-            return success_count > 0
+            success = self.client.delete_where('equipment', 'name', equipment_names)
+            equipment_catalog.invalidate()
+            logger.info(f"批量删除设备 {len(equipment_names)} 个: {'成功' if success else '失败'}")
+            return success
                 
         except Exception as e:
             logger.error(f"批量删除设备失败: {e}")
             return False
     def sync_equipment(self, device_names):
-        """同步设备列表"""
+        """同步设备列表 - 无论设备数量多少，固定为一次查询、一次删除、一次插入"""
         if self.client is None:
             return False
             
         try:
-            # 获取当前所有设备
-            current_devices = self.get_all_equipment()
-            current_names = {device['name'] for device in current_devices}
-            new_names = set(device_names)
+            # 获取当前所有设备（包括已停用的，避免重复插入同名设备）
+            all_devices = self.client.select('equipment', columns=['name', 'is_active'])
+            existing_names = {device['name'] for device in all_devices}
+            current_names = {device['name'] for device in all_devices if device.get('is_active', True)}
+            new_names = {normalize_equipment_name(name) for name in device_names} - {''}
             
             # 删除不在新列表中的设备
             to_delete = current_names - new_names
-            for name in to_delete:
-                self.delete_equipment_by_name(name)
+            if to_delete:
+                success = self.client.delete_where('equipment', 'name', to_delete)
+                equipment_catalog.invalidate()
+                if not success:
+                    return False
             
             # 添加新设备
-            to_add = new_names - current_names
-            for name in to_add:
-                self.add_equipment(name)
+            to_add = new_names - existing_names
+            if to_add:
+                rows = [self._equipment_row(name) for name in sorted(to_add)]
+                result = self.client.insert_many('equipment', rows)
+                equipment_catalog.invalidate()
+                if result is None:
+                    return False
             
             return True
                 
@@ -307,8 +601,13 @@ class SupabaseManager:
             logger.error(f"同步设备列表失败: {e}")
             return False
     
+    def _load_settings(self) -> Dict[str, Any]:
+        """从数据库加载全部设置，供设置缓存使用（失败时抛出 SupabaseError）"""
+        rows = self.client.select('settings', columns=['key', 'value'])
+        return {row['key']: row['value'] for row in rows}
+    
     def get_setting(self, key: str, default=None) -> Any:
-        """获取设置值"""
+        """获取设置值 - 读取进程内设置缓存"""
         if self.client is None:
             # 如果客户端未初始化，返回配置管理器的默认值
             if key == "admin_password_hash" and self.config_manager:
@@ -316,10 +615,17 @@ class SupabaseManager:
             return default
             
         try:
-            result = self.client.select('settings', conditions={"key": key})
+            try:
+                value = settings_store.get(key, self._load_settings)
+            except SupabaseError as e:
+                if not self.replica_ready():
+                    raise
+                logger.warning(f"获取设置失败，使用本地副本: {e}")
+                rows = self.replica.select('settings', conditions={'key': key}, columns=['value'])
+                value = rows[0]['value'] if rows else None
             
-            if result:
-                return result[0]['value']
+            if value is not None:
+                return value
             elif key == "admin_password_hash" and self.config_manager:
                 # 数据库中没有，使用配置管理器的默认值
                 return self.config_manager.get_default_password_hash()
@@ -331,21 +637,17 @@ class SupabaseManager:
             return default
     
     def set_setting(self, key: str, value: str) -> bool:
-        """设置值"""
+        """设置值 - 按 key 一次 upsert，成功后同步更新缓存"""
         if self.client is None:
             return False
             
         try:
-            existing = self.client.select('settings', conditions={"key": key})
-            
-            if existing:
-                # 更新现有设置
-                success = self.client.update('settings', {"value": value}, existing[0]['id'])
-            else:
-                # 插入新设置
-                success = self.client.insert('settings', {"key": key, "value": value})
+            result = self.client.upsert('settings', {"key": key, "value": value}, on_conflict='key')
+            if result is None:
+                return False
             
-            return success is not None
+            settings_store.put(key, value)
+            return True
                 
         except Exception as e:
             logger.error(f"设置值失败: {e}")
@@ -369,21 +671,34 @@ class SupabaseManager:
         
         return sanitized
     
-    def get_record_by_id(self, record_id: int) -> Optional[Dict[str, Any]]:
+    def get_record_by_id(self, record_id: int) -> Optional[Record]:
         """根据ID获取记录"""
         if self.client is None:
             return None
             
         try:
             result = self.client.select('entries', conditions={'id': record_id})
-            return result[0] if result else None
+            return Record.from_row(result[0]) if result else None
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
         except Exception as e:
             logger.error(f"获取记录失败: {e}")
             return None
     
-    def save_record(self, data: Dict[str, Any], record_id: Optional[int] = None) -> bool:
-        """保存记录（插入或更新）"""
-        if self.client is None:
+    def save_record(self, data: Dict[str, Any], record_id: Optional[int] = None,
+                    original: Optional[Record] = None) -> bool:
+        """保存记录（插入或更新）
+        
+        新增记录先写入本地写前日志并立即确认，由后台线程批量回放到数据库；
+        后端不可用时记录保留在本地，恢复后自动补写。
+        
+        更新时只发送一次 update 请求，登记时间和创建日期不在更新字段中，保持原值。
+        传入 original（界面编辑前读取的记录）时只发送有变化的字段，并检查 last_modified
+        未被其他会话修改，否则抛出 RecordConflictError；没有变化时不发请求。
+        记录已被删除或后端不可用时返回 False。
+        """
+        if self.client is None and self.journal is None:
             logger.error("数据库客户端未初始化")
             return False
             
@@ -415,43 +730,30 @@ class SupabaseManager:
             }
             
             if record_id:  # 更新记录
+                if self.client is None:
+                    logger.error("数据库客户端未初始化")
+                    return False
                 logger.info(f"准备更新记录 ID: {record_id}")
-                # 保留原始登记时间
-                existing = self.get_record_by_id(record_id)
-                if existing:
-                    # 处理 register_datetime - 确保是字符串格式
-                    register_datetime = existing.get('register_datetime')
-                    if register_datetime:
-                        if isinstance(register_datetime, datetime):
-                            # 如果是 datetime 对象，转换为字符串
-                            record_data['register_datetime'] = register_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                        elif isinstance(register_datetime, str):
-                            # 如果是字符串，直接使用
-                            record_data['register_datetime'] = register_datetime
-                        else:
-                            # 其他情况，使用当前时间
-                            record_data['register_datetime'] = now_str
-                    else:
-                        record_data['register_datetime'] = now_str
-                    
-                    # 处理 created_at - 确保是字符串格式
-                    created_at = existing.get('created_at')
-                    if created_at:
-                        if isinstance(created_at, datetime):
-                            # 如果是 datetime 对象，转换为日期字符串
-                            record_data['created_at'] = created_at.strftime("%Y-%m-%d")
-                        elif isinstance(created_at, str):
-                            # 如果是字符串，直接使用
-                            record_data['created_at'] = created_at
-                        else:
-                            # 其他情况，使用当前日期
-                            record_data['created_at'] = now.strftime("%Y-%m-%d")
-                    else:
-                        record_data['created_at'] = now.strftime("%Y-%m-%d")
+                filters = None
+                if original is not None:
+                    changes = self._diff_record(original, sanitized)
+                    if not changes:
+                        logger.info(f"记录 {record_id} 没有变化，跳过更新")
+                        return True
+                    record_data = {**changes, 'last_modified': now_str}
+                    filters = [self._last_modified_filter(original)]
                 
                 logger.info(f"更新数据: {record_data}")
-                result = self.client.update('entries', record_data, record_id)
+                result = self.client.update('entries', record_data, record_id, filters=filters)
+                if result is None and filters is not None and self._record_exists(record_id):
+                    # 记录仍在，只是 last_modified 条件不满足
+                    raise RecordConflictError(f"记录 {record_id} 已被其他人修改，请重新加载后再编辑",
+                                              "更新entries")
                 if result is not None:
+                    if self.replica is not None:
+                        self.replica.upsert_rows('entries', [result])
+                    record_index.upsert(result)
+                    record_counts.invalidate()
                     logger.info(f"✅ 更新记录 {record_id} 成功: {result.get('name')}")
                     return True
                 else:
@@ -462,108 +764,132 @@ class SupabaseManager:
                 record_data['register_datetime'] = now_str
                 record_data['created_at'] = now.strftime("%Y-%m-%d")
                 
+                if self.journal is not None:
+                    # 先落盘再确认，由后台线程回放到数据库
+                    seq = self.journal.append('entries', 'insert', record_data)
+                    if self.flusher is not None:
+                        self.flusher.wake()
+                    logger.info(f"✅ 新记录已写入离线日志 #{seq}: {record_data.get('name')}")
+                    return True
+                
                 logger.info(f"插入数据: {record_data}")
                 result = self.client.insert('entries', record_data)
                 if result is not None:
+                    record_index.upsert(result)
+                    record_counts.invalidate()
                     logger.info(f"✅ 插入新记录成功: {result.get('name')}")
                     return True
                 else:
                     logger.error("❌ 插入新记录失败，返回结果为 None")
                     return False
                     
+        except RecordConflictError:
+            # 并发冲突交给界面提示用户重新加载
+            raise
         except Exception as e:
             logger.error(f"保存记录失败: {e}", exc_info=True)
             return False
     
+    @staticmethod
+    def _diff_record(original: Record, sanitized: Dict[str, Any]) -> Dict[str, Any]:
+        """比较表单数据与原记录，返回有变化的字段（空字符串与 None 视为相同）"""
+        current = original.as_dict()
+        current['test_date'] = original.test_date.isoformat() if original.test_date else ''
+        changes = {}
+        for field, value in sanitized.items():
+            old = current.get(field)
+            if field in ('machine_hours', 'cost'):
+                changed = abs(float(value or 0) - float(old or 0)) > 1e-9
+            else:
+                changed = (value or '') != (old or '')
+            if changed:
+                changes[field] = value
+        return changes
+    
+    @staticmethod
+    def _last_modified_filter(original: Record) -> tuple:
+        """乐观并发条件：数据库中的 last_modified 仍是读取时的值
+        
+        按数据库返回的原始字符串比较，重新格式化会丢掉小数秒和时区，永远不相等。
+        """
+        value = original.last_modified_raw
+        if value is None:
+            value = original.last_modified
+        if value is None:
+            return ('last_modified', 'is', None)
+        return ('last_modified', 'eq', value.isoformat() if isinstance(value, datetime) else value)
+    
+    def _record_exists(self, record_id: int) -> bool:
+        """记录是否仍存在（后端不可用时抛出 SupabaseError）"""
+        if self.client is None or self.client.client is None:
+            return False
+        return bool(self.client.select('entries', conditions={'id': record_id}, columns=['id'], limit=1))
+    
     def delete(self, table: str, record_id: int):
-        """删除数据"""
+        """删除数据 - 删除记录后同步更新记录数缓存、关键词索引和本地副本"""
         if not self.client:
             return False
         try:
-            response = self.client.table(table).delete().eq('id', record_id).execute()
-            # 检查是否成功删除
-            if hasattr(response, 'data'):
-                return True
-            return False
+            if not self.client.delete(table, record_id):
+                return False
+            if table == 'entries':
+                record_counts.invalidate()
+                record_index.remove(record_id)
+                if self.replica is not None:
+                    self.replica.delete_rows('entries', [record_id])
+            return True
         except Exception as e:
             logger.error(f"删除失败: {e}")
             return False
     
-    # 在 supabase_manager.py 的 get_records() 方法中，修改日期过滤逻辑：
     def get_records(self, 
                     conditions: Optional[Dict[str, Any]] = None,
                     date_range: Optional[tuple] = None,
                     date_field: str = "test_date",  # 新增参数，指定日期字段
                     order_by: str = "test_date DESC, id DESC",
-                    limit: int = 200) -> List[Dict[str, Any]]:
-        """查询记录 - 修复数据库连接问题"""
+                    limit: Optional[int] = 200,
+                    name: Optional[str] = None,
+                    advisor: Optional[str] = None,
+                    equipment: Union[str, List[str], None] = None,
+                    keywords: Optional[str] = None,
+                    columns: Optional[List[str]] = None) -> List[Record]:
+        """查询记录 - 单次查询，最多返回 limit 条
+        
+        启用本地副本且已同步时在副本中查询，否则所有过滤条件在服务端执行。
+        columns 指定只返回的列，默认返回全部列。
+        limit 为 None 时不加 LIMIT，但服务端查询仍受 PostgREST 的 max-rows 上限截断；
+        需要读取全部匹配记录时使用 iter_records() 按键集分块读取。
+        """
         if self.client is None:
             logger.warning("数据库客户端未初始化")
             return []
         
         try:
-            # 安全限制
-            safe_limit = min(limit, 500) if limit else 200
-            
-            # 构建查询条件
-            query_conditions = {}
-            if conditions:
-                for field, value in conditions.items():
-                    if value is not None and value != '':
-                        query_conditions[field] = value
+            filters = self._record_filters(conditions=conditions,
+                                           date_range=date_range,
+                                           date_field=date_field,
+                                           name=name,
+                                           advisor=advisor,
+                                           equipment=equipment,
+                                           keywords=keywords)
             
-            logger.info(f"查询条件: {query_conditions}, 日期范围: {date_range}, 日期字段: {date_field}, 排序: {order_by}")
-            
-            # 先尝试简单查询测试连接
-            try:
-                test_result = self.client.select('entries', limit=1)
-                logger.info(f"数据库连接测试成功，表中有 {len(test_result) if test_result else 0} 条记录")
-            except Exception as e:
-                logger.error(f"数据库连接测试失败: {e}")
-                return []
+            logger.info(f"查询过滤: {filters}, 排序: {order_by}, 限制: {limit}")
             
             # 执行查询
-            records = self.client.select('entries', 
-                                    conditions=query_conditions if query_conditions else None,
-                                    order_by=order_by,
-                                    limit=safe_limit)
-            
-            logger.info(f"查询到 {len(records)} 条记录")
-            
-            # 日期范围过滤（基于指定的日期字段）
-            if date_range and len(date_range) == 2 and records:
-                start_date, end_date = date_range
-                filtered_records = []
-                for record in records:
-                    # 根据指定的日期字段获取日期
-                    record_date_str = None
-                    if date_field == "register_datetime":
-                        # 从登记时间中提取日期部分
-                        register_datetime = record.get('register_datetime', '')
-                        if register_datetime:
-                            # 处理ISO格式
-                            if 'T' in register_datetime:
-                                try:
-                                    dt = datetime.fromisoformat(register_datetime.replace('Z', '+00:00'))
-                                    record_date_str = dt.date().isoformat()
-                                except:
-                                    record_date_str = register_datetime.split('T')[0]
-                            else:
-                                record_date_str = register_datetime.split(' ')[0]  # 处理空格分隔格式
-                    else:
-                        # 默认使用test_date
-                        record_date_str = record.get(date_field, '')
-                    
-                    if record_date_str and start_date <= record_date_str <= end_date:
-                        filtered_records.append(record)
-                records = filtered_records
-                logger.info(f"基于 {date_field} 日期范围过滤后剩余 {len(records)} 条记录")
+            rows = self._record_source().select('entries', 
+                                 filters=filters,
+                                 order_by=order_by,
+                                 limit=limit,
+                                 columns=columns)
             
-            return records
+            logger.info(f"查询到 {len(rows)} 条记录")
+            return [Record.from_row(row) for row in rows]
             
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
         except Exception as e:
             logger.error(f"查询记录失败: {e}")
-            # 返回空列表而不是抛出异常
             return []
         
     def get_records_as_tuples(self, 
@@ -571,7 +897,11 @@ class SupabaseManager:
                             date_range: Optional[tuple] = None,
                             date_field: str = "test_date",  # 新增参数
                             order_by: str = "test_date DESC, id DESC",
-                            limit: int = 200) -> List[tuple]:
+                            limit: Optional[int] = 200,
+                            name: Optional[str] = None,
+                            advisor: Optional[str] = None,
+                            equipment: Union[str, List[str], None] = None,
+                            keywords: Optional[str] = None) -> List[tuple]:
         """获取记录并转换为元组格式（兼容旧接口）"""
         try:
             # 调用 get_records() 并传递所有参数
@@ -580,7 +910,11 @@ class SupabaseManager:
                 date_range=date_range,
                 date_field=date_field,  # 传递 date_field 参数
                 order_by=order_by,
-                limit=limit
+                limit=limit,
+                name=name,
+                advisor=advisor,
+                equipment=equipment,
+                keywords=keywords
             )
             
             if not records:
@@ -590,33 +924,7 @@ class SupabaseManager:
             result = []
             for record in records:
                 try:
-                    # 处理登记时间格式
-                    register_datetime = record.get('register_datetime', '')
-                    if register_datetime and isinstance(register_datetime, str):
-                        # 如果是ISO格式，尝试格式化
-                        if 'T' in register_datetime:
-                            try:
-                                dt = datetime.fromisoformat(register_datetime.replace('Z', '+00:00'))
-                                register_datetime = dt.strftime("%Y-%m-%d %H:%M:%S")
-                            except:
-                                pass
-                    
-                    record_tuple = (
-                        record.get('id'),
-                        register_datetime,
-                        record.get('test_date', ''),
-                        record.get('test_time', ''),
-                        record.get('name', ''),
-                        record.get('contact', ''),
-                        record.get('advisor', ''),
-                        record.get('equipment', ''),
-                        record.get('machine_hours', 0.0),
-                        record.get('cost', 0),
-                        record.get('remark', ''),
-                        record.get('created_at', ''),
-                        record.get('last_modified', '')
-                    )
-                    result.append(record_tuple)
+                    result.append(record.to_tuple())
                 except Exception as e:
                     logger.error(f"转换记录失败: {e}, 记录: {record}")
                     continue
@@ -624,17 +932,267 @@ class SupabaseManager:
             logger.info(f"成功转换 {len(result)} 条记录为元组格式")
             return result
             
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
         except Exception as e:
             logger.error(f"获取记录元组失败: {e}")
             return []
     
+    @staticmethod
+    def record_to_tuple(record: Union[Record, Dict[str, Any]]) -> tuple:
+        """把记录（或数据库行字典）转换为元组格式（兼容旧接口）"""
+        return Record.coerce(record).to_tuple()
+    
+    def get_records_page(self,
+                         page_size: int = 50,
+                         cursor: Optional[tuple] = None,
+                         direction: str = "next",
+                         as_tuples: bool = False,
+                         as_rows: bool = False,
+                         conditions: Optional[Dict[str, Any]] = None,
+                         date_range: Optional[tuple] = None,
+                         date_field: str = "test_date",
+                         name: Optional[str] = None,
+                         advisor: Optional[str] = None,
+                         equipment: Union[str, List[str], None] = None,
+                         keywords: Optional[str] = None,
+                         columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """按 (test_date DESC, id DESC) 键集分页查询记录
+        
+        cursor 为 (test_date, id)：direction="next" 取该位置之后的一页，
+        direction="prev" 取之前的一页。每次只取 page_size + 1 行，与表的大小无关；
+        本地副本已同步时在副本中查询，后端不可用时仍可翻页。返回 records、first_cursor、last_cursor、has_next、has_prev，
+        records 为 Record 列表，as_tuples=True 时为兼容旧接口的元组，
+        as_rows=True 时为服务端返回的原始行（字典），供 records_to_frame 按列转换。
+        columns 指定只返回的列，游标列 test_date、id 总会包含在内。
+        """
+        page = empty_page()
+        if self.client is None:
+            logger.warning("数据库客户端未初始化")
+            return page
+        
+        try:
+            filters = self._record_filters(conditions=conditions,
+                                           date_range=date_range,
+                                           date_field=date_field,
+                                           name=name,
+                                           advisor=advisor,
+                                           equipment=equipment,
+                                           keywords=keywords)
+            
+            backward = direction == "prev" and cursor is not None
+            if cursor is not None:
+                filters.append(keyset_filter(cursor, backward))
+            
+            # 向前翻页时反向排序，取到后再翻转回来
+            records = self._record_source().select('entries',
+                                         filters=filters,
+                                         order_by=PAGE_ORDER_REVERSED if backward else PAGE_ORDER,
+                                         limit=page_size + 1,
+                                         columns=page_columns(columns))
+            
+            page = build_page(records, page_size, cursor, backward)
+            if as_rows:
+                return page
+            page['records'] = [Record.from_row(r) for r in page['records']]
+            if as_tuples:
+                page['records'] = [r.to_tuple() for r in page['records']]
+            
+            logger.info(f"分页查询到 {len(page['records'])} 条记录, 游标: {cursor}, 方向: {direction}")
+            return page
+            
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
+        except Exception as e:
+            logger.error(f"分页查询记录失败: {e}")
+            return page
+    
+    def iter_records(self,
+                     chunk_size: int = 1000,
+                     conditions: Optional[Dict[str, Any]] = None,
+                     date_range: Optional[tuple] = None,
+                     date_field: str = "test_date",
+                     name: Optional[str] = None,
+                     advisor: Optional[str] = None,
+                     equipment: Union[str, List[str], None] = None,
+                     keywords: Optional[str] = None,
+                     columns: Optional[List[str]] = None) -> Iterator[List[Record]]:
+        """按 (test_date DESC, id DESC) 键集逐块读取全部匹配的记录，每次产出一块 Record 列表
+        
+        过滤条件与 get_records_page 相同。每块只查询一次（本地副本已同步时查询副本），
+        调用方处理完一块才读取下一块，内存占用与匹配的总行数无关。
+        后端错误直接抛出，不会产出不完整的结果。
+        """
+        if self.client is None:
+            raise SupabaseError("数据库客户端未初始化", "查询entries")
+        
+        filters = self._record_filters(conditions=conditions,
+                                       date_range=date_range,
+                                       date_field=date_field,
+                                       name=name,
+                                       advisor=advisor,
+                                       equipment=equipment,
+                                       keywords=keywords)
+        source = self._record_source()
+        cursor = None
+        while True:
+            page_filters = filters + [keyset_filter(cursor)] if cursor is not None else filters
+            rows = source.select('entries',
+                                      filters=page_filters,
+                                      order_by=PAGE_ORDER,
+                                      limit=chunk_size,
+                                      columns=page_columns(columns))
+            if not rows:
+                return
+            yield [Record.from_row(row) for row in rows]
+            if len(rows) < chunk_size:
+                return
+            cursor = (rows[-1]['test_date'], rows[-1]['id'])
+    
+    def export_records(self, fmt: str = "csv", chunk_size: int = 1000, **filter_kwargs) -> Iterator[bytes]:
+        """导出符合条件的全部记录，逐块产出文件字节
+        
+        fmt 为 "csv" 或 "xlsx"，过滤参数同 get_records_page。CSV 每读取一块记录就产出一段，
+        可以边查询边下载；xlsx 需要 openpyxl，写完全部行后产出文件内容。
+        """
+        from record_export import iter_export, EXPORT_FIELDS
+        
+        chunks = self.iter_records(chunk_size=chunk_size, columns=EXPORT_FIELDS, **filter_kwargs)
+        return iter_export(chunks, fmt)
+    
+    def count_records(self,
+                      method: str = "exact",
+                      conditions: Optional[Dict[str, Any]] = None,
+                      date_range: Optional[tuple] = None,
+                      date_field: str = "test_date",
+                      name: Optional[str] = None,
+                      advisor: Optional[str] = None,
+                      equipment: Union[str, List[str], None] = None,
+                      keywords: Optional[str] = None) -> Optional[int]:
+        """统计符合条件的记录数 - HEAD 请求，不传输任何行
+        
+        过滤条件与 get_records_page 相同；method 为 "exact"、"planned" 或 "estimated"。
+        结果按过滤条件在进程内缓存，写入记录后作废。本地副本已同步时在副本中统计，
+        与分页和统计读取同一份数据；后端不可用且没有副本时返回 None。
+        """
+        if self.client is None:
+            return None
+        
+        filter_kwargs = dict(conditions=conditions, date_range=date_range, date_field=date_field,
+                             name=name, advisor=advisor, equipment=equipment, keywords=keywords)
+        key = count_key(method, filter_kwargs)
+        
+        def load():
+            filters = self._record_filters(**filter_kwargs)
+            if self.replica_ready():
+                return self.replica.record_stats(filters)[0]['count']
+            try:
+                return self.client.count('entries', filters=filters, method=method)
+            except SupabaseError as e:
+                logger.error(f"统计记录数失败: {e}")
+                return None
+        
+        try:
+            return record_counts.get(key, load)
+        except Exception as e:
+            logger.error(f"统计记录数失败: {e}")
+            return None
+    
+    def get_record_stats(self,
+                         group_by: Optional[str] = None,
+                         conditions: Optional[Dict[str, Any]] = None,
+                         date_range: Optional[tuple] = None,
+                         date_field: str = "test_date",
+                         name: Optional[str] = None,
+                         advisor: Optional[str] = None,
+                         equipment: Union[str, List[str], None] = None,
+                         keywords: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """统计符合条件的全部记录：条数、总机时、总费用
+        
+        过滤条件与 get_records 相同，本地副本已同步时在副本中聚合，否则在服务端聚合，
+        只传输聚合结果（见 _aggregate_records）。
+        group_by 为 "equipment"、"advisor" 或 "month" 时同时返回分组统计。
+        返回 {'count', 'machine_hours', 'cost', 'groups'}，失败时返回 None。
+        """
+        if self.client is None:
+            return None
+        
+        try:
+            filters = self._record_filters(conditions=conditions,
+                                           date_range=date_range,
+                                           date_field=date_field,
+                                           name=name,
+                                           advisor=advisor,
+                                           equipment=equipment,
+                                           keywords=keywords)
+            column = stats_group_column(group_by)
+            
+            if self.replica_ready():
+                rows = self.replica.record_stats(filters, column)
+            else:
+                rows = self._aggregate_records(filters, column)
+            return rollup_stats(rows, group_by)
+            
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
+        except Exception as e:
+            logger.error(f"统计记录失败: {e}")
+            return None
+    
+    def _aggregate_records(self, filters: list, group_column: Optional[str]) -> List[Dict[str, Any]]:
+        """在服务端聚合 entries，返回供 rollup_stats 汇总的行
+        
+        依次使用 PostgREST 聚合查询和 record_stats 数据库函数（见 record_query.AggregateSupport）；
+        两者都不可用时分批读取机时和费用列在本地汇总，结果相同，但传输量与匹配的行数成正比。
+        """
+        if aggregate_support.enabled:
+            columns = [group_column, *STATS_AGGREGATES] if group_column else STATS_AGGREGATES
+            try:
+                return self.client.select('entries', filters=filters, columns=columns)
+            except SupabaseRequestError as e:
+                if not aggregate_support.check(e):
+                    raise
+                logger.warning("服务端未启用 PostgREST 聚合函数，改用 record_stats 数据库函数统计")
+        
+        if aggregate_support.function_enabled:
+            try:
+                rows = self.client.rpc(STATS_FUNCTION, stats_rpc_params(filters, group_column), retry=True)
+                return stats_rpc_rows(rows, group_column)
+            except SupabaseRequestError as e:
+                if not aggregate_support.check_function(e):
+                    raise
+                logger.error("数据库中没有 record_stats 函数，记录统计改为读取明细汇总，"
+                             "请执行 supabase/migrations 中的迁移")
+        
+        columns = ['id', 'machine_hours', 'cost', *([group_column] if group_column else [])]
+        return self._select_all('entries', filters, columns)
+    
+    def _select_all(self, table: str, filters: list, columns: List[str],
+                    batch_size: int = 1000) -> List[Dict[str, Any]]:
+        """按 id 键集分批读取全部匹配的行，不受服务端单次返回行数上限影响"""
+        rows = []
+        last_id = None
+        while True:
+            batch_filters = list(filters)
+            if last_id is not None:
+                batch_filters.append(('id', 'gt', last_id))
+            batch = self.client.select(table, filters=batch_filters, order_by='id ASC',
+                                       limit=batch_size, columns=columns)
+            rows.extend(batch)
+            if len(batch) < batch_size:
+                return rows
+            last_id = batch[-1]['id']
+    
     def search_records(self, 
                       keywords: Optional[str] = None,
                       advisor: Optional[str] = None,
                       equipment: Optional[str] = None,
                       start_date: Optional[str] = None,
                       end_date: Optional[str] = None,
-                      limit: int = 100) -> List[Dict[str, Any]]:
+                      limit: int = 100) -> List[Record]:
         """高级搜索记录"""
         if self.client is None:
             return []
@@ -644,35 +1202,21 @@ class SupabaseManager:
             
             if advisor:
                 conditions['advisor'] = advisor
-            if equipment:
-                conditions['equipment'] = equipment
             
             date_range = None
-            if start_date and end_date:
+            if start_date or end_date:
                 date_range = (start_date, end_date)
             
-            # 先按条件查询
-            records = self.get_records(conditions=conditions, 
-                                      date_range=date_range,
-                                      limit=limit)
-            
-            # 如果有关键词，进一步筛选
-            if keywords and records:
-                keywords_lower = keywords.lower()
-                filtered_records = []
-                for record in records:
-                    # 在多个字段中搜索关键词
-                    search_fields = ['name', 'advisor', 'equipment', 'remark', 'contact']
-                    found = any(
-                        keywords_lower in str(record.get(field, '')).lower()
-                        for field in search_fields
-                    )
-                    if found:
-                        filtered_records.append(record)
-                records = filtered_records
-            
-            return records
+            # 关键词、设备和日期范围均在服务端过滤
+            return self.get_records(conditions=conditions,
+                                    date_range=date_range,
+                                    equipment=equipment,
+                                    keywords=keywords,
+                                    limit=limit)
             
+        except SupabaseError:
+            # 后端错误交给界面显示，不能当作“没有数据”
+            raise
         except Exception as e:
             logger.error(f"搜索记录失败: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -16,14 +16,15 @@ class Utils:
             # 从数据库获取设备列表
             if hasattr(st, 'session_state') and 'db_manager' in st.session_state:
                 db_manager = st.session_state.db_manager
-                if db_manager and hasattr(db_manager, 'get_all_equipment'):
-                    devices = db_manager.get_all_equipment()
-                    if devices:
-                        return [device['name'] for device in devices]
+                if db_manager and hasattr(db_manager, 'get_equipment_names'):
+                    # 设备目录在进程内缓存，设备未变更时不查询数据库
+                    names = db_manager.get_equipment_names()
+                    if names:
+                        return names
                     else:
                         logger.warning("数据库中没有找到设备记录")
                 else:
-                    logger.warning("数据库管理器未初始化或缺少get_all_equipment方法")
+                    logger.warning("数据库管理器未初始化或缺少get_equipment_names方法")
         
         except Exception as e:
             logger.error(f"获取预设设备失败: {e}")
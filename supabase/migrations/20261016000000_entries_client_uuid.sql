@@ -0,0 +1,13 @@
+-- 离线写前日志的幂等键（src/offline_journal.py 中的 IDEMPOTENCY_KEY）
+-- 回放按 client_uuid 执行 ON CONFLICT DO NOTHING，请求超时后重试不会重复插入记录。
+ALTER TABLE entries ADD COLUMN IF NOT EXISTS client_uuid uuid;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'entries_client_uuid_key') THEN
+        ALTER TABLE entries ADD CONSTRAINT entries_client_uuid_key UNIQUE (client_uuid);
+    END IF;
+END $$;
+
+-- 让 PostgREST 重新加载表结构
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,87 @@
+-- 记录统计函数：PostgREST 聚合函数未启用（Supabase 默认关闭）时由 get_record_stats 调用
+-- filters 由 record_query.stats_rpc_params 序列化：
+-- [{"column": 列名, "op": 操作符, "value": 值}, ...]，op 为 or/and 时 value 为子条件数组
+-- 函数以调用者身份执行，行级安全策略照常生效。
+
+CREATE OR REPLACE FUNCTION record_stats_condition(condition jsonb)
+RETURNS text
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+    op text := condition->>'op';
+    col text := condition->>'column';
+    val jsonb := condition->'value';
+    parts text[];
+BEGIN
+    IF op IN ('or', 'and') THEN
+        SELECT array_agg(record_stats_condition(sub)) INTO parts
+        FROM jsonb_array_elements(val) AS sub;
+        IF parts IS NULL THEN
+            RETURN CASE WHEN op = 'and' THEN 'true' ELSE 'false' END;
+        END IF;
+        RETURN '(' || array_to_string(parts, ' ' || upper(op) || ' ') || ')';
+    END IF;
+
+    IF col IS NULL OR col NOT IN ('id', 'register_datetime', 'test_date', 'test_time', 'name', 'contact',
+                                   'advisor', 'equipment', 'machine_hours', 'cost', 'remark',
+                                   'created_at', 'last_modified') THEN
+        RAISE EXCEPTION 'record_stats: 无效的字段名 %', col;
+    END IF;
+
+    CASE op
+        WHEN 'eq' THEN RETURN format('%I = %L', col, val #>> '{}');
+        WHEN 'neq' THEN RETURN format('%I <> %L', col, val #>> '{}');
+        WHEN 'gt' THEN RETURN format('%I > %L', col, val #>> '{}');
+        WHEN 'gte' THEN RETURN format('%I >= %L', col, val #>> '{}');
+        WHEN 'lt' THEN RETURN format('%I < %L', col, val #>> '{}');
+        WHEN 'lte' THEN RETURN format('%I <= %L', col, val #>> '{}');
+        WHEN 'like' THEN RETURN format('%I LIKE %L', col, val #>> '{}');
+        WHEN 'ilike' THEN RETURN format('%I ILIKE %L', col, val #>> '{}');
+        WHEN 'in' THEN RETURN format('%I = ANY (%L)', col, ARRAY(SELECT jsonb_array_elements_text(val)));
+        WHEN 'is' THEN
+            IF val IS NULL OR jsonb_typeof(val) = 'null' THEN
+                RETURN format('%I IS NULL', col);
+            ELSIF jsonb_typeof(val) = 'boolean' THEN
+                RETURN format('%I IS %s', col, val #>> '{}');
+            END IF;
+            RAISE EXCEPTION 'record_stats: 无效的 is 条件 %', val;
+        ELSE
+            RAISE EXCEPTION 'record_stats: 不支持的过滤操作符 %', op;
+    END CASE;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION record_stats(filters jsonb DEFAULT '[]'::jsonb, group_column text DEFAULT NULL)
+RETURNS TABLE (group_value text, count bigint, hours double precision, cost bigint)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    where_sql text := 'true';
+    group_sql text := 'NULL::text';
+    condition jsonb;
+BEGIN
+    FOR condition IN SELECT value FROM jsonb_array_elements(filters) LOOP
+        where_sql := where_sql || ' AND ' || record_stats_condition(condition);
+    END LOOP;
+
+    IF group_column IS NOT NULL THEN
+        IF group_column NOT IN ('equipment', 'advisor', 'test_date') THEN
+            RAISE EXCEPTION 'record_stats: 不支持的分组字段 %', group_column;
+        END IF;
+        group_sql := format('%I::text', group_column);
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT %s, COUNT(*), SUM(machine_hours)::double precision, SUM(cost)::bigint '
+        'FROM entries WHERE %s GROUP BY 1',
+        group_sql, where_sql
+    );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION record_stats(jsonb, text) TO anon, authenticated;
+
+-- 让 PostgREST 重新加载函数列表
+NOTIFY pgrst, 'reload schema';
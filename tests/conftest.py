@@ -0,0 +1,7 @@
+# tests/conftest.py - 测试共用设置：模块按 app.py 的方式从 src 目录导入
+import os
+import sys
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
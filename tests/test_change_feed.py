@@ -0,0 +1,96 @@
+# tests/test_change_feed.py - 用 FakeChangeSource 驱动设备目录和设置缓存的变更处理
+import pytest
+
+import change_feed as change_feed_module
+from change_feed import ChangeFeed, FakeChangeSource, apply_to_caches, make_event
+from equipment_catalog import EquipmentCatalog
+from settings_store import SettingsStore
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """apply_to_caches 改写的是进程内单例，测试时换成新实例，结束后自动还原"""
+    catalog = EquipmentCatalog()
+    store = SettingsStore()
+    monkeypatch.setattr(change_feed_module, 'equipment_catalog', catalog)
+    monkeypatch.setattr(change_feed_module, 'settings_store', store)
+    return catalog, store
+
+
+@pytest.fixture
+def feed():
+    feed = ChangeFeed()
+    source = FakeChangeSource()
+    feed.start(source)
+    feed.subscribe(apply_to_caches)
+    yield feed, source
+    feed.stop()
+
+
+def test_make_event_normalizes_type():
+    event = make_event('entries', 'INSERT', {'id': 1})
+    assert event == {'table': 'entries', 'type': 'insert', 'record': {'id': 1}, 'old_record': {}}
+
+
+def test_feed_starts_one_source():
+    feed = ChangeFeed()
+    assert feed.start(FakeChangeSource())
+    assert not feed.start(FakeChangeSource())
+    feed.stop()
+    assert feed.source is None
+
+
+def test_failing_subscriber_does_not_block_others():
+    feed = ChangeFeed()
+    received = []
+
+    def broken(event):
+        raise RuntimeError("boom")
+
+    feed.subscribe(broken)
+    feed.subscribe(received.append)
+    feed.subscribe(received.append)
+    feed.publish(make_event('entries', 'insert', {'id': 1}))
+    assert len(received) == 1
+
+
+def test_equipment_event_reloads_catalog(caches, feed):
+    catalog, _ = caches
+    feed, source = feed
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [{'id': 1, 'name': "XRD"}]
+
+    catalog.get(loader)
+    catalog.get(loader)
+    assert len(loads) == 1
+
+    source.emit('equipment', 'UPDATE', {'id': 1, 'name': "XRD"})
+    assert catalog.version == 1
+    catalog.get(loader)
+    assert len(loads) == 2
+
+
+def test_settings_events_update_store(caches, feed):
+    _, store = caches
+    feed, source = feed
+    store.set_all({'admin_password_hash': "old", 'price': "100"})
+
+    def loader():
+        raise AssertionError("缓存有效时不应重新加载")
+
+    source.emit('settings', 'UPDATE', {'key': 'admin_password_hash', 'value': "new"})
+    assert store.get('admin_password_hash', loader) == "new"
+
+    source.emit('settings', 'DELETE', old_record={'key': 'price'})
+    assert store.get('price', loader) is None
+
+
+def test_settings_event_without_key_reloads(caches, feed):
+    _, store = caches
+    feed, source = feed
+    store.set_all({'price': "100"})
+    source.emit('settings', 'DELETE')
+    assert store.get('price', lambda: {'price': "200"}) == "200"
@@ -0,0 +1,94 @@
+# tests/test_health_monitor.py - 熔断器状态转换、探测和 TTL 缓存
+import pytest
+
+import supabase_client
+from errors import CircuitOpenError, SupabaseRequestError
+from health_monitor import HealthMonitor
+from supabase_client import SupabaseClient
+
+
+def _opened(cooldown_seconds=30, probe_timeout_seconds=10):
+    monitor = HealthMonitor(failure_threshold=2, cooldown_seconds=cooldown_seconds,
+                            probe_timeout_seconds=probe_timeout_seconds)
+    monitor.record_failure("超时")
+    assert monitor.state == HealthMonitor.CLOSED
+    monitor.record_failure("超时")
+    assert monitor.state == HealthMonitor.OPEN
+    return monitor
+
+
+def test_opens_after_threshold_and_fails_fast():
+    monitor = _opened()
+    assert not monitor.allow_request()
+    assert 29 < monitor.retry_after() <= 30
+
+
+def test_half_open_allows_one_probe_and_reports_its_time_left():
+    monitor = _opened(cooldown_seconds=0)
+    assert monitor.allow_request()
+    assert monitor.state == HealthMonitor.HALF_OPEN
+    assert not monitor.allow_request()
+    assert 9 < monitor.retry_after() <= 10
+
+    monitor.record_success()
+    assert monitor.state == HealthMonitor.CLOSED
+    assert monitor.retry_after() == 0
+    assert monitor.allow_request()
+
+
+def test_failed_probe_reopens():
+    monitor = _opened(cooldown_seconds=0)
+    assert monitor.allow_request()
+    monitor.record_failure("超时")
+    assert monitor.state == HealthMonitor.OPEN
+
+
+def test_stale_probe_lets_next_request_through():
+    monitor = _opened(cooldown_seconds=0, probe_timeout_seconds=0)
+    assert monitor.allow_request()
+    assert monitor.retry_after() == 0
+    assert monitor.allow_request()
+
+
+def test_is_healthy_reuses_recent_success():
+    monitor = HealthMonitor(ttl_seconds=60)
+    probes = []
+
+    def probe():
+        probes.append(1)
+        return True
+
+    assert monitor.is_healthy(probe)
+    assert probes == [1]
+    monitor.record_success()
+    assert monitor.is_healthy(probe)
+    assert probes == [1]
+
+    opened = _opened()
+    assert not opened.is_healthy(probe)
+    assert probes == [1]
+
+
+class _Query:
+    def __init__(self, error=None):
+        self.error = error
+
+    def execute(self):
+        if self.error is not None:
+            raise self.error
+        return "ok"
+
+
+def test_client_reports_results_to_monitor(monkeypatch):
+    monitor = _opened()
+    monkeypatch.setattr(supabase_client, 'health_monitor', monitor)
+    client = SupabaseClient.__new__(SupabaseClient)
+    with pytest.raises(CircuitOpenError, match="秒后重试"):
+        client._execute_once(_Query(), "查询entries")
+
+    monitor.record_success()
+    rejected = _Query(type("APIError", (Exception,), {'code': '23505'})("重复"))
+    with pytest.raises(SupabaseRequestError):
+        client._execute_once(rejected, "插入entries")
+    # 后端返回了错误响应，说明连接正常，不计入失败
+    assert monitor.failure_count == 0
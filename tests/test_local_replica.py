@@ -0,0 +1,141 @@
+# tests/test_local_replica.py - 本地副本的过滤条件翻译、键集分页和读取路由
+import pytest
+
+import supabase_manager
+from change_feed import make_event
+from errors import SupabaseUnavailableError
+from local_replica import LocalReplica, _format_filter
+from record_counts import RecordCountCache
+from record_query import PAGE_ORDER, PAGE_ORDER_REVERSED, build_page, keyset_filter
+from supabase_manager import SupabaseManager
+
+
+def test_format_simple_filters():
+    assert _format_filter(('name', 'eq', "张三")) == ("name = ?", ["张三"])
+    assert _format_filter(('cost', 'gte', 100)) == ("cost >= ?", [100])
+    assert _format_filter(('is_active', 'eq', True)) == ("is_active = ?", [1])
+    assert _format_filter(('remark', 'is', None)) == ("remark IS NULL", [])
+
+
+def test_format_in_filter():
+    assert _format_filter(('id', 'in', [1, 2, 3])) == ("id IN (?, ?, ?)", [1, 2, 3])
+    assert _format_filter(('id', 'in', [])) == ("0", [])
+
+
+def test_format_ilike_filter():
+    assert _format_filter(('name', 'ilike', "*张*")) == ("name LIKE ? ESCAPE '\\'", ["%张%"])
+
+
+def test_format_nested_filters():
+    clause, params = _format_filter((None, 'or', [
+        ('test_date', 'lt', "2024-05-01"),
+        (None, 'and', [('test_date', 'eq', "2024-05-01"), ('id', 'lt', 7)])
+    ]))
+    assert clause == "(test_date < ? OR (test_date = ? AND id < ?))"
+    assert params == ["2024-05-01", "2024-05-01", 7]
+    assert _format_filter((None, 'or', [])) == ("0", [])
+    assert _format_filter((None, 'and', [])) == ("1", [])
+
+
+def test_format_rejects_bad_filters():
+    with pytest.raises(ValueError):
+        _format_filter(('name; DROP TABLE entries', 'eq', 1))
+    with pytest.raises(ValueError):
+        _format_filter(('name', 'fts', "张三"))
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = LocalReplica(str(tmp_path / "replica.db"))
+    # 同一天多条记录，验证 (test_date, id) 游标在日期相同时按 id 翻页
+    rows = [{'id': i, 'test_date': f"2024-05-0{(i + 1) // 3 + 1}", 'name': f"用户{i}",
+             'machine_hours': 1.0, 'cost': 100}
+            for i in range(1, 11)]
+    replica.replace_all('entries', rows)
+    return replica
+
+
+def _fetch_page(replica, page_size, cursor=None, backward=False):
+    """与 SupabaseManager.get_records_page 相同的查询方式"""
+    filters = [keyset_filter(cursor, backward)] if cursor is not None else []
+    records = replica.select('entries', filters=filters,
+                             order_by=PAGE_ORDER_REVERSED if backward else PAGE_ORDER,
+                             limit=page_size + 1)
+    return build_page(records, page_size, cursor, backward)
+
+
+def test_keyset_paging_covers_all_rows(replica):
+    expected = [row['id'] for row in replica.select('entries', order_by=PAGE_ORDER)]
+    seen, cursor, pages = [], None, []
+    while True:
+        page = _fetch_page(replica, 3, cursor)
+        pages.append(page)
+        seen.extend(row['id'] for row in page['records'])
+        if not page['has_next']:
+            break
+        cursor = page['last_cursor']
+
+    assert seen == expected
+    assert len(pages) == 4
+    assert not pages[0]['has_prev'] and pages[1]['has_prev']
+
+    # 从第三页往回翻得到第二页
+    previous = _fetch_page(replica, 3, pages[2]['first_cursor'], backward=True)
+    assert [row['id'] for row in previous['records']] == \
+        [row['id'] for row in pages[1]['records']]
+    assert previous['has_prev'] and previous['has_next']
+
+
+def test_replica_applies_change_events(replica):
+    replica._set_watermark('entries', "2024-05-01T00:00:00", 10)
+    replica.apply_change(make_event('entries', 'INSERT', {'id': 11, 'test_date': "2024-06-01",
+                                                          'name': "新用户"}))
+    replica.apply_change(make_event('entries', 'DELETE', old_record={'id': 1}))
+    ids = {row['id'] for row in replica.select('entries', columns=['id'])}
+    assert 11 in ids and 1 not in ids
+
+
+class _DownClient:
+    """后端不可用的客户端"""
+
+    client = object()
+
+    def select(self, *args, **kwargs):
+        raise SupabaseUnavailableError("无法连接后端", "查询entries")
+
+    count = select
+
+
+@pytest.fixture
+def manager(replica, monkeypatch):
+    replica._set_watermark('entries', "2024-05-01T00:00:00", 10)
+    monkeypatch.setattr(supabase_manager, 'record_counts', RecordCountCache())
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = _DownClient()
+    manager.config_manager = None
+    manager.replica = replica
+    manager.journal = None
+    return manager
+
+
+def test_manager_reads_pages_from_replica(manager):
+    page = manager.get_records_page(page_size=4, as_rows=True)
+    assert [row['id'] for row in page['records']] == [10, 9, 8, 7]
+    page = manager.get_records_page(page_size=4, cursor=page['last_cursor'])
+    assert [record.id for record in page['records']] == [6, 5, 4, 3]
+
+    chunks = list(manager.iter_records(chunk_size=4, name="用户1"))
+    assert [[record.id for record in chunk] for chunk in chunks] == [[10, 1]]
+
+
+def test_manager_counts_and_stats_from_replica(manager):
+    assert manager.count_records(date_range=("2024-05-02", "2024-05-03")) == 6
+    stats = manager.get_record_stats(date_range=("2024-05-02", "2024-05-03"))
+    assert stats['count'] == 6 and stats['cost'] == 600
+
+
+def test_manager_without_synced_replica_reads_server(manager, tmp_path):
+    manager.replica = LocalReplica(str(tmp_path / "empty.db"))
+    with pytest.raises(SupabaseUnavailableError):
+        manager.get_records_page()
+    assert manager.count_records() is None
@@ -0,0 +1,165 @@
+# tests/test_offline_journal.py - 写前日志回放的幂等、拒绝和退回普通插入
+import pytest
+
+from errors import SupabaseRequestError, SupabaseTimeoutError, SupabaseUnavailableError
+from offline_journal import (IDEMPOTENCY_KEY, JournalFlusher, WriteAheadJournal,
+                             check_idempotency_key)
+
+
+class _Cause(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class FakeClient:
+    """按 client_uuid 唯一约束合并写入的内存后端"""
+
+    def __init__(self, has_key=True):
+        self.client = object()
+        self.has_key = has_key
+        self.rows = []
+        self.error = None
+        self.timeout_after_commit = False
+
+    def _check(self, rows):
+        if self.error is not None:
+            raise self.error
+        for row in rows:
+            if row.get('name') == "违规":
+                raise SupabaseRequestError("违反检查约束", "合并写入entries", _Cause('23514'))
+
+    def _store(self, row):
+        row = {**row, 'id': len(self.rows) + 1}
+        self.rows.append(row)
+        return row
+
+    def upsert(self, table, data, on_conflict, ignore_duplicates=False):
+        if not self.has_key:
+            raise SupabaseRequestError("没有匹配的唯一约束", "合并写入entries", _Cause('42P10'))
+        self._check(data)
+        existing = {row[on_conflict] for row in self.rows}
+        inserted = [self._store(row) for row in data if row[on_conflict] not in existing]
+        if self.timeout_after_commit:
+            self.timeout_after_commit = False
+            raise SupabaseTimeoutError("后端响应超时", "合并写入entries")
+        return inserted
+
+    def insert_many(self, table, rows):
+        self._check(rows)
+        return [self._store(row) for row in rows]
+
+    def select(self, table, columns=None, limit=None, **kwargs):
+        if self.error is not None:
+            raise self.error
+        if not self.has_key and IDEMPOTENCY_KEY in (columns or []):
+            raise SupabaseRequestError("列不存在", "查询entries", _Cause('42703'))
+        return self.rows[:limit]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return WriteAheadJournal(str(tmp_path / "journal.db"))
+
+
+def _flusher(journal, client):
+    flusher = JournalFlusher(journal, client, batch_size=10)
+    flushed = []
+    flusher.on_flushed.append(flushed.extend)
+    return flusher, flushed
+
+
+def test_append_adds_idempotency_key(journal):
+    journal.append('entries', 'insert', {'name': "张三"})
+    journal.append('entries', 'insert', {'name': "李四", IDEMPOTENCY_KEY: "fixed"})
+    keys = [entry['payload'][IDEMPOTENCY_KEY] for entry in journal.pending()]
+    assert keys[0] and keys[1] == "fixed"
+
+
+def test_replay_removes_flushed_entries(journal):
+    client = FakeClient()
+    flusher, flushed = _flusher(journal, client)
+    for name in ("张三", "李四"):
+        journal.append('entries', 'insert', {'name': name})
+
+    assert flusher.flush_once() == 2
+    assert [row['name'] for row in flushed] == ["张三", "李四"]
+    assert journal.count() == 0
+
+
+def test_retry_after_timeout_does_not_duplicate(journal):
+    client = FakeClient()
+    client.timeout_after_commit = True
+    flusher, flushed = _flusher(journal, client)
+    journal.append('entries', 'insert', {'name': "张三"})
+
+    # 服务端已提交但响应超时：条目保留，下一轮按幂等键跳过
+    assert flusher.flush_once() == 0
+    assert journal.count() == 1
+    assert flusher.flush_once() == 1
+    assert journal.count() == 0
+    assert len(client.rows) == 1
+    assert flushed == []
+
+
+def test_unavailable_backend_keeps_entries_pending(journal):
+    client = FakeClient()
+    client.error = SupabaseUnavailableError("无法连接后端", "合并写入entries")
+    flusher, _ = _flusher(journal, client)
+    journal.append('entries', 'insert', {'name': "张三"})
+
+    assert flusher.flush_once() == 0
+    assert journal.count() == 1
+    assert journal.count('rejected') == 0
+
+
+def test_rejected_entry_does_not_block_batch(journal):
+    client = FakeClient()
+    flusher, flushed = _flusher(journal, client)
+    for name in ("张三", "违规", "李四"):
+        journal.append('entries', 'insert', {'name': name})
+
+    assert flusher.flush_once() == 3
+    assert [row['name'] for row in flushed] == ["张三", "李四"]
+    rejected = journal.rejected()
+    assert [entry['payload']['name'] for entry in rejected] == ["违规"]
+    assert "违反检查约束" in rejected[0]['last_error']
+
+    journal.retry([rejected[0]['seq']])
+    assert journal.count() == 1 and journal.count('rejected') == 0
+    flusher.flush_once()
+    journal.discard([rejected[0]['seq']])
+    assert journal.count() == 0 and journal.count('rejected') == 0
+
+
+def test_unexpected_error_rejects_instead_of_retrying_forever(journal):
+    client = FakeClient()
+    client.error = TypeError("无法序列化")
+    flusher, _ = _flusher(journal, client)
+    journal.append('entries', 'insert', {'name': "张三"})
+    journal.append('entries', 'update', {'name': "李四"})
+
+    assert flusher.flush_once() == 2
+    assert journal.count() == 0
+    assert journal.count('rejected') == 2
+
+
+def test_missing_unique_constraint_falls_back_to_insert(journal):
+    client = FakeClient(has_key=False)
+    flusher, flushed = _flusher(journal, client)
+    journal.append('entries', 'insert', {'name': "张三"})
+
+    assert flusher.flush_once() == 1
+    assert not flusher.idempotent
+    assert journal.count() == 0 and journal.count('rejected') == 0
+    assert [row['name'] for row in flushed] == ["张三"]
+    assert IDEMPOTENCY_KEY not in client.rows[0]
+
+
+def test_check_idempotency_key():
+    assert check_idempotency_key(FakeClient()) is True
+    assert check_idempotency_key(FakeClient(has_key=False)) is False
+
+    client = FakeClient()
+    client.error = SupabaseUnavailableError("无法连接后端", "查询entries")
+    assert check_idempotency_key(client) is None
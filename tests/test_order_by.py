@@ -0,0 +1,83 @@
+# tests/test_order_by.py - 多字段排序的解析和 PostgREST / SQLite 渲染
+import pytest
+
+import local_replica
+from local_replica import LocalReplica
+from supabase_client import _format_order, build_select, parse_order_by
+
+
+def test_parse_multiple_keys_and_default_desc():
+    assert parse_order_by("test_date DESC, id") == [('test_date', True, None), ('id', True, None)]
+    assert parse_order_by("name asc") == [('name', False, None)]
+
+
+def test_parse_nulls_position():
+    assert parse_order_by("remark ASC NULLS FIRST, id DESC NULLS LAST") == [
+        ('remark', False, 'first'), ('id', True, 'last')]
+    assert parse_order_by("remark nulls last") == [('remark', True, 'last')]
+
+
+def test_parse_skips_empty_items():
+    assert parse_order_by("id DESC, ") == [('id', True, None)]
+
+
+@pytest.mark.parametrize('order_by', [
+    "id; DROP TABLE entries",
+    "test-date DESC",
+    "id DESC NULLS",
+    "id DESC NULLS MIDDLE",
+    "id SIDEWAYS",
+])
+def test_parse_rejects_invalid(order_by):
+    with pytest.raises(ValueError):
+        parse_order_by(order_by)
+
+
+def test_format_postgrest_order():
+    keys = parse_order_by("test_date DESC, id ASC NULLS LAST")
+    assert _format_order(keys) == "test_date.desc,id.asc.nullslast"
+
+
+def test_format_sqlite_order():
+    keys = parse_order_by("test_date DESC, id ASC NULLS LAST")
+    assert local_replica._format_order(keys) == "test_date DESC, id ASC NULLS LAST"
+
+
+class _Params(dict):
+    def set(self, key, value):
+        params = _Params(self)
+        params[key] = value
+        return params
+
+
+class _TableQuery:
+    """记录 select 结果的最小查询对象"""
+
+    def __init__(self):
+        self.params = _Params()
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def limit(self, limit):
+        self.params = self.params.set("limit", str(limit))
+        return self
+
+
+def test_build_select_sends_one_order_param():
+    query = build_select(_TableQuery(), order_by="test_date DESC, id DESC", limit=10)
+    assert query.params == {"order": "test_date.desc,id.desc", "limit": "10"}
+
+
+def test_replica_select_orders_by_every_key(tmp_path):
+    replica = LocalReplica(str(tmp_path / "replica.db"))
+    replica.replace_all('entries', [
+        {'id': 1, 'test_date': "2024-05-01", 'remark': "b"},
+        {'id': 2, 'test_date': "2024-05-02", 'remark': None},
+        {'id': 3, 'test_date': "2024-05-02", 'remark': "a"},
+    ])
+
+    rows = replica.select('entries', order_by="test_date DESC, id ASC")
+    assert [row['id'] for row in rows] == [2, 3, 1]
+    rows = replica.select('entries', order_by="remark ASC NULLS LAST")
+    assert [row['id'] for row in rows] == [3, 1, 2]
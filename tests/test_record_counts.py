@@ -0,0 +1,101 @@
+# tests/test_record_counts.py - 记录数缓存的键、过期、作废和删除后的失效
+import pytest
+
+import supabase_manager
+from change_feed import ChangeFeed, FakeChangeSource
+from record_counts import RecordCountCache, count_key
+from search_index import SearchIndex
+from supabase_manager import SupabaseManager
+
+
+class _Loader:
+    def __init__(self, count=5):
+        self.count = count
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.count
+
+
+def test_count_key_fills_defaults():
+    assert count_key('exact', {}) == count_key('exact', {'date_field': "test_date", 'name': None})
+    assert count_key('exact', {'name': "张三"}) != count_key('exact', {})
+    assert count_key('exact', {'name': "张三"}) != count_key('planned', {'name': "张三"})
+
+
+def test_cached_until_ttl_expires():
+    counts = RecordCountCache(ttl_seconds=300)
+    loader = _Loader()
+    key = count_key('exact', {})
+    assert counts.get(key, loader) == 5
+    assert counts.get(key, loader) == 5
+    assert loader.calls == 1
+
+    counts.configure(ttl_seconds=0)
+    counts.get(key, loader)
+    assert loader.calls == 2
+
+
+def test_failed_count_is_not_cached():
+    counts = RecordCountCache()
+    loader = _Loader(count=None)
+    key = count_key('exact', {})
+    assert counts.get(key, loader) is None
+    counts.get(key, loader)
+    assert loader.calls == 2
+
+
+def test_count_loaded_during_write_is_not_cached():
+    counts = RecordCountCache()
+    key = count_key('exact', {})
+    hit, _, version = counts.lookup(key)
+    assert not hit
+    counts.invalidate()
+    counts.store(key, 5, version)
+    assert not counts.lookup(key)[0]
+
+
+def test_only_entries_events_invalidate():
+    counts = RecordCountCache()
+    feed = ChangeFeed()
+    source = FakeChangeSource()
+    feed.start(source)
+    feed.subscribe(counts.apply_change)
+    key = count_key('exact', {})
+    counts.store(key, 5, counts.version)
+
+    source.emit('equipment', 'INSERT', {'id': 2, 'name': "SEM"})
+    assert counts.lookup(key)[0]
+    source.emit('entries', 'DELETE', old_record={'id': 1})
+    assert not counts.lookup(key)[0]
+    feed.stop()
+
+
+class _DeleteClient:
+    client = object()
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, table, record_id):
+        self.deleted.append((table, record_id))
+        return True
+
+
+def test_delete_invalidates_counts_and_index(monkeypatch):
+    counts = RecordCountCache()
+    index = SearchIndex()
+    index.build([{'id': 1, 'name': "张三"}])
+    monkeypatch.setattr(supabase_manager, 'record_counts', counts)
+    monkeypatch.setattr(supabase_manager, 'record_index', index)
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = _DeleteClient()
+    manager.replica = None
+    key = count_key('exact', {})
+    counts.store(key, 1, counts.version)
+
+    assert manager.delete('entries', 1)
+    assert manager.client.deleted == [('entries', 1)]
+    assert not counts.lookup(key)[0]
+    assert index.search("张三") == set()
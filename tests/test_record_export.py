@@ -0,0 +1,58 @@
+# tests/test_record_export.py - CSV / Excel 导出的表头、逐块生成和格式校验
+import csv
+import io
+from datetime import date, datetime, time
+
+import pytest
+
+from record import Record
+from record_export import EXPORT_COLUMNS, iter_csv, iter_export, iter_xlsx
+
+
+def _record(record_id, name="张三"):
+    return Record(id=record_id, register_datetime=datetime(2026, 10, 1, 9, 30),
+                  test_date=date(2026, 10, 2), start_time=time(9, 0), end_time=time(11, 0),
+                  name=name, contact="13800000000", advisor="李老师", equipment="XRD",
+                  machine_hours=2.0, cost=200, remark="备注, 含逗号")
+
+
+def test_csv_has_bom_header_and_rows():
+    data = b''.join(iter_csv([[_record(1)], [_record(2, name="王五")]]))
+
+    assert data.startswith('\ufeff'.encode('utf-8'))
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    assert rows[0] == [title for _, title in EXPORT_COLUMNS]
+    assert [row[0] for row in rows[1:]] == ["1", "2"]
+    assert rows[2][4] == "王五"
+    assert rows[1][-1] == "备注, 含逗号"
+
+
+def test_csv_yields_each_chunk_as_it_is_read():
+    read = []
+
+    def chunks():
+        for record_id in (1, 2):
+            read.append(record_id)
+            yield [_record(record_id)]
+
+    parts = iter_csv(chunks())
+    next(parts)
+    assert read == []
+    assert b"1," in next(parts)
+    assert read == [1]
+
+
+def test_xlsx_opens_with_openpyxl():
+    openpyxl = pytest.importorskip('openpyxl')
+
+    data = b''.join(iter_xlsx([[_record(1), _record(2)]]))
+
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == [title for _, title in EXPORT_COLUMNS]
+    assert [row[0] for row in rows[1:]] == [1, 2]
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        iter_export([], "pdf")
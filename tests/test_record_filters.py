@@ -0,0 +1,116 @@
+# tests/test_record_filters.py - 查询条件到 PostgREST 过滤条件的翻译和渲染
+from datetime import date, datetime
+
+import pytest
+
+from record_query import SEARCH_FIELDS, build_record_filters, like_pattern, to_date_str
+from supabase_client import _apply_filter, _format_filter, _format_value
+
+
+def test_no_conditions_no_filters():
+    assert build_record_filters() == []
+    assert build_record_filters(conditions={'name': '', 'advisor': None}, name="  ", equipment="") == []
+
+
+def test_conditions_become_eq_filters():
+    assert build_record_filters(conditions={'name': "张三", 'is_active': True}) == [
+        ('name', 'eq', "张三"), ('is_active', 'eq', True)]
+
+
+def test_test_date_range_is_inclusive():
+    filters = build_record_filters(date_range=(date(2024, 5, 1), "2024-05-31T00:00:00"))
+    assert filters == [('test_date', 'gte', "2024-05-01"), ('test_date', 'lte', "2024-05-31")]
+
+
+def test_register_datetime_range_ends_before_next_day():
+    filters = build_record_filters(date_range=(None, datetime(2024, 5, 31, 15, 0)),
+                                   date_field="register_datetime")
+    assert filters == [('register_datetime', 'lt', "2024-06-01")]
+
+
+def test_name_and_advisor_substring_match():
+    filters = build_record_filters(name=" 张 ", advisor="李")
+    assert filters == [('name', 'ilike', "%张%"), ('advisor', 'ilike', "%李%")]
+
+
+def test_like_pattern_escapes_wildcards():
+    assert like_pattern("50%_a\\b") == "%50\\%\\_a\\\\b%"
+
+
+def test_equipment_single_or_many():
+    assert build_record_filters(equipment="XRD") == [('equipment', 'eq', "XRD")]
+    assert build_record_filters(equipment=("XRD", "SEM")) == [('equipment', 'in', ["XRD", "SEM"])]
+    assert build_record_filters(equipment=[]) == []
+
+
+def test_keywords_match_any_search_field():
+    filters = build_record_filters(keywords="张")
+    assert filters == [(None, 'or', [(field, 'ilike', "%张%") for field in SEARCH_FIELDS])]
+
+
+def test_ids_narrow_other_filters():
+    filters = build_record_filters(name="张", ids=(3, 1))
+    assert filters == [('id', 'in', [3, 1]), ('name', 'ilike', "%张%")]
+
+
+def test_to_date_str():
+    assert to_date_str(None) is None
+    assert to_date_str(datetime(2024, 5, 1, 8, 30)) == "2024-05-01"
+    assert to_date_str("2024-05-01 08:30:00") == "2024-05-01"
+
+
+def test_format_value_quotes_reserved_chars():
+    assert _format_value("张三") == "张三"
+    assert _format_value(7) == "7"
+    assert _format_value("a,b") == '"a,b"'
+    assert _format_value('say "hi"') == '"say \\"hi\\""'
+    assert _format_value("c:\\temp") == '"c:\\\\temp"'
+
+
+def test_format_nested_logical_filters():
+    condition = (None, 'or', [
+        ('test_date', 'lt', "2024-05-01"),
+        (None, 'and', [('test_date', 'eq', "2024-05-01"), ('id', 'lt', 7)])
+    ])
+    assert _format_filter(condition) == "or(test_date.lt.2024-05-01,and(test_date.eq.2024-05-01,id.lt.7))"
+
+
+def test_format_in_and_is_filters():
+    assert _format_filter(('equipment', 'in', ["XRD", "X, Y"])) == 'equipment.in.(XRD,"X, Y")'
+    assert _format_filter(('remark', 'is', None)) == "remark.is.null"
+    assert _format_filter(('is_active', 'is', True)) == "is_active.is.true"
+
+
+def test_format_keyword_filter():
+    (condition,) = build_record_filters(keywords="a.b")
+    assert _format_filter(condition).startswith('or(name.ilike."%a.b%",advisor.ilike."%a.b%"')
+
+
+def test_format_rejects_unknown_operator():
+    with pytest.raises(ValueError):
+        _format_filter(('name', 'fts', "张三"))
+
+
+class _Query:
+    """记录被调用的过滤方法"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, method):
+        def record(*args):
+            self.calls.append((method, args))
+            return self
+        return record
+
+
+def test_apply_filter_calls_postgrest_methods():
+    query = _Query()
+    for condition in build_record_filters(name="张", equipment=["XRD"], keywords="x"):
+        query = _apply_filter(query, *condition)
+
+    assert query.calls[0] == ('ilike', ('name', "%张%"))
+    assert query.calls[1] == ('in_', ('equipment', ["XRD"]))
+    assert query.calls[2][0] == 'or_'
+    with pytest.raises(ValueError):
+        _apply_filter(_Query(), 'name', 'fts', "张三")
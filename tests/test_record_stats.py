@@ -0,0 +1,117 @@
+# tests/test_record_stats.py - 记录统计：聚合查询、record_stats 函数和明细汇总
+from datetime import date
+
+import pytest
+
+import supabase_manager
+from errors import SupabaseRequestError
+from record_query import (AggregateSupport, STATS_FUNCTION, build_record_filters, rollup_stats,
+                          stats_rpc_params, stats_rpc_rows)
+from supabase_manager import SupabaseManager
+
+
+class _Cause(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+ROWS = [
+    {'id': 1, 'test_date': "2024-05-01", 'equipment': "XRD", 'machine_hours': 1.5, 'cost': 100},
+    {'id': 2, 'test_date': "2024-05-20", 'equipment': "SEM", 'machine_hours': 2.0, 'cost': 200},
+    {'id': 3, 'test_date': "2024-06-02", 'equipment': "XRD", 'machine_hours': 0.5, 'cost': 50},
+]
+
+
+class FakeClient:
+    """按配置拒绝聚合查询或统计函数的客户端"""
+
+    client = object()
+
+    def __init__(self, aggregates=True, function=True):
+        self.aggregates = aggregates
+        self.function = function
+        self.calls = []
+
+    def select(self, table, filters=None, columns=None, order_by=None, limit=None, **kwargs):
+        if 'count()' in (columns or []):
+            self.calls.append('aggregate')
+            if not self.aggregates:
+                raise SupabaseRequestError("聚合函数未启用", "查询entries", _Cause('PGRST123'))
+            return [{'count': 3, 'hours': 4.0, 'cost': 350}]
+        self.calls.append('select')
+        rows = [row for row in ROWS if filters is None or all(
+            op != 'gt' or row[column] > value for column, op, value in filters)]
+        return [{column: row[column] for column in columns} for row in rows][:limit]
+
+    def rpc(self, function, params, retry=False):
+        self.calls.append('rpc')
+        if not self.function:
+            raise SupabaseRequestError("函数不存在", "调用record_stats", _Cause('PGRST202'))
+        assert function == STATS_FUNCTION
+        if params['group_column'] is None:
+            return [{'group_value': None, 'count': 3, 'hours': 4.0, 'cost': 350}]
+        return [{'group_value': "SEM", 'count': 1, 'hours': 2.0, 'cost': 200},
+                {'group_value': "XRD", 'count': 2, 'hours': 2.0, 'cost': 150}]
+
+
+@pytest.fixture
+def support(monkeypatch):
+    support = AggregateSupport()
+    monkeypatch.setattr(supabase_manager, 'aggregate_support', support)
+    return support
+
+
+def _manager(client):
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = client
+    manager.config_manager = None
+    manager.replica = None
+    return manager
+
+
+def test_stats_rpc_params_serializes_filters():
+    filters = build_record_filters(date_range=(date(2024, 5, 1), None), equipment=["XRD", "SEM"],
+                                   keywords="张")
+    params = stats_rpc_params(filters + [('test_date', 'lt', date(2024, 6, 1))], 'equipment')
+    assert params['group_column'] == 'equipment'
+    assert params['filters'][0] == {'column': 'test_date', 'op': 'gte', 'value': "2024-05-01"}
+    assert params['filters'][1] == {'column': 'equipment', 'op': 'in', 'value': ["XRD", "SEM"]}
+    keyword = params['filters'][2]
+    assert keyword['op'] == 'or' and keyword['value'][0] == {'column': 'name', 'op': 'ilike', 'value': "%张%"}
+    assert params['filters'][3]['value'] == "2024-06-01"
+
+
+def test_stats_rpc_rows_restore_group_column():
+    rows = [{'group_value': "XRD", 'count': 2, 'hours': 2.0, 'cost': 150}]
+    stats = rollup_stats(stats_rpc_rows(rows, 'equipment'), 'equipment')
+    assert stats['groups'] == [{'key': "XRD", 'count': 2, 'machine_hours': 2.0, 'cost': 150}]
+
+
+def test_stats_use_aggregates_when_enabled(support):
+    client = FakeClient()
+    stats = _manager(client).get_record_stats()
+    assert (stats['count'], stats['machine_hours'], stats['cost']) == (3, 4.0, 350)
+    assert client.calls == ['aggregate']
+
+
+def test_stats_fall_back_to_function(support):
+    client = FakeClient(aggregates=False)
+    manager = _manager(client)
+    stats = manager.get_record_stats(group_by='equipment')
+    assert stats['count'] == 3
+    assert [group['key'] for group in stats['groups']] == ["SEM", "XRD"]
+
+    # 聚合查询不可用的结果被记住，不再重复请求
+    manager.get_record_stats()
+    assert client.calls == ['aggregate', 'rpc', 'rpc']
+    assert not support.enabled and support.function_enabled
+
+
+def test_stats_sum_detail_rows_without_function(support):
+    client = FakeClient(aggregates=False, function=False)
+    stats = _manager(client).get_record_stats(group_by='month')
+    assert (stats['count'], stats['machine_hours'], stats['cost']) == (3, 4.0, 350)
+    assert [(group['key'], group['count']) for group in stats['groups']] == [("2024-05", 2), ("2024-06", 1)]
+    assert client.calls == ['aggregate', 'rpc', 'select']
+    assert not support.function_enabled
@@ -0,0 +1,117 @@
+# tests/test_retry_policy.py - 指数退避重试的次数、可重试错误和总时长预算
+import asyncio
+
+import pytest
+
+import retry_policy
+from errors import CircuitOpenError, SupabaseRequestError, SupabaseTimeoutError
+from retry_policy import RetryPolicy
+
+
+class _Clock:
+    """替代 time.monotonic / time.sleep，sleep 只推进时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(retry_policy.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(retry_policy.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+    return clock
+
+
+class _Failing:
+    """前 failures 次调用抛出 error，之后返回 "ok" """
+
+    def __init__(self, error, failures):
+        self.error = error
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+def test_retries_retryable_errors_with_backoff(clock):
+    fn = _Failing(SupabaseTimeoutError("超时"), failures=2)
+
+    assert RetryPolicy(max_attempts=3, base_delay=0.2, max_delay=2.0).call(fn) == "ok"
+    assert fn.calls == 3
+    assert clock.sleeps == [0.4, 0.8]
+
+
+def test_gives_up_after_max_attempts(clock):
+    fn = _Failing(SupabaseTimeoutError("超时"), failures=5)
+
+    with pytest.raises(SupabaseTimeoutError):
+        RetryPolicy(max_attempts=3).call(fn)
+    assert fn.calls == 3
+
+
+def test_delay_capped_by_max_delay(clock):
+    fn = _Failing(SupabaseTimeoutError("超时"), failures=3)
+
+    RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=1.5).call(fn)
+    assert clock.sleeps == [1.5, 1.5, 1.5]
+
+
+@pytest.mark.parametrize('error', [SupabaseRequestError("参数错误"), CircuitOpenError("熔断中")])
+def test_non_retryable_errors_raised_immediately(clock, error):
+    fn = _Failing(error, failures=1)
+
+    with pytest.raises(type(error)):
+        RetryPolicy(max_attempts=3).call(fn)
+    assert fn.calls == 1
+    assert clock.sleeps == []
+
+
+def test_stops_when_budget_would_be_exceeded(clock):
+    fn = _Failing(SupabaseTimeoutError("超时"), failures=5)
+
+    with pytest.raises(SupabaseTimeoutError):
+        RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=4.0, budget_seconds=5).call(fn)
+    # 等待 2 + 4 秒会超过 5 秒预算，第二次失败后不再重试
+    assert fn.calls == 2
+    assert clock.sleeps == [2.0]
+
+
+def test_acall_retries_coroutines(clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock.sleep(seconds)
+    monkeypatch.setattr(retry_policy.asyncio, 'sleep', fake_sleep)
+    fn = _Failing(SupabaseTimeoutError("超时"), failures=1)
+
+    async def call():
+        return fn()
+
+    assert asyncio.run(RetryPolicy(max_attempts=3).acall(call)) == "ok"
+    assert fn.calls == 2
+    assert clock.sleeps == [0.4]
+
+
+def test_from_config_reads_read_settings():
+    config = {"read_max_attempts": 5, "retry_base_delay_seconds": 0.5,
+              "retry_max_delay_seconds": 3, "read_timeout_seconds": 10}
+
+    class _Config:
+        def get(self, key, default=None):
+            return config.get(key, default)
+
+    policy = RetryPolicy.from_config(_Config())
+    assert (policy.max_attempts, policy.base_delay, policy.max_delay, policy.budget_seconds) == (5, 0.5, 3.0, 10.0)
+    assert RetryPolicy.from_config(None).max_attempts == 3
@@ -0,0 +1,100 @@
+# tests/test_save_record.py - 编辑记录时的差异更新和乐观并发检查
+import pytest
+
+import supabase_manager
+from errors import RecordConflictError
+from record import Record
+from record_counts import RecordCountCache
+from search_index import SearchIndex
+from supabase_manager import SupabaseManager
+
+STORED = {
+    'id': 7, 'register_datetime': "2024-05-01T08:00:00+08:00", 'test_date': "2024-05-01",
+    'test_time': "08:00-09:00", 'name': "张三", 'contact': "", 'advisor': "王老师",
+    'equipment': "XRD", 'machine_hours': 1.5, 'cost': 100, 'remark': None,
+    'created_at': "2024-05-01", 'last_modified': "2024-05-01T00:00:00.123456+00:00"
+}
+
+
+class FakeClient:
+    """按 id 和附加条件更新 entries 的内存后端"""
+
+    def __init__(self, connected=True):
+        self.client = object() if connected else None
+        self.rows = {STORED['id']: dict(STORED)}
+        self.updates = []
+
+    def update(self, table, data, record_id, filters=None):
+        if self.client is None:
+            return None
+        self.updates.append((data, filters))
+        row = self.rows.get(record_id)
+        if row is None or any(row[column] != value for column, _, value in filters or []):
+            return None
+        row.update(data)
+        return dict(row)
+
+    def select(self, table, conditions=None, columns=None, limit=None, **kwargs):
+        row = self.rows.get(conditions['id'])
+        return [row] if row else []
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(supabase_manager, 'record_counts', RecordCountCache())
+    monkeypatch.setattr(supabase_manager, 'record_index', SearchIndex())
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = FakeClient()
+    manager.config_manager = None
+    manager.replica = None
+    manager.journal = None
+    manager.flusher = None
+    return manager
+
+
+def _form(**changes):
+    data = {'test_date': "2024-05-01", 'test_time': "08:00-09:00", 'name': "张三", 'contact': "",
+            'advisor': "王老师", 'equipment': "XRD", 'machine_hours': 1.5, 'cost': 100, 'remark': ""}
+    data.update(changes)
+    return data
+
+
+def test_unchanged_form_sends_no_update(manager):
+    original = Record.from_row(STORED)
+    assert manager.save_record(_form(), record_id=7, original=original)
+    assert manager.client.updates == []
+
+
+def test_update_sends_changed_fields_with_raw_last_modified(manager):
+    original = Record.from_row(STORED)
+    assert manager.save_record(_form(cost="150", remark="加测"), record_id=7, original=original)
+
+    data, filters = manager.client.updates[0]
+    assert set(data) == {'cost', 'remark', 'last_modified'}
+    assert filters == [('last_modified', 'eq', STORED['last_modified'])]
+
+
+def test_concurrent_edit_raises_conflict(manager):
+    original = Record.from_row(STORED)
+    manager.client.rows[7]['last_modified'] = "2024-05-02T00:00:00+00:00"
+    with pytest.raises(RecordConflictError):
+        manager.save_record(_form(cost=150), record_id=7, original=original)
+
+
+def test_deleted_record_is_not_a_conflict(manager):
+    original = Record.from_row(STORED)
+    del manager.client.rows[7]
+    assert manager.save_record(_form(cost=150), record_id=7, original=original) is False
+
+
+def test_disconnected_client_is_not_a_conflict(manager):
+    manager.client = FakeClient(connected=False)
+    original = Record.from_row(STORED)
+    assert manager.save_record(_form(cost=150), record_id=7, original=original) is False
+
+
+def test_last_modified_filter_without_raw_value():
+    assert SupabaseManager._last_modified_filter(Record()) == ('last_modified', 'is', None)
+    record = Record.from_row({'last_modified': "2024-05-01 08:00:00"})
+    record.last_modified_raw = None
+    assert SupabaseManager._last_modified_filter(record) == ('last_modified', 'eq', "2024-05-01T08:00:00")
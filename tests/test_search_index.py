@@ -0,0 +1,104 @@
+# tests/test_search_index.py - 关键词索引、变更事件更新和查询条件缩小
+import pytest
+
+from change_feed import ChangeFeed, FakeChangeSource, PollingChangeSource
+from record_query import build_record_filters, like_pattern
+from search_index import SearchIndex, narrow_filters
+
+
+def _entry(record_id, name, advisor="王老师", remark=""):
+    return {'id': record_id, 'name': name, 'contact': "", 'advisor': advisor,
+            'equipment': "XRD", 'remark': remark}
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.build([_entry(1, "张三"), _entry(2, "李四", advisor="Smith"), _entry(3, "张三丰")])
+    return index
+
+
+@pytest.fixture
+def feed():
+    feed = ChangeFeed()
+    source = FakeChangeSource()
+    feed.start(source)
+    yield feed, source
+    feed.stop()
+
+
+def test_search_matches_substrings(index):
+    assert index.search("张三") == {1, 3}
+    assert index.search("三丰") == {3}
+    assert index.search("张三丰", fields=('advisor',)) == set()
+    assert index.search("smi") == {2}
+    assert index.search("张四") == set()
+
+
+def test_change_events_update_index(index, feed):
+    feed, source = feed
+    feed.subscribe(index.apply_change)
+
+    source.emit('entries', 'INSERT', _entry(4, "王五", remark="样品Ab"))
+    assert index.search("ab") == {4}
+
+    source.emit('entries', 'UPDATE', _entry(1, "赵六"))
+    assert index.search("张三", fields=('name',)) == {3}
+    assert index.search("赵六") == {1}
+
+    source.emit('entries', 'DELETE', old_record={'id': 3})
+    assert index.search("张三") == set()
+
+    # 只含部分列的更新不能写入索引
+    source.emit('entries', 'UPDATE', {'id': 2, 'name': "王五"})
+    assert index.search("李四") == {2}
+
+
+def test_updates_during_build_are_replayed():
+    index = SearchIndex()
+    index._building = True
+    index.upsert(_entry(5, "新记录"))
+    index.remove(1)
+    index.build([_entry(1, "张三"), _entry(2, "李四")])
+    assert index.search("新记录") == {5}
+    assert index.search("张三") == set()
+
+
+def test_narrow_filters_keeps_ilike_predicates(index, feed):
+    feed, _ = feed
+    narrowed = narrow_filters({'name': "张", 'equipment': "XRD"}, index=index, feed=feed)
+    assert narrowed == {'name': "张", 'equipment': "XRD", 'ids': [1, 3]}
+
+    filters = build_record_filters(**narrowed)
+    assert ('id', 'in', [1, 3]) in filters
+    assert ('name', 'ilike', like_pattern("张")) in filters
+
+
+def test_narrow_filters_skips_when_not_useful(index, feed):
+    feed, _ = feed
+    assert narrow_filters({'name': "张"}, index=index, feed=ChangeFeed()) == {'name': "张"}
+    assert narrow_filters({'name': "张"}, index=index, max_ids=1, feed=feed) == {'name': "张"}
+    assert narrow_filters({'equipment': "XRD"}, index=index, feed=feed) == {'equipment': "XRD"}
+    assert narrow_filters({'name': "张"}, index=SearchIndex(), feed=feed) == {'name': "张"}
+
+
+class _PollingClient:
+    def select(self, table, **kwargs):
+        return [{'id': 1, 'last_modified': "2024-05-01T08:00:00"}] if table == 'entries' else []
+
+
+def test_wait_baseline_follows_first_poll():
+    feed = ChangeFeed()
+    assert not feed.wait_baseline(timeout=0)
+
+    source = PollingChangeSource(_PollingClient(), interval_seconds=60)
+    assert not source.baseline_taken.is_set()
+    feed.start(source)
+    try:
+        assert feed.wait_baseline(timeout=5)
+    finally:
+        feed.stop()
+
+    feed.start(FakeChangeSource())
+    assert feed.wait_baseline(timeout=0)
+    feed.stop()